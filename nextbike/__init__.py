@@ -1,5 +1,12 @@
-from nextbike import (
-    io,
-    models,
-    preprocessing
-)
+__version__ = '1.1'
+
+from nextbike.lazy import lazy_exports
+
+# The subpackages are imported on first access (e.g. nextbike.models), so that the CLI starts without importing them
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'io': 'nextbike.io',
+    'models': 'nextbike.models',
+    'preprocessing': 'nextbike.preprocessing',
+    'profiling': 'nextbike.profiling',
+    'benchmark': 'nextbike.benchmark'
+})
@@ -0,0 +1,23 @@
+from nextbike.lazy import lazy_exports
+
+# Benchmarked stages in the order of the pipeline
+STAGES = ['preprocess', 'parallel_preprocess', 'transform', 'prepare', 'train', 'predict']
+
+# Numbers of raw rows which are benchmarked by default (up to 10 ** 8 rows can be passed explicitly)
+DEFAULT_SIZES = [10 ** 4, 10 ** 5, 10 ** 6]
+
+# The benchmark modules import the whole pipeline, they are imported on first access
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'generate_booking_chunks': 'nextbike.benchmark.synthetic',
+    'generate_bookings': 'nextbike.benchmark.synthetic',
+    'write_bookings': 'nextbike.benchmark.synthetic',
+    'get_benchmark_dir': 'nextbike.benchmark.suite',
+    'get_synthetic_data': 'nextbike.benchmark.suite',
+    'benchmark_size': 'nextbike.benchmark.suite',
+    'run_benchmarks': 'nextbike.benchmark.suite',
+    'save_baseline': 'nextbike.benchmark.suite',
+    'compare_with_baseline': 'nextbike.benchmark.suite',
+    'measure_startup': 'nextbike.benchmark.startup',
+    'save_startup_baseline': 'nextbike.benchmark.startup',
+    'compare_startup_with_baseline': 'nextbike.benchmark.startup'
+})
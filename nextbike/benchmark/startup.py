@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from nextbike.benchmark.suite import get_benchmark_dir
+
+# Packages which the CLI must not import before a command needs them
+HEAVY_PACKAGES = ['numpy', 'pandas', 'geopandas', 'shapely', 'sklearn', 'scipy', 'joblib']
+
+# Absolute slack of the comparison with the baseline, as imports of a few 10 ms fluctuate by as much between runs
+STARTUP_SLACK_S = 0.02
+
+# Measured startup targets: the executed code and the heavy packages it must not import
+STARTUP_TARGETS = {
+    'import nextbike': ('import nextbike', HEAVY_PACKAGES),
+    'nextbike --help': ("from nextbike.cli import cli\ncli(['--help'])", HEAVY_PACKAGES),
+    **{'nextbike {} --help'.format(command):
+       ("from nextbike.cli import cli\ncli(['{}', '--help'])".format(command), HEAVY_PACKAGES)
+       for command in ['transform', 'train', 'predict', 'serve', 'run', 'tune', 'benchmark', 'generate']},
+    # The transform command needs the preprocessing but none of the models
+    'import nextbike.preprocessing': ('import nextbike.preprocessing', ['sklearn'])
+}
+
+# Executes a target in a fresh interpreter and reports its import time and the top level packages it imported
+STARTUP_SCRIPT = '''
+import json, os, sys, time
+start = time.perf_counter()
+sys.stdout = open(os.devnull, 'w')
+try:
+    exec(compile(sys.argv[1], '<startup>', 'exec'))
+except SystemExit:
+    pass
+sys.__stdout__.write(json.dumps({'import_time_s': time.perf_counter() - start,
+                                 'packages': sorted({name.split('.')[0] for name in sys.modules})}))
+'''
+
+
+def measure_startup(repeats: int = 5) -> pd.DataFrame:
+    """
+    Measures the startup time of the CLI and the package in fresh interpreters, e.g. as paid by every cron invocation.
+    :param repeats: Number of runs per target, the fastest run is reported
+    :return: DataFrame with the target, its import and total process time and the heavy packages it imported
+    """
+    results = []
+    for target, (code, heavy_packages) in STARTUP_TARGETS.items():
+        runs = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, code], check=True, capture_output=True,
+                                    text=True).stdout
+            runs.append({**json.loads(output), 'wall_time_s': time.perf_counter() - start})
+        fastest = min(runs, key=lambda run: run['import_time_s'])
+        results.append({'target': target, 'import_time_s': fastest['import_time_s'],
+                        'wall_time_s': min(run['wall_time_s'] for run in runs),
+                        'heavy_packages': ','.join(sorted(set(heavy_packages) & set(fastest['packages'])))})
+    return pd.DataFrame(results)
+
+
+def save_startup_baseline(results: pd.DataFrame, path: str = None) -> None:
+    """
+    Saves startup times as baseline for later comparisons.
+    :param results: Results of measure_startup
+    :param path: Path of the baseline (Default: {project_dir}/data/output/benchmarks/startup_baseline.csv)
+    :return: None
+    """
+    results.to_csv(path if path else os.path.join(get_benchmark_dir(), 'startup_baseline.csv'), index=False)
+
+
+def compare_startup_with_baseline(results: pd.DataFrame, tolerance: float = 0.25, path: str = None) -> pd.DataFrame:
+    """
+    Compares startup times with the stored baseline. A target regressed if its import time grew by more than the
+    tolerance (plus STARTUP_SLACK_S) or if it imported a heavy package it must not import. Without a baseline only the
+    latter is checked.
+    :param results: Results of measure_startup
+    :param tolerance: Accepted relative increase of the import time
+    :param path: Path of the baseline (Default: {project_dir}/data/output/benchmarks/startup_baseline.csv)
+    :return: The results with the baseline import time and a 'regression' column
+    """
+    path = path if path else os.path.join(get_benchmark_dir(), 'startup_baseline.csv')
+    comparison = results.copy()
+    comparison['import_time_s_baseline'] = float('nan')
+    if os.path.isfile(path):
+        baseline = pd.read_csv(path).set_index('target')['import_time_s']
+        comparison['import_time_s_baseline'] = comparison['target'].map(baseline)
+    slower = comparison['import_time_s'] > comparison['import_time_s_baseline'] * (1 + tolerance) + STARTUP_SLACK_S
+    comparison['regression'] = slower | (comparison['heavy_packages'].fillna('') != '')
+    return comparison
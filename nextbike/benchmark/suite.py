@@ -0,0 +1,152 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from nextbike.benchmark import DEFAULT_SIZES, STAGES
+from nextbike.benchmark.synthetic import write_bookings
+from nextbike.io import create_dir_if_not_exists, get_data_path, write_atomically
+from nextbike.models import utils
+from nextbike.models.FeaturePipeline import FeaturePipeline
+from nextbike.preprocessing import ParallelPreprocessor, Preprocessor, Transformer
+from nextbike.profiling import enable_profiling, disable_profiling, profile_stage
+
+
+def get_benchmark_dir() -> str:
+    """
+    Method returning the directory of the synthetic data, results and baseline of the benchmarks.
+    :return: Path of the benchmark directory
+    """
+    path = os.path.join(get_data_path(), 'output', 'benchmarks')
+    create_dir_if_not_exists(path)
+    return path
+
+
+def get_synthetic_data(n_rows: int, seed: int = 0) -> str:
+    """
+    Returns the path of a synthetic raw data file with the given number of rows and generates it on first use.
+    :param n_rows: Number of raw rows
+    :param seed: Seed of the generator
+    :return: Path of the csv file
+    """
+    path = os.path.join(get_benchmark_dir(), 'synthetic-{}-{}.csv'.format(n_rows, seed))
+    if not os.path.isfile(path):
+        print('Generating {} synthetic bookings ...'.format(n_rows))
+        with write_atomically(path) as temporary_path:
+            write_bookings(temporary_path, n_rows, seed=seed)
+    return path
+
+
+def benchmark_size(path: str, n_rows: int, stages: list = None, n_estimators: int = 10) -> pd.DataFrame:
+    """
+    Runs the benchmarked stages on a raw data file. Every stage runs on the output of the previous stages, training and
+    prediction use forests with n_estimators trees which are not saved to disk.
+    :param path: Path of the raw data file
+    :param n_rows: Number of raw rows of the file
+    :param stages: Stages which are measured (Default: STAGES, required earlier stages are run unmeasured)
+    :param n_estimators: Number of trees of the trained forests
+    :return: DataFrame with one row per measured stage
+    """
+    stages = STAGES if stages is None else stages
+    profiler = enable_profiling()
+    try:
+        # Required earlier stages are always executed, their measurements are dropped later on
+        if 'parallel_preprocess' in stages:
+            with profile_stage('parallel_preprocess', rows=n_rows):
+                preprocessor = ParallelPreprocessor()
+                preprocessor.load_gdf(path)
+                preprocessor.clean_gdf()
+        if 'preprocess' in stages or 'parallel_preprocess' not in stages:
+            with profile_stage('preprocess', rows=n_rows):
+                preprocessor = Preprocessor()
+                preprocessor.load_gdf(path)
+                preprocessor.clean_gdf()
+        with profile_stage('transform', rows=len(preprocessor.gdf)):
+            transformer = Transformer(preprocessor)
+            transformer.transform(use_cache=False)
+        if not {'prepare', 'train', 'predict'} & set(stages):
+            return get_stage_report(profiler, stages)
+        with profile_stage('prepare', rows=len(transformer.gdf)):
+            duration = utils.duration_preparation(transformer, True, FeaturePipeline('regressor'))
+            direction = utils.classification_preparation(transformer, True)
+        forests = [RandomForestRegressor(n_estimators=n_estimators, n_jobs=-1, random_state=123),
+                   RandomForestClassifier(n_estimators=n_estimators, n_jobs=-1, random_state=123)]
+        with profile_stage('train', rows=len(transformer.gdf)):
+            for forest, contents in zip(forests, [duration, direction]):
+                forest.fit(contents['features'], contents['target'].ravel())
+        with profile_stage('predict', rows=len(transformer.gdf)):
+            for forest, contents in zip(forests, [duration, direction]):
+                forest.predict(contents['features'])
+        return get_stage_report(profiler, stages)
+    finally:
+        disable_profiling()
+
+
+def get_stage_report(profiler, stages: list) -> pd.DataFrame:
+    """
+    Extracts the measurements of the benchmarked stages from the profiler.
+    :param profiler: The Profiler of the benchmark
+    :param stages: Stages which are reported
+    :return: DataFrame with the stage, its input rows, the wall and CPU time, throughput and peak RSS
+    """
+    report = profiler.report()
+    report = report[(report['depth'] == 0) & report['name'].isin(stages)]
+    report = report[['name', 'rows', 'wall_time_s', 'cpu_time_s', 'peak_rss_mb', 'peak_rss_increase_mb']]
+    report = report.rename(columns={'name': 'stage'}).reset_index(drop=True)
+    report['rows_per_s'] = report['rows'] / report['wall_time_s']
+    return report
+
+
+def run_benchmarks(sizes: list = None, stages: list = None, n_estimators: int = 10, seed: int = 0) -> pd.DataFrame:
+    """
+    Benchmarks the stages of the pipeline on synthetic data of every size. Every size runs in a fresh process, so that
+    the peak memory of one size does not affect the next.
+    :param sizes: Numbers of raw rows (Default: DEFAULT_SIZES)
+    :param stages: Stages which are measured (Default: STAGES)
+    :param n_estimators: Number of trees of the trained forests
+    :param seed: Seed of the synthetic data
+    :return: DataFrame with one row per size and stage
+    """
+    results = []
+    for n_rows in DEFAULT_SIZES if sizes is None else sizes:
+        path = get_synthetic_data(n_rows, seed)
+        print('Benchmarking {} rows ...'.format(n_rows))
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            report = executor.submit(benchmark_size, path, n_rows, stages, n_estimators).result()
+        report.insert(0, 'size', n_rows)
+        results.append(report)
+    results = pd.concat(results, ignore_index=True)
+    results.to_csv(os.path.join(get_benchmark_dir(), 'results.csv'), index=False)
+    return results
+
+
+def save_baseline(results: pd.DataFrame, path: str = None) -> None:
+    """
+    Saves benchmark results as baseline for later comparisons.
+    :param results: Results of run_benchmarks
+    :param path: Path of the baseline (Default: {project_dir}/data/output/benchmarks/baseline.csv)
+    :return: None
+    """
+    results.to_csv(path if path else os.path.join(get_benchmark_dir(), 'baseline.csv'), index=False)
+
+
+def compare_with_baseline(results: pd.DataFrame, tolerance: float = 0.25, path: str = None) -> pd.DataFrame:
+    """
+    Compares benchmark results with the stored baseline. A stage regressed if its throughput dropped or its peak
+    memory grew by more than the tolerance.
+    :param results: Results of run_benchmarks
+    :param tolerance: Accepted relative change of throughput and peak memory
+    :param path: Path of the baseline (Default: {project_dir}/data/output/benchmarks/baseline.csv)
+    :return: The results with the baseline throughput and peak memory and a 'regression' column
+    :raises: FileNotFoundError
+    """
+    path = path if path else os.path.join(get_benchmark_dir(), 'baseline.csv')
+    if not os.path.isfile(path):
+        raise FileNotFoundError('No benchmark baseline found at {}. Please save a baseline first.'.format(path))
+    baseline = pd.read_csv(path)[['size', 'stage', 'rows_per_s', 'peak_rss_mb']]
+    comparison = results.merge(baseline, on=['size', 'stage'], how='left', suffixes=('', '_baseline'))
+    comparison['regression'] = ((comparison['rows_per_s'] < comparison['rows_per_s_baseline'] * (1 - tolerance)) |
+                                (comparison['peak_rss_mb'] > comparison['peak_rss_mb_baseline'] * (1 + tolerance)))
+    return comparison
@@ -0,0 +1,156 @@
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from nextbike.preprocessing.Geofence import get_mannheim_geofence
+
+# Stations with these names are used by the direction model (see classification_preparation)
+UNIVERSITY_STATIONS = ['DHBW Mannheim - Campus Coblitzallee', 'A5 - Universität West', 'L1 - Schloss',
+                       'DHBW Mannheim - Campus Käfertalerstr.', 'Universität Schloss', 'Universität Mensa',
+                       'Universitätsklinik Mannheim - CampusRad', 'Hochschule Mannheim']
+
+
+def sample_positions(rng: np.random.Generator, n: int, inside: bool) -> tuple:
+    """
+    Samples uniformly distributed positions inside (or around, but outside) the boundary of Mannheim.
+    :param rng: Random number generator
+    :param n: Number of positions
+    :param inside: Indicates whether the positions lie inside or outside the boundary
+    :return: Tuple of the longitude and latitude arrays
+    """
+    geofence = get_mannheim_geofence()
+    min_lng, min_lat, max_lng, max_lat = geofence.boundary.bounds
+    # Positions outside of Mannheim are drawn from a margin of half the extent around the bounding box
+    margin_lng, margin_lat = (0, 0) if inside else ((max_lng - min_lng) / 2, (max_lat - min_lat) / 2)
+    lng, lat = np.empty(0), np.empty(0)
+    while len(lng) < n:
+        candidate_lng = rng.uniform(min_lng - margin_lng, max_lng + margin_lng, 2 * n)
+        candidate_lat = rng.uniform(min_lat - margin_lat, max_lat + margin_lat, 2 * n)
+        mask = geofence.contains(candidate_lng, candidate_lat) == inside
+        lng, lat = np.append(lng, candidate_lng[mask]), np.append(lat, candidate_lat[mask])
+    return lng[:n], lat[:n]
+
+
+def generate_booking_chunks(n_rows: int, n_bikes: int = None, n_stations: int = 200, days: int = 365,
+                            chunksize: int = 1000000, seed: int = 0) -> Iterator[pd.DataFrame]:
+    """
+    Generates synthetic raw bookings in the NextBike format ordered by datetime. Every bike alternates between 'start'
+    and 'end' bookings of non-overlapping trips at stations or free-floating positions. Like the real data, the
+    bookings contain double bookings, 'first' and 'last' bookings, 'start' bookings without 'end' booking and positions
+    outside of Mannheim. The bookings are generated chunk by chunk, so that any number of rows can be written with a
+    bounded amount of memory.
+    :param n_rows: Number of raw rows
+    :param n_bikes: Number of bikes (Default: One bike per 1000 rows, at least 10)
+    :param n_stations: Number of stations inside of Mannheim
+    :param days: Number of days the bookings span
+    :param chunksize: Number of rows per chunk (every chunk covers an equal share of the time span)
+    :param seed: Seed of the random number generator
+    :return: Iterator of DataFrames with the raw columns and a running index
+    """
+    rng = np.random.default_rng(seed)
+    n_bikes = n_bikes if n_bikes else max(n_rows // 1000, 10)
+    bike_numbers = rng.choice(np.arange(10000, 100000), n_bikes, replace=False).astype(np.int64)
+    bike_types = rng.choice([71, 150], n_bikes, p=[0.9, 0.1])
+    station_lng, station_lat = sample_positions(rng, n_stations, inside=True)
+    station_names = np.array(UNIVERSITY_STATIONS + ['Station {}'.format(i)
+                                                    for i in range(max(n_stations - len(UNIVERSITY_STATIONS), 0))],
+                             dtype=object)[:n_stations]
+    station_uids = rng.choice(np.arange(100000, 1000000), n_stations, replace=False)
+
+    n_chunks = max(int(np.ceil(n_rows / chunksize)), 1)
+    window = pd.Timedelta(days=days).total_seconds() / n_chunks
+    start_time = pd.Timestamp('2019-01-20').value // 10 ** 9
+    n_written = 0
+    for chunk in range(n_chunks):
+        n_chunk_rows = min(chunksize, n_rows - n_written)
+        window_start = start_time + chunk * window
+        # Two bookings per trip, a few more trips than needed compensate the trips which exceed the window
+        n_trips = int(n_chunk_rows * 0.55) + 1
+        bikes = np.sort(rng.integers(0, n_bikes, n_trips))
+        durations = np.minimum(rng.lognormal(np.log(15 * 60), 0.8, n_trips), 6 * 3600)
+        gaps = rng.exponential(window / max(np.bincount(bikes).mean(), 1), n_trips)
+        # Consecutive trips of a bike never overlap: every trip starts after the previous trip of the bike ended
+        elapsed = np.cumsum(gaps + durations)
+        first_trips = np.flatnonzero(np.r_[True, bikes[1:] != bikes[:-1]])
+        elapsed -= np.repeat(np.r_[0, elapsed[first_trips[1:] - 1]], np.diff(np.r_[first_trips, n_trips]))
+        trip_ends = window_start + elapsed
+        trip_starts = trip_ends - durations
+        valid = trip_ends < window_start + window
+        bikes, trip_starts, trip_ends = bikes[valid], trip_starts[valid], trip_ends[valid]
+        n_trips = len(bikes)
+
+        # Bookings of all trips: 'start' bookings first, then the matching 'end' bookings
+        booking_bikes = np.concatenate([bikes, bikes])
+        times = np.concatenate([trip_starts, trip_ends])
+        trip_types = np.repeat(np.array(['start', 'end'], dtype=object), n_trips)
+        # 2% 'first'/'last' bookings and 1% double bookings, 1% of the 'end' bookings are missing
+        n_boundary = int(len(times) * 0.02)
+        boundary_bikes = rng.integers(0, n_bikes, n_boundary)
+        booking_bikes = np.concatenate([booking_bikes, boundary_bikes])
+        times = np.concatenate([times, rng.uniform(window_start, window_start + window, n_boundary)])
+        trip_types = np.concatenate([trip_types, rng.choice(np.array(['first', 'last'], dtype=object), n_boundary)])
+        keep = (trip_types != 'end') | (rng.random(len(trip_types)) >= 0.01)
+        booking_bikes, times, trip_types = booking_bikes[keep], times[keep], trip_types[keep]
+        duplicates = np.flatnonzero(rng.random(len(times)) < 0.01)
+        booking_bikes = np.concatenate([booking_bikes, booking_bikes[duplicates]])
+        times = np.concatenate([times, times[duplicates]]).astype(np.int64)
+        trip_types = np.concatenate([trip_types, trip_types[duplicates]])
+
+        # 60% of the bookings take place at stations, 3% of all bookings outside of Mannheim
+        n_bookings = len(times)
+        at_station = rng.random(n_bookings) < 0.6
+        stations = rng.integers(0, n_stations, n_bookings)
+        free_lng, free_lat = sample_positions(rng, n_bookings, inside=True)
+        outside = rng.random(n_bookings) < 0.03
+        outside_lng, outside_lat = sample_positions(rng, int(outside.sum()), inside=False)
+        lng = np.where(at_station, station_lng[stations], free_lng)
+        lat = np.where(at_station, station_lat[stations], free_lat)
+        lng[outside], lat[outside] = outside_lng, outside_lat
+
+        # The columns are in the order of the original files
+        bookings = pd.DataFrame({
+            'p_spot': at_station,
+            'p_place_type': np.where(at_station, 0, 12),
+            'datetime': pd.to_datetime(times, unit='s'),
+            'b_number': bike_numbers[booking_bikes],
+            'trip': trip_types,
+            'p_uid': np.where(at_station, station_uids[stations], rng.integers(1000000, 10000000, n_bookings)),
+            'p_bikes': np.where(at_station, rng.integers(0, 15, n_bookings), 1),
+            'p_lat': lat,
+            'b_bike_type': bike_types[booking_bikes],
+            'p_name': np.where(at_station, station_names[stations],
+                               np.char.add('BIKE ', bike_numbers[booking_bikes].astype(str)).astype(object)),
+            'p_number': np.where(at_station, stations + 5000, 0),
+            'p_lng': lng,
+            'p_bike': ~at_station
+        })
+        bookings = bookings.sort_values('datetime', kind='stable').iloc[:n_chunk_rows]
+        bookings.index = pd.RangeIndex(n_written, n_written + len(bookings))
+        n_written += len(bookings)
+        yield bookings
+
+
+def generate_bookings(n_rows: int, n_bikes: int = None, seed: int = 0) -> pd.DataFrame:
+    """
+    Generates synthetic raw bookings in the NextBike format (see generate_booking_chunks).
+    :param n_rows: Number of raw rows
+    :param n_bikes: Number of bikes (Default: One bike per 1000 rows, at least 10)
+    :param seed: Seed of the random number generator
+    :return: DataFrame of raw bookings
+    """
+    return pd.concat(generate_booking_chunks(n_rows, n_bikes, seed=seed))
+
+
+def write_bookings(path: str, n_rows: int, n_bikes: int = None, seed: int = 0, chunksize: int = 1000000) -> None:
+    """
+    Writes synthetic raw bookings in the NextBike format as csv file chunk by chunk.
+    :param path: Path of the csv file
+    :param n_rows: Number of raw rows
+    :param n_bikes: Number of bikes (Default: One bike per 1000 rows, at least 10)
+    :param seed: Seed of the random number generator
+    :param chunksize: Number of rows which are generated and written at once
+    :return: None
+    """
+    for chunk, bookings in enumerate(generate_booking_chunks(n_rows, n_bikes, chunksize=chunksize, seed=seed)):
+        bookings.to_csv(path, mode='w' if chunk == 0 else 'a', header=chunk == 0)
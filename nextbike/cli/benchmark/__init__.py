@@ -0,0 +1 @@
+from nextbike.cli.benchmark.commands import benchmark, generate
@@ -0,0 +1,79 @@
+import sys
+
+import click
+
+from nextbike.benchmark import DEFAULT_SIZES, STAGES
+
+
+@click.command()
+@click.option('--size', 'sizes', type=click.IntRange(1), multiple=True,
+              help='Number of raw rows of a benchmark run (repeatable, default: 10^4, 10^5 and 10^6).')
+@click.option('--stage', type=click.Choice(STAGES), multiple=True, help='Benchmarked stage (repeatable, default: all).')
+@click.option('--n-estimators', type=click.IntRange(1), default=10, help='Number of trees of the benchmarked forests.')
+@click.option('--startup', is_flag=True,
+              help='Measure the startup time of the CLI and the package instead of the pipeline stages.')
+@click.option('--save-baseline', 'save_baseline_', is_flag=True,
+              help='Save the results as baseline for later comparisons.')
+@click.option('--tolerance', type=click.FloatRange(0), default=0.25,
+              help='Accepted relative drop of throughput and growth of peak memory (or startup time) compared to the '
+                   'baseline.')
+def benchmark(sizes, stage, n_estimators, startup, save_baseline_, tolerance):
+    """
+    Benchmarks throughput and peak memory of every pipeline stage on synthetic data and compares them with the stored
+    baseline. The synthetic data, results and baseline are saved to disk at {project_dir}/data/output/benchmarks
+    :param sizes: Numbers of raw rows
+    :param stage: Benchmarked stages
+    :param n_estimators: Number of trees of the benchmarked forests
+    :param startup: Indicates whether the startup time should be measured instead of the pipeline stages
+    :param save_baseline_: Indicates whether the results should be saved as baseline
+    :param tolerance: Accepted relative change of throughput and peak memory (or startup time)
+    :return: None
+    """
+    # The pipeline is imported on invocation only, so that the CLI starts without importing it
+    from nextbike.benchmark import (compare_startup_with_baseline, compare_with_baseline, measure_startup,
+                                    run_benchmarks, save_baseline, save_startup_baseline)
+
+    if startup:
+        results = measure_startup()
+        if save_baseline_:
+            save_startup_baseline(results)
+        comparison = compare_startup_with_baseline(results, tolerance)
+    else:
+        results = run_benchmarks(list(sizes) if sizes else DEFAULT_SIZES, list(stage) if stage else STAGES,
+                                 n_estimators)
+        if save_baseline_:
+            save_baseline(results)
+            click.echo(results.to_string(index=False))
+            click.echo('Saved the results as baseline.')
+            return
+        try:
+            comparison = compare_with_baseline(results, tolerance)
+        except FileNotFoundError as e:
+            click.echo(results.to_string(index=False))
+            click.echo(e)
+            return
+    click.echo(comparison.to_string(index=False))
+    if comparison['regression'].any():
+        click.echo('Performance regression in {} benchmark(s).'.format(comparison['regression'].sum()), err=True)
+        sys.exit(1)
+
+
+@click.command()
+@click.argument('filename', type=click.Path())
+@click.option('--rows', type=click.IntRange(1), default=10 ** 6, help='Number of raw rows.')
+@click.option('--bikes', type=click.IntRange(1), help='Number of bikes (default: one bike per 1000 rows).')
+@click.option('--seed', type=int, default=0, help='Seed of the generator.')
+def generate(filename, rows, bikes, seed):
+    """
+    Generates synthetic raw bookings in the NextBike format and writes them to a csv file
+    :param filename: Path of the csv file
+    :param rows: Number of raw rows
+    :param bikes: Number of bikes
+    :param seed: Seed of the generator
+    :return: None
+    """
+    # The generator is imported on invocation only, so that the CLI starts without importing it
+    from nextbike.benchmark import write_bookings
+
+    write_bookings(filename, rows, bikes, seed)
+    click.echo('Generated {} bookings at {}.'.format(rows, filename))
@@ -1,20 +1,46 @@
 import click
 
+from nextbike.cli.benchmark import benchmark, generate
 from nextbike.cli.predict import predict
+from nextbike.cli.run import run
+from nextbike.cli.serve import serve
 from nextbike.cli.train import train
 from nextbike.cli.transform import transform
+from nextbike.cli.tune import tune
 
 
 @click.group()
-def cli():
+@click.option('--profile', is_flag=True,
+              help='Record wall time, CPU time, peak memory and rows of every stage and save a run report.')
+@click.pass_context
+def cli(ctx, profile):
     """
     This function serves as the entry point for the cli and all its sub-commands.
+    :param profile: Indicates whether the stages of the sub-command should be profiled
     :return: None
     """
-    pass
+    if profile:
+        # The profiler is only imported if it is needed, so that the CLI starts quickly
+        from nextbike.io import save_profile
+        from nextbike.profiling import enable_profiling
+
+        profiler = enable_profiling()
+
+        def report():
+            stages = profiler.report()
+            click.echo(stages.to_string(index=False), err=True)
+            click.echo('Saved the run report to {}.json/.csv'.format(
+                save_profile(profiler, ctx.invoked_subcommand or 'run')), err=True)
+
+        ctx.call_on_close(report)
 
 
 # All sub-commands of the nextbike cli command
 cli.add_command(transform)
 cli.add_command(train)
 cli.add_command(predict)
+cli.add_command(serve)
+cli.add_command(run)
+cli.add_command(tune)
+cli.add_command(benchmark)
+cli.add_command(generate)
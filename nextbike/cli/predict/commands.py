@@ -3,34 +3,44 @@ import os
 import click
 from yaspin import yaspin
 
-from nextbike.io import get_data_path
-from nextbike.models import DurationModel, DirectionModel
-from nextbike.preprocessing import Preprocessor, Transformer
-
 
 @click.command()
 @click.argument('filename', type=click.Path('rb'))
-def predict(filename):
+@click.option('--no-cache', is_flag=True, help='Do not read or write the cache of the cleaned and transformed data.')
+@click.option('--compact', is_flag=True, help='Hold the data in a memory-compact representation.')
+@click.option('--backend', type=click.Choice(['sklearn', 'numpy']), default='sklearn',
+              help='Inference backend of the models (numpy evaluates flattened forests).')
+@click.option('--format', type=click.Choice(['csv', 'csv.gz', 'parquet', 'feather']), default='csv',
+              help='Format of the saved predictions.')
+def predict(filename, no_cache, compact, backend, format):
     """
     Predicts the duration of the trips specified in the given data frame and saves them to disk at
     {project_dir}/data/output
     :param filename: Path to the data frame which should be used for prediction
+    :param no_cache: Indicates whether the cache at {project_dir}/data/output/cache should be bypassed
+    :param compact: Indicates whether the data should be held in a memory-compact representation
+    :param backend: Inference backend of the models
+    :param format: Format of the saved predictions, one of csv, csv.gz, parquet and feather
     :return: None
     """
+    # The pipeline is imported on invocation only, so that the CLI starts without importing it
+    from nextbike.io import get_data_path
+    from nextbike.models import DurationModel, DirectionModel
+    from nextbike.preprocessing import Preprocessor, Transformer
+
     with yaspin(color='blue') as spinner:
         spinner.text = 'Conducting Pre-Processing and Transformation steps ...\t'
-        preprocessor = Preprocessor()
-        preprocessor.load_gdf(filename)
-        preprocessor.clean_gdf()
+        preprocessor = Preprocessor(compact=compact)
+        preprocessor.load_clean_gdf(filename, use_cache=not no_cache)
         transformer = Transformer(preprocessor)
-        transformer.transform()
+        transformer.transform(use_cache=not no_cache)
         spinner.text = 'Performing duration prediction ...\t'
-        duration_predictor = DurationModel()
+        duration_predictor = DurationModel(backend=backend)
         duration_predictor.load_from_transformer(transformer, training=False)
-        duration_predictor.predict(save=True)
+        duration_predictor.predict(save=True, format=format)
         spinner.text = 'Performing direction prediction ...\t'
-        direction_predictor = DirectionModel()
+        direction_predictor = DirectionModel(backend=backend)
         direction_predictor.load_from_transformer(transformer, training=False)
-        direction_predictor.predict(save=True)
+        direction_predictor.predict(save=True, format=format)
         spinner.text = 'Predictions performed and saved to disk at {}.'.format(os.path.join(get_data_path(), 'output'))
         spinner.ok('✅ ')
@@ -0,0 +1 @@
+from nextbike.cli.run.commands import run
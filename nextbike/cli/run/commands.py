@@ -0,0 +1,72 @@
+import click
+
+from nextbike.cli.train.commands import parse_number
+
+
+@click.command()
+@click.argument('filename', type=click.Path('rb'))
+@click.option('--stage', type=click.Choice(['transform', 'train', 'predict']), multiple=True,
+              help='Executed stage (repeatable, default: transform, train and predict).')
+@click.option('--output', default='mannheim_transformed.csv', help='Filename of transformed data frame file.')
+@click.option('--predictions-output', default='final_predictions.csv',
+              help='Filename of the combined duration and direction predictions.')
+@click.option('--format', type=click.Choice(['csv', 'csv.gz', 'parquet', 'feather']),
+              help='Output format (default: the format of the extension of the output filenames).')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the cache of the cleaned and transformed data.')
+@click.option('--compact', is_flag=True, help='Hold the data in a memory-compact representation.')
+@click.option('--sparse', is_flag=True, help='Keep the one-hot-encoded station features of the duration model sparse.')
+@click.option('--compress', type=click.IntRange(0, 9), default=0,
+              help='Compression level of the saved models (0 keeps them memory-mappable).')
+@click.option('--backend', type=click.Choice(['sklearn', 'numpy']), default='sklearn',
+              help='Inference backend of the models (numpy evaluates flattened forests).')
+@click.option('--n-estimators', type=click.IntRange(1), default=100, help='Number of trees of every forest.')
+@click.option('--max-depth', type=click.IntRange(1), help='Maximum depth of the trees (unbounded by default).')
+@click.option('--min-samples-leaf', type=click.IntRange(1), default=1, help='Minimum number of samples in a leaf.')
+@click.option('--max-samples', help='Number (int) or share (float) of the rows drawn for every tree.')
+@click.option('--max-features', help='Number (int), share (float) or rule (sqrt, log2) of the features per split.')
+@click.option('--auto-compact', is_flag=True,
+              help='Search for the smallest forests within the tolerance instead of using the forest options.')
+@click.option('--tolerance', type=click.FloatRange(0), default=0.05,
+              help='Accepted relative increase of the holdout error of --auto-compact.')
+def run(filename, stage, output, predictions_output, format, no_cache, compact, sparse, compress, backend, n_estimators,
+        max_depth, min_samples_leaf, max_samples, max_features, auto_compact, tolerance):
+    """
+    Runs the transform, train and predict stages (or any combination of them) in one process on one in-memory data
+    frame. The data frame is cleaned and transformed once and the combined predictions are saved to disk at
+    {project_dir}/data/output
+    :param filename: Path to the data frame which should be used
+    :param stage: Executed stages
+    :param output: Filename of the transformed data frame (transform stage)
+    :param predictions_output: Filename of the combined predictions (predict stage)
+    :param format: Format of the transformed data frame and the combined predictions
+    :param no_cache: Indicates whether the cache at {project_dir}/data/output/cache should be bypassed
+    :param compact: Indicates whether the data should be held in a memory-compact representation
+    :param sparse: Indicates whether the duration model should be trained on a sparse feature matrix
+    :param compress: Compression level of the saved models and feature pipelines
+    :param backend: Inference backend of the models
+    :param n_estimators: Number of trees of every forest
+    :param max_depth: Maximum depth of the trees
+    :param min_samples_leaf: Minimum number of samples in a leaf
+    :param max_samples: Number or share of the rows drawn for every tree
+    :param max_features: Number, share or rule of the features considered per split
+    :param auto_compact: Indicates whether the smallest forests within the tolerance should be searched
+    :param tolerance: Accepted relative increase of the holdout error compared to the default forests
+    :return: None
+    """
+    # The pipeline is imported on invocation only, so that the CLI starts without importing it
+    from nextbike.models import run_pipeline
+
+    parameters = {'n_estimators': n_estimators, 'max_depth': max_depth, 'min_samples_leaf': min_samples_leaf,
+                  'max_samples': parse_number(max_samples)}
+    # Each model keeps its own default of max_features unless it is specified
+    if max_features is not None:
+        parameters['max_features'] = parse_number(max_features)
+    # The stages always run in the order transform, train, predict
+    result = run_pipeline(filename, list(stage) if stage else None, use_cache=not no_cache, compact=compact,
+                          sparse=sparse, compress=compress, backend=backend, parameters=parameters,
+                          auto_compact=auto_compact, tolerance=tolerance, output=output,
+                          predictions_output=predictions_output, format=format)
+    if 'transformed_path' in result:
+        click.echo('Saved the transformed data frame to {}'.format(result['transformed_path']))
+    if 'predictions_path' in result:
+        click.echo('Saved the combined predictions to {}'.format(result['predictions_path']))
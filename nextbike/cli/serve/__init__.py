@@ -0,0 +1 @@
+from nextbike.cli.serve.commands import serve
@@ -0,0 +1,27 @@
+import click
+
+
+@click.command()
+@click.option('--http', is_flag=True, help='Serve a local HTTP endpoint instead of stdin/stdout JSON lines.')
+@click.option('--host', default='127.0.0.1', help='Host name of the HTTP endpoint.')
+@click.option('--port', type=int, default=8080, help='Port of the HTTP endpoint.')
+@click.option('--backend', type=click.Choice(['sklearn', 'numpy']), default='sklearn',
+              help='Inference backend of the models (numpy evaluates flattened forests, faster for single bookings).')
+def serve(http, host, port, backend):
+    """
+    Keeps the trained models warm in memory and predicts the duration and direction of 'start' bookings. Every request
+    is a JSON object of one raw booking or a list of them (fields datetime, p_lat, p_lng, p_name, p_place_type).
+    :param http: Indicates whether requests are posted to http://{host}:{port}/predict instead of read from stdin
+    :param host: Host name of the HTTP endpoint
+    :param port: Port of the HTTP endpoint
+    :param backend: Inference backend of the models
+    :return: None
+    """
+    # The pipeline is imported on invocation only, so that the CLI starts without importing it
+    from nextbike.models import PredictionServer
+
+    server = PredictionServer(backend)
+    if http:
+        server.serve_http(host, port)
+    else:
+        server.serve_jsonl()
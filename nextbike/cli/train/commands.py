@@ -3,37 +3,90 @@ import os
 import click
 from yaspin import yaspin
 
-from nextbike.io import get_data_path
-from nextbike.models import DurationModel, DirectionModel
-from nextbike.preprocessing import Preprocessor, Transformer
-
 
 @click.command()
 @click.argument('filename', type=click.Path('rb'))
-def train(filename):
+@click.option('--no-cache', is_flag=True, help='Do not read or write the cache of the cleaned and transformed data.')
+@click.option('--compact', is_flag=True, help='Hold the data in a memory-compact representation.')
+@click.option('--sparse', is_flag=True, help='Keep the one-hot-encoded station features of the duration model sparse.')
+@click.option('--compress', type=click.IntRange(0, 9), default=0,
+              help='Compression level of the saved models (0 keeps them memory-mappable).')
+@click.option('--n-estimators', type=click.IntRange(1), default=100, help='Number of trees of every forest.')
+@click.option('--max-depth', type=click.IntRange(1), help='Maximum depth of the trees (unbounded by default).')
+@click.option('--min-samples-leaf', type=click.IntRange(1), default=1, help='Minimum number of samples in a leaf.')
+@click.option('--max-samples', help='Number (int) or share (float) of the rows drawn for every tree.')
+@click.option('--max-features', help='Number (int), share (float) or rule (sqrt, log2) of the features per split.')
+@click.option('--auto-compact', is_flag=True,
+              help='Search for the smallest forests within the tolerance instead of using the forest options.')
+@click.option('--tolerance', type=click.FloatRange(0), default=0.05,
+              help='Accepted relative increase of the holdout error of --auto-compact.')
+def train(filename, no_cache, compact, sparse, compress, n_estimators, max_depth, min_samples_leaf, max_samples,
+          max_features, auto_compact, tolerance):
     """
     Trains a model based on a given data frame and saves it to disk at {project_dir}/data/output
     :param filename: Path to the data frame which should be used for training
+    :param no_cache: Indicates whether the cache at {project_dir}/data/output/cache should be bypassed
+    :param compact: Indicates whether the data should be held in a memory-compact representation
+    :param sparse: Indicates whether the duration model should be trained on a sparse feature matrix
+    :param compress: Compression level of the saved models and feature pipelines
+    :param n_estimators: Number of trees of every forest
+    :param max_depth: Maximum depth of the trees
+    :param min_samples_leaf: Minimum number of samples in a leaf
+    :param max_samples: Number or share of the rows drawn for every tree
+    :param max_features: Number, share or rule of the features considered per split
+    :param auto_compact: Indicates whether the smallest forests within the tolerance should be searched
+    :param tolerance: Accepted relative increase of the holdout error compared to the default forests
     :return: None
     """
+    # The pipeline is imported on invocation only, so that the CLI starts without importing it
+    from nextbike.io import get_data_path
+    from nextbike.models import DurationModel, DirectionModel
+    from nextbike.preprocessing import Preprocessor, Transformer
+
+    parameters = {'n_estimators': n_estimators, 'max_depth': max_depth, 'min_samples_leaf': min_samples_leaf,
+                  'max_samples': parse_number(max_samples)}
+    # Each model keeps its own default of max_features unless it is specified
+    if max_features is not None:
+        parameters['max_features'] = parse_number(max_features)
     with yaspin(color='blue') as spinner:
         spinner.text = 'Conducting Pre-Processing and Transformation steps ...\t'
-        preprocessor = Preprocessor()
-        preprocessor.load_gdf(filename)
-        preprocessor.clean_gdf()
+        preprocessor = Preprocessor(compact=compact)
+        preprocessor.load_clean_gdf(filename, use_cache=not no_cache)
         transformer = Transformer(preprocessor)
-        transformer.transform()
+        transformer.transform(use_cache=not no_cache)
         spinner.text = 'Training duration model ...\t'
-        duration_model = DurationModel()
+        duration_model = DurationModel(sparse=sparse)
         duration_model.load_from_transformer(transformer, training=True)
-        duration_model.train()
+        if auto_compact:
+            duration_model.train_compact(tolerance, compress=compress)
+        else:
+            duration_model.train(compress=compress, **parameters)
         duration_model.predict()
         duration_model.training_score()
         spinner.text = 'Training direction model ...\t'
         direction_model = DirectionModel()
         direction_model.load_from_transformer(transformer, training=True)
-        direction_model.train()
+        if auto_compact:
+            direction_model.train_compact(tolerance, compress=compress)
+        else:
+            direction_model.train(compress=compress, **parameters)
         direction_model.predict()
         direction_model.training_score()
         spinner.text = 'Models trained and saved to disk at {}.'.format(os.path.join(get_data_path(), 'output'))
         spinner.ok('✅ ')
+
+
+def parse_number(value: str) -> int or float or str:
+    """
+    Converts an option which can be given as count (int), share (float) or rule (str) like max_features of sklearn.
+    :param value: Value of the option
+    :return: The int, float or str (None if the option was not given)
+    """
+    if value is None:
+        return None
+    for type in [int, float]:
+        try:
+            return type(value)
+        except ValueError:
+            pass
+    return value
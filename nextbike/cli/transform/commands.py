@@ -3,32 +3,62 @@ import os
 import click
 from yaspin import yaspin
 
-from nextbike.io import get_data_path
-from nextbike.preprocessing import Preprocessor, Transformer
-
 
 @click.command()
 @click.argument('filename', type=click.Path('rb'))
 @click.option('--output', default='mannheim_transformed.csv', help='Filename of transformed data frame file.')
-def transform(filename, output):
+@click.option('--format', type=click.Choice(['csv', 'csv.gz', 'parquet', 'feather']),
+              help='Output format (default: the format of the extension of the output filename).')
+@click.option('--chunksize', type=int, default=None,
+              help='Stream the data frame in chunks of this many rows (requires data ordered by datetime).')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the cache of the cleaned and transformed data.')
+@click.option('--compact', is_flag=True, help='Hold the data in a memory-compact representation.')
+@click.option('--incremental', is_flag=True,
+              help='Append only the trips of this (newly arrived) data frame to the trip store at data/output/trips.')
+def transform(filename, output, format, chunksize, no_cache, compact, incremental):
     """
     Transforms a given data frame to the target data format
     :param filename: Path to the data frame which should be transformed
     :param output: Filename of the output (please note that outputs are always saved to {project_dir}/data/output
     because of permission safety)
+    :param format: Output format, one of csv, csv.gz, parquet and feather
+    :param chunksize: Number of rows which are read at once in streaming mode (optional)
+    :param no_cache: Indicates whether the cache at {project_dir}/data/output/cache should be bypassed
+    :param compact: Indicates whether the data should be held in a memory-compact representation
+    :param incremental: Indicates whether the trips should be appended to the trip store at
+    {project_dir}/data/output/trips
     :return: None
     """
+    # The pipeline is imported on invocation only, so that the CLI starts without importing it
+    from nextbike.io import get_data_path, get_output_filename
+    from nextbike.preprocessing import Preprocessor, Transformer, stream_transform, save_stream, transform_incremental
+
+    output = get_output_filename(output, format)
+    if incremental:
+        with yaspin(color='blue') as spinner:
+            spinner.text = 'Appending new trips to the trip store ...'
+            n_trips = transform_incremental(Preprocessor(compact=compact), filename,
+                                            chunksize=chunksize if chunksize else 500000)
+            spinner.text = 'Appended {} trips to {}'.format(n_trips, os.path.join(get_data_path(), 'output', 'trips'))
+            spinner.ok('✅ ')
+        return
+
+    if chunksize:
+        with yaspin(color='blue') as spinner:
+            spinner.text = 'Streaming data frame in chunks of {} rows ...'.format(chunksize)
+            n_trips = save_stream(stream_transform(Preprocessor(compact=compact), filename, chunksize), output)
+            spinner.text = 'Saved {} trips to {}'.format(n_trips, os.path.join(get_data_path(), 'output', output))
+            spinner.ok('✅ ')
+        return
+
     with yaspin(color='blue') as spinner:
-        spinner.text = 'Loading data frame ...'
-        preprocessor = Preprocessor()
-        preprocessor.load_gdf(filename)
-        spinner.write('Data frame loaded.')
-        spinner.text = 'Cleaning data frame ...'
-        preprocessor.clean_gdf()
-        spinner.write('Data frame cleaned.')
+        spinner.text = 'Loading and cleaning data frame ...'
+        preprocessor = Preprocessor(compact=compact)
+        preprocessor.load_clean_gdf(filename, use_cache=not no_cache)
+        spinner.write('Data frame loaded and cleaned.')
         spinner.text = 'Translating to target format ...'
         transformer = Transformer(preprocessor)
-        transformer.transform()
+        transformer.transform(use_cache=not no_cache)
         spinner.write('Data frame transformed.')
         spinner.text = 'Check if valid ...'
         transformer.validate()
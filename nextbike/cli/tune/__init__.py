@@ -0,0 +1 @@
+from nextbike.cli.tune.commands import tune
@@ -0,0 +1,33 @@
+import click
+
+
+@click.command()
+@click.argument('filename', type=click.Path('rb'))
+@click.option('--model', type=click.Choice(['duration', 'direction', 'both']), default='both',
+              help='Model whose forest parameters are tuned.')
+@click.option('--n-splits', type=click.IntRange(2), default=3, help='Number of time-ordered cross-validation folds.')
+@click.option('--factor', type=click.IntRange(2), default=3,
+              help='Share (1 / factor) of the candidates which is kept in every round of successive halving.')
+@click.option('--n-jobs', type=int, default=-1, help='Number of parallel fits (-1 uses all cores).')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the cache of the cleaned and prepared data.')
+def tune(filename, model, n_splits, factor, n_jobs, no_cache):
+    """
+    Tunes the forest parameters of the models with time-aware cross-validation and successive halving. The leaderboards
+    are saved to disk at {project_dir}/data/output/tuning
+    :param filename: Path to the data frame which should be used for tuning
+    :param model: Model whose forest parameters are tuned ('duration', 'direction' or 'both')
+    :param n_splits: Number of time-ordered cross-validation folds
+    :param factor: Share (1 / factor) of the candidates which is kept in every round
+    :param n_jobs: Number of parallel fits
+    :param no_cache: Indicates whether the cache at {project_dir}/data/output/cache should be bypassed
+    :return: None
+    """
+    # The pipeline is imported on invocation only, so that the CLI starts without importing it
+    from nextbike.models import Tuner
+
+    types = {'duration': ['regressor'], 'direction': ['classifier'], 'both': ['regressor', 'classifier']}[model]
+    for type in types:
+        tuner = Tuner(type, n_splits=n_splits, factor=factor, n_jobs=n_jobs)
+        tuner.load_from_csv(filename, use_cache=not no_cache)
+        leaderboard = tuner.tune()
+        click.echo(leaderboard.to_string())
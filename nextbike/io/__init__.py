@@ -1,8 +1,12 @@
 from nextbike.io.input import (
     get_data_path,
     read_df,
+    read_raw_df,
+    read_raw_chunks,
     read_model,
-    read_encoder
+    read_artifact,
+    LazyModel,
+    read_pipeline
 )
 from nextbike.io.output import (
     get_data_path,
@@ -10,6 +14,49 @@ from nextbike.io.output import (
     create_dir_if_not_exists,
     save_predictions,
     combine_predictions,
-    save_encoder
+    combine_prediction_frames,
+    save_combined_predictions,
+    save_pipeline,
+    save_profile
+)
+from nextbike.io.utils import (
+    get_data_path,
+    get_model_path,
+    create_temporary_file,
+    replace_file,
+    write_atomically
+)
+from nextbike.io.formats import (
+    get_output_format,
+    get_output_filename,
+    points_to_wkb,
+    FrameWriter,
+    write_frame,
+    create_geo_trips,
+    create_wkb_trips,
+    write_trips,
+    get_geometry_columns,
+    read_frame
+)
+from nextbike.io.cache import (
+    get_cache_key,
+    get_file_fingerprint,
+    get_file_digest,
+    read_cache,
+    write_cache,
+    evict_cache
+)
+from nextbike.io.store import (
+    get_store_dir,
+    read_store_state,
+    append_store,
+    read_store
+)
+from nextbike.io.tuning import (
+    get_tuning_dir,
+    read_feature_cache,
+    write_feature_cache,
+    read_tuning_results,
+    save_tuning_results,
+    save_leaderboard
 )
-from nextbike.io.utils import get_data_path
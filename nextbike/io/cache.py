@@ -0,0 +1,128 @@
+import hashlib
+import os
+
+import geopandas as gpd
+import pandas as pd
+
+from nextbike import __version__
+from nextbike.io.utils import get_data_path, write_atomically
+
+# Upper bound of the total size of all cache entries in bytes (least recently used entries are evicted first)
+MAX_CACHE_SIZE = 2 * 1024 ** 3
+
+# Version of the cached data within one package version, increased whenever the cached data of a stage changes
+CACHE_FORMAT = '3'
+
+
+def get_cache_dir() -> str:
+    """
+    Method returning the directory of the cache and creating it if it does not exist yet.
+    :return: Path of the cache directory
+    """
+    path = os.path.join(get_data_path(), 'output/cache')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_cache_key(path: str, stage: str) -> str:
+    """
+    Method computing the key of a cache entry from the input file, the pipeline stage, the package version and the
+    CACHE_FORMAT. The input file is fingerprinted by its absolute path, size and modification time, so it does not
+    have to be read.
+    :param path: Path pointing to the raw input file
+    :param stage: Name of the pipeline stage whose output is cached (e.g. 'clean' or 'transform')
+    :return: Hex digest identifying the cache entry
+    """
+    fingerprint = '|'.join([get_file_fingerprint(path), __version__, CACHE_FORMAT, stage])
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+
+def get_file_fingerprint(path: str) -> str:
+    """
+    Method identifying a version of a file by its absolute path, size and modification time without reading it.
+    :param path: Path pointing to the file
+    :return: Fingerprint of the file
+    """
+    stat = os.stat(path)
+    return '|'.join([os.path.abspath(path), str(stat.st_size), str(stat.st_mtime_ns)])
+
+
+def get_file_digest(path: str, block_size: int = 2 ** 20) -> str:
+    """
+    Method identifying the content of a file by its SHA-256 digest, independent of its path and modification time.
+    :param path: Path pointing to the file
+    :param block_size: Number of bytes which are read at once
+    :return: Hex digest of the content
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_cache(key: str) -> gpd.GeoDataFrame or None:
+    """
+    Method reading a cached GeoDataFrame.
+    :param key: Key of the cache entry
+    :return: The cached GeoDataFrame or None if there is no (readable) entry
+    """
+    path = os.path.join(get_cache_dir(), key + '.parquet')
+    if not os.path.isfile(path):
+        return None
+    try:
+        gdf = gpd.read_parquet(path)
+    except ImportError:
+        print('Cache is disabled because pyarrow is not installed.')
+        return None
+    except ValueError:
+        # Entries without geometry column (e.g. of compact data frames) do not have GeoParquet metadata
+        gdf = gpd.GeoDataFrame(pd.read_parquet(path))
+    except OSError:
+        # Remove corrupted entries (e.g. of an interrupted write)
+        os.remove(path)
+        return None
+    # Mark the entry as recently used for the eviction policy
+    os.utime(path)
+    return gdf
+
+
+def write_cache(gdf: gpd.GeoDataFrame or pd.DataFrame, key: str, max_size: int = MAX_CACHE_SIZE) -> None:
+    """
+    Method writing a GeoDataFrame as (Geo)Parquet file to the cache and evicting old entries afterwards.
+    :param gdf: GeoDataFrame which should be cached
+    :param key: Key of the cache entry
+    :param max_size: Upper bound of the total cache size in bytes
+    :return: None
+    """
+    path = os.path.join(get_cache_dir(), key + '.parquet')
+    try:
+        # Write to a temporary file of this process first, so that concurrent runs never read a partially written entry
+        with write_atomically(path) as temporary_path:
+            if not any(dtype.name == 'geometry' for dtype in gdf.dtypes):
+                # GeoParquet requires a geometry column, data frames without one are written as plain Parquet
+                pd.DataFrame(gdf).to_parquet(temporary_path)
+            else:
+                gdf.to_parquet(temporary_path)
+    except ImportError:
+        print('Cache is disabled because pyarrow is not installed.')
+        return
+    evict_cache(max_size)
+
+
+def evict_cache(max_size: int = MAX_CACHE_SIZE) -> None:
+    """
+    Method deleting the least recently used cache entries until the total size of the cache is below max_size.
+    :param max_size: Upper bound of the total cache size in bytes
+    :return: None
+    """
+    cache_dir = get_cache_dir()
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+               if name.endswith(('.parquet', '.joblib'))]
+    entries.sort(key=os.path.getmtime)
+    total_size = sum(os.path.getsize(entry) for entry in entries)
+    for entry in entries:
+        if total_size <= max_size:
+            break
+        total_size -= os.path.getsize(entry)
+        os.remove(entry)
@@ -0,0 +1,280 @@
+import gzip
+import json
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from nextbike.io.utils import create_temporary_file, replace_file
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Parquet and Feather outputs are not available without pyarrow
+    pa = None
+
+# Output formats and the file extensions of their files
+OUTPUT_FORMATS = {'csv': '.csv', 'csv.gz': '.csv.gz', 'parquet': '.parquet', 'feather': '.feather'}
+
+# Number of rows which are converted and written at once
+DEFAULT_CHUNKSIZE = 500000
+
+# The fastest gzip level, writing compressed csv is dominated by the formatting of the values anyway
+GZIP_LEVEL = 1
+
+
+def get_output_format(filename: str) -> str:
+    """
+    Method inferring the output format from the extension of a filename.
+    :param filename: Filename of the output
+    :return: The output format (csv if the extension is unknown)
+    """
+    for format, extension in sorted(OUTPUT_FORMATS.items(), key=lambda item: -len(item[1])):
+        if filename.endswith(extension):
+            return format
+    return 'csv'
+
+
+def get_output_filename(filename: str, format: str = None) -> str:
+    """
+    Method replacing the extension of a filename by the extension of the output format.
+    :param filename: Filename of the output (e.g. mannheim_transformed.csv)
+    :param format: One of OUTPUT_FORMATS (Default: The format of the extension)
+    :return: Filename with the extension of the format
+    :raises: ValueError
+    """
+    if format is None:
+        return filename
+    if format not in OUTPUT_FORMATS:
+        raise ValueError('Unknown output format {}. Choose one of {}.'.format(format, ', '.join(OUTPUT_FORMATS)))
+    current = OUTPUT_FORMATS[get_output_format(filename)]
+    stem = filename[:-len(current)] if filename.endswith(current) else filename
+    return stem + OUTPUT_FORMATS[format]
+
+
+def points_to_wkb(lng: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """
+    Encodes coordinates as little-endian WKB points without creating geometry objects.
+    :param lng: Longitudes (x)
+    :param lat: Latitudes (y)
+    :return: Object array of the WKB bytes (None for missing coordinates)
+    """
+    points = np.empty(len(lng), dtype=[('order', 'u1'), ('type', '<u4'), ('x', '<f8'), ('y', '<f8')])
+    points['order'], points['type'], points['x'], points['y'] = 1, 1, lng, lat
+    data = points.tobytes()
+    size = points.dtype.itemsize
+    wkb = np.empty(len(points), dtype=object)
+    wkb[:] = [data[start:start + size] for start in range(0, len(data), size)]
+    wkb[np.isnan(points['x']) | np.isnan(points['y'])] = None
+    return wkb
+
+
+def create_geo_metadata(columns: list, crs: str) -> bytes:
+    """
+    Creates the GeoParquet metadata of WKB encoded geometry columns, so that geopandas.read_parquet and read_feather
+    restore them as geometries.
+    :param columns: Names of the geometry columns, the first one is the primary geometry
+    :param crs: Coordinate reference system of the geometries
+    :return: JSON encoded metadata
+    """
+    from pyproj import CRS
+
+    wkt = CRS(crs).to_wkt()
+    return json.dumps({'primary_column': columns[0],
+                       'columns': {column: {'crs': wkt, 'encoding': 'WKB'} for column in columns},
+                       'schema_version': '0.1.0',
+                       'creator': {'library': 'nextbike'}}).encode('utf-8')
+
+
+class FrameWriter:
+    """
+    This class writes a data frame chunk by chunk to one csv, compressed csv, Parquet or Feather file, so that large
+    outputs are never converted at once. Parquet files get one row group and Feather files one record batch per chunk.
+    The file is written to a temporary path and moved to its destination when the writer is closed.
+    """
+
+    def __init__(self, path: str, format: str = None, index: bool = False, geometry: list = None,
+                 crs: str = 'EPSG:4326'):
+        """
+        Initializes the FrameWriter.
+        :param path: Path of the output file
+        :param format: One of OUTPUT_FORMATS (Default: The format of the extension of the path)
+        :param index: Indicates whether the index should be written (csv formats only)
+        :param geometry: Columns holding WKB points (see points_to_wkb) which are marked as GeoParquet geometries
+        :param crs: Coordinate reference system of the geometry columns
+        :raises: ValueError, ImportError
+        """
+        self.format = get_output_format(path) if format is None else format
+        if self.format not in OUTPUT_FORMATS:
+            raise ValueError('Unknown output format {}. Choose one of {}.'.format(format, ', '.join(OUTPUT_FORMATS)))
+        if self.format in ['parquet', 'feather'] and pa is None:
+            raise ImportError('Writing {} files requires pyarrow. Please install it first.'.format(self.format))
+        self.path = path
+        self.index = index
+        self.geometry = geometry if geometry else []
+        self.crs = crs
+        self.n_rows = 0  # Number of written rows
+        self.__temporary_path = None  # Temporary file of this process which is written until the file is complete
+        self.__handle = None  # Open file (csv formats) or Arrow writer
+        self.__schema = None  # Arrow schema of the first chunk (binary formats)
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        """
+        Appends a chunk to the file.
+        :param chunk: DataFrame with the columns of all chunks
+        :return: None
+        """
+        if self.format in ['csv', 'csv.gz']:
+            # The header is written with the first chunk only
+            header = self.__handle is None
+            if header:
+                self.__temporary_path = create_temporary_file(self.path)
+                self.__handle = (gzip.open(self.__temporary_path, 'wt', compresslevel=GZIP_LEVEL, newline='')
+                                 if self.format == 'csv.gz' else open(self.__temporary_path, 'w', newline=''))
+            chunk.to_csv(self.__handle, index=self.index, header=header)
+        else:
+            if self.__schema is None:
+                table = pa.Table.from_pandas(pd.DataFrame(chunk), preserve_index=False)
+                metadata = dict(table.schema.metadata)
+                if self.geometry:
+                    metadata[b'geo'] = create_geo_metadata(self.geometry, self.crs)
+                self.__schema = table.schema.with_metadata(metadata)
+                table = table.replace_schema_metadata(metadata)
+                self.__temporary_path = create_temporary_file(self.path)
+                if self.format == 'parquet':
+                    self.__handle = pq.ParquetWriter(self.__temporary_path, self.__schema, compression='zstd')
+                else:
+                    options = pa.ipc.IpcWriteOptions(compression='lz4')
+                    self.__handle = pa.ipc.new_file(self.__temporary_path, self.__schema, options=options)
+            else:
+                # Later chunks are converted to the schema of the first one (e.g. columns without any values)
+                table = pa.Table.from_pandas(pd.DataFrame(chunk), schema=self.__schema, preserve_index=False)
+            self.__handle.write_table(table)
+        self.n_rows += len(chunk)
+
+    def close(self) -> None:
+        """
+        Finishes the file and moves it to its destination.
+        :return: None
+        """
+        if self.__handle is None:
+            # Nothing was written, the output is an empty frame
+            self.write(pd.DataFrame())
+        self.__handle.close()
+        replace_file(self.__temporary_path, self.path)
+
+    def abort(self) -> None:
+        """
+        Discards the partially written file.
+        :return: None
+        """
+        if self.__handle is not None:
+            self.__handle.close()
+        if self.__temporary_path is not None and os.path.isfile(self.__temporary_path):
+            os.remove(self.__temporary_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_frame(data: pd.DataFrame, path: str, format: str = None, index: bool = False, geometry: list = None,
+                chunksize: int = DEFAULT_CHUNKSIZE) -> None:
+    """
+    Method writing a data frame chunk by chunk in one of the OUTPUT_FORMATS (see FrameWriter).
+    :param data: DataFrame which should be written
+    :param path: Path of the output file
+    :param format: One of OUTPUT_FORMATS (Default: The format of the extension of the path)
+    :param index: Indicates whether the index should be written (csv formats only)
+    :param geometry: Columns holding WKB points which are marked as GeoParquet geometries
+    :param chunksize: Number of rows which are converted and written at once
+    :return: None
+    """
+    with FrameWriter(path, format, index, geometry) as writer:
+        # Empty frames are written as one empty chunk, so that the columns are kept
+        for start in range(0, max(len(data), 1), chunksize):
+            writer.write(data.iloc[start:start + chunksize])
+
+
+def create_geo_trips(trips: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Materializes the start and end coordinates of the trips as the Point columns start_position and end_position.
+    :param trips: GeoDataFrame of trips with coordinate columns
+    :return: GeoDataFrame of trips with Point columns
+    """
+    geo_trips = gpd.GeoDataFrame(crs='EPSG:4326')
+    for column in trips.columns:
+        if column in ['start_lng', 'end_lng']:
+            continue
+        if column in ['start_lat', 'end_lat']:
+            prefix = column[:-len('_lat')]
+            geo_trips[prefix + '_position'] = gpd.GeoSeries(
+                gpd.points_from_xy(trips[prefix + '_lng'], trips[prefix + '_lat']), index=trips.index, crs='EPSG:4326')
+        else:
+            geo_trips[column] = trips[column]
+    return geo_trips
+
+
+def create_wkb_trips(trips: gpd.GeoDataFrame) -> pd.DataFrame:
+    """
+    Encodes the start and end coordinates of the trips as the WKB point columns start_position and end_position (in the
+    column order of create_geo_trips). No geometry objects are created, which makes binary outputs much faster.
+    :param trips: GeoDataFrame of trips with coordinate columns
+    :return: DataFrame of trips with WKB columns
+    """
+    wkb_trips = pd.DataFrame(index=trips.index)
+    for column in trips.columns:
+        if column in ['start_lng', 'end_lng']:
+            continue
+        if column in ['start_lat', 'end_lat']:
+            prefix = column[:-len('_lat')]
+            wkb_trips[prefix + '_position'] = points_to_wkb(trips[prefix + '_lng'].to_numpy(dtype=float),
+                                                            trips[prefix + '_lat'].to_numpy(dtype=float))
+        else:
+            wkb_trips[column] = trips[column]
+    return wkb_trips
+
+
+def write_trips(writer: FrameWriter, trips: gpd.GeoDataFrame, chunksize: int = DEFAULT_CHUNKSIZE) -> None:
+    """
+    Writes trips chunk by chunk with Point positions, which are WKT text in csv files and GeoParquet WKB columns in
+    Parquet and Feather files.
+    :param writer: FrameWriter of the output file
+    :param trips: GeoDataFrame of trips with coordinate columns
+    :param chunksize: Number of trips which are converted and written at once
+    :return: None
+    """
+    # Empty data frames are written as one empty chunk, so that the columns are kept
+    for start in range(0, max(len(trips), 1), chunksize):
+        chunk = trips.iloc[start:start + chunksize]
+        writer.write(create_geo_trips(chunk) if writer.format in ['csv', 'csv.gz'] else create_wkb_trips(chunk))
+
+
+def get_geometry_columns(filename: str) -> list or None:
+    """
+    Returns the Point columns of trips which are marked as GeoParquet geometries in binary outputs.
+    :param filename: Filename of the output
+    :return: List of the columns or None for csv outputs
+    """
+    return None if get_output_format(filename) in ['csv', 'csv.gz'] else ['start_position', 'end_position']
+
+
+def read_frame(path: str) -> pd.DataFrame:
+    """
+    Method reading an output file of one of the OUTPUT_FORMATS (geometry columns are returned as WKB bytes).
+    :param path: Path of the output file
+    :return: DataFrame
+    """
+    format = get_output_format(path)
+    if format == 'parquet':
+        return pd.read_parquet(path)
+    if format == 'feather':
+        return pd.read_feather(path)
+    return pd.read_csv(path)
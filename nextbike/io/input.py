@@ -1,13 +1,17 @@
 import os
 import pickle
+import time
+import warnings
+from typing import Iterator
 
 import joblib
 import pandas as pd
-from sklearn.preprocessing import LabelEncoder, OneHotEncoder
 
-from nextbike.io.utils import get_data_path
+from nextbike.io.utils import get_data_path, get_model_path
+from nextbike.profiling import profiled
 
 
+@profiled('read_df', rows=lambda df, *args, **kwargs: len(df) if isinstance(df, pd.DataFrame) else None)
 def read_df(path: str = os.path.join(get_data_path(), 'input/<My_data>.csv'), **kwargs) -> pd.DataFrame:
     """
     Method importing a DataFrame from a specified path
@@ -22,38 +26,188 @@ def read_df(path: str = os.path.join(get_data_path(), 'input/<My_data>.csv'), **
         print('Data file not found. Path was ' + path)
 
 
-def read_model(type: str = 'regressor'):
+# Compact dtypes of the raw NextBike data format (coordinates stay float64 because of the geo filtering precision)
+RAW_DTYPES = {
+    'p_spot': 'bool',
+    'p_place_type': 'int32',
+    'b_number': 'int32',
+    'trip': 'category',
+    'p_uid': 'int32',
+    'p_bikes': 'int32',
+    'p_lat': 'float64',
+    'b_bike_type': 'category',
+    'p_name': 'category',
+    'p_number': 'int32',
+    'p_lng': 'float64',
+    'p_bike': 'bool'
+}
+RAW_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def get_csv_engine() -> str:
+    """
+    Method returning the fastest available pandas csv engine. The pyarrow engine parses multithreaded.
+    :return: Name of the engine
+    """
+    try:
+        import pyarrow  # noqa: F401
+        return 'pyarrow'
+    except ImportError:
+        return 'c'
+
+
+@profiled('read_raw_df', rows=lambda df, *args, **kwargs: len(df) if isinstance(df, pd.DataFrame) else None)
+def read_raw_df(path: str = os.path.join(get_data_path(), 'input/<My_data>.csv')) -> pd.DataFrame:
+    """
+    Method importing a raw NextBike DataFrame with explicit compact dtypes and an explicit datetime format. Falls back
+    to read_df with inferred dtypes if the file does not match the raw schema (e.g. missing values in integer columns).
+    :param path: A str pointing to the respective csv file
+    :return: DataFrame
+    """
+    start = time.perf_counter()
+    try:
+        df = pd.read_csv(path, index_col=0, dtype=RAW_DTYPES, engine=get_csv_engine())
+        df['datetime'] = pd.to_datetime(df['datetime'], format=RAW_DATETIME_FORMAT)
+        # The pyarrow engine names an unnamed index column with an empty string
+        if df.index.name == '':
+            df.index.name = None
+    except FileNotFoundError:
+        print('Data file not found. Path was ' + path)
+        return None
+    except (KeyError, TypeError, ValueError):
+        print('Data file does not match the typed raw schema. Falling back to dtype inference.')
+        return read_df(path, index_col=0, parse_dates=['datetime'])
+
+    prepare_raw_categories(df)
+    duration = time.perf_counter() - start
+    print('Read {} rows in {:.2f}s ({:.0f} rows/s).'.format(len(df), duration, len(df) / max(duration, 1e-9)))
+    return df
+
+
+def read_raw_chunks(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
     """
-    Method for reading in pickled models
+    Method importing a raw NextBike csv file chunk by chunk with the compact dtypes and the datetime format of
+    read_raw_df. Columns of a chunk which do not match the raw schema (e.g. missing values in integer columns) keep
+    their inferred dtype like in the fallback of read_raw_df.
+    :param path: A str pointing to the respective csv file
+    :param chunksize: Number of rows per chunk
+    :return: Iterator of DataFrames
+    :raises: FileNotFoundError
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError('Data file not found. Path was ' + path)
+    categories = {column: dtype for column, dtype in RAW_DTYPES.items() if dtype == 'category'}
+    # The pyarrow engine does not read in chunks
+    with pd.read_csv(path, index_col=0, dtype=categories, chunksize=chunksize) as reader:
+        for df in reader:
+            for column, dtype in RAW_DTYPES.items():
+                if column in df and dtype != 'category' and not df[column].isna().any():
+                    try:
+                        df[column] = df[column].astype(dtype)
+                    except (TypeError, ValueError):
+                        pass
+            try:
+                df['datetime'] = pd.to_datetime(df['datetime'], format=RAW_DATETIME_FORMAT)
+            except ValueError:
+                df['datetime'] = pd.to_datetime(df['datetime'])
+            prepare_raw_categories(df)
+            yield df
+
+
+def prepare_raw_categories(df: pd.DataFrame) -> None:
+    """
+    Method preparing the categorical columns of a raw DataFrame for the cleaning: missing strings are missing values
+    and 0 is a valid category of columns with missing values.
+    :param df: Raw DataFrame
+    :return: None
+    """
+    for column in df.select_dtypes('category').columns:
+        # The pyarrow engine reads missing strings as empty strings, they are missing values like in read_df
+        if '' in df[column].cat.categories:
+            df[column] = df[column].cat.remove_categories([''])
+        # Make 0 a valid category, so that missing values can be filled with 0 like in all other columns
+        if df[column].isna().any():
+            df[column] = df[column].cat.add_categories([0])
+
+
+def read_model(type: str = 'regressor', mmap_mode: str = 'r', lazy: bool = False):
+    """
+    Method for reading in persisted models. Models saved by earlier versions as pickle files are read as well.
     :param type: A string representing if type of model is related to duration, false booking or direction prediction
-    :return: model instance
+    :param mmap_mode: Memory-map mode of the large arrays of uncompressed artifacts (None reads them into memory)
+    :param lazy: Indicates whether the model should only be loaded on first use
+    :return: model instance (or a LazyModel proxy of it)
+    :raises: FileNotFoundError
     """
-    if type == 'regressor':
-        path = os.path.join(get_data_path(), 'output/duration.pkl')
-        with open(path, 'rb') as f:
-            model = pickle.load(f)
-    elif type == 'booking_filter':
-        path = os.path.join(get_data_path(), 'output/booking_filter.pkl')
-        with open(path, 'rb') as f:
-            model = pickle.load(f)
-    elif type == 'classifier':
-        path = os.path.join(get_data_path(), 'output/direction.pkl')
-        with open(path, 'rb') as f:
-            model = pickle.load(f)
-    return model
+    path = get_model_path(type)
+    if not os.path.isfile(path):
+        with open(get_model_path(type, '.pkl'), 'rb') as f:
+            return pickle.load(f)
+    if lazy:
+        return LazyModel(path, mmap_mode)
+    return read_artifact(path, mmap_mode)
 
 
-def read_encoder(type: str = 'label') -> LabelEncoder or OneHotEncoder:
+def read_artifact(path: str, mmap_mode: str = 'r'):
     """
-    Mehthod to read the classes of an encoder object for later use
-    :return: Encoder Object containing the correct classes
+    Method for reading in a joblib artifact. The large arrays of uncompressed artifacts are memory-mapped, so that
+    several processes share one copy in the page cache. Compressed artifacts are decompressed into memory.
+    :param path: Path pointing to the artifact
+    :param mmap_mode: Memory-map mode of the large arrays (None reads them into memory)
+    :return: The persisted object
+    """
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='.*mmap_mode.*', category=UserWarning)
+        return joblib.load(path, mmap_mode=mmap_mode)
+
+
+class LazyModel:
+    """
+    This class is a proxy of a persisted model which is only loaded on its first use.
+    """
+
+    def __init__(self, path: str, mmap_mode: str = 'r'):
+        """
+        Initializes the proxy without loading the model.
+        :param path: Path pointing to the artifact
+        :param mmap_mode: Memory-map mode of the large arrays (None reads them into memory)
+        """
+        object.__setattr__(self, '_path', path)
+        object.__setattr__(self, '_mmap_mode', mmap_mode)
+        object.__setattr__(self, '_model', None)
+
+    def get_model(self):
+        """
+        Loads the model on first use.
+        :return: model instance
+        """
+        if self._model is None:
+            object.__setattr__(self, '_model', read_artifact(self._path, self._mmap_mode))
+        return self._model
+
+    def __getattr__(self, name: str):
+        # copy and pickle create instances without __init__, so private names must not trigger loading the model
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get_model(), name)
+
+    def __reduce__(self):
+        # Copies and unpickled proxies load the artifact again on their first use
+        return LazyModel, (self._path, self._mmap_mode)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(self.get_model(), name, value)
+
+
+def read_pipeline(type: str = 'regressor', mmap_mode: str = 'r'):
+    """
+    Method for reading in the fitted feature pipeline of a model
+    :param type: A string representing if the pipeline belongs to the duration or direction model
+    :param mmap_mode: Memory-map mode of the large arrays of uncompressed artifacts (None reads them into memory)
+    :return: FeaturePipeline
     """
     path = os.path.join(get_data_path(), 'output')
-    if type == 'label':
-        encoder = joblib.load(os.path.join(path, 'classes.joblib'))
-    elif type == 'season':
-        encoder = joblib.load(os.path.join(path, 'season.joblib'))
-    elif type == 'station':
-        encoder = joblib.load(os.path.join(path, 'station.joblib'))
-
-    return encoder
+    if type == 'regressor':
+        return read_artifact(os.path.join(path, 'duration_pipeline.joblib'), mmap_mode)
+    elif type == 'classifier':
+        return read_artifact(os.path.join(path, 'direction_pipeline.joblib'), mmap_mode)
@@ -1,27 +1,23 @@
 import os
-import pickle
+import time
 from pathlib import Path
 
 import joblib
 import pandas as pd
-from sklearn.preprocessing import LabelEncoder
 
-from nextbike.io import get_data_path
+from nextbike.io.formats import FrameWriter, get_geometry_columns, get_output_filename, read_frame, write_trips
+from nextbike.io.utils import get_data_path, get_model_path
 
 
-def save_model(model, type: str = 'regressor') -> None:
+def save_model(model, type: str = 'regressor', compress: int = 0) -> None:
     """
-    Method for saving trained models to disc.
+    Method for saving trained models to disc. Uncompressed artifacts are memory-mapped when they are read.
     :param model: A trained model instance
     :param type: A string representing if type of model is related to duration, false booking or direction prediction
+    :param compress: Compression level from 0 (no compression, allows memory-mapped loading) to 9
     :return: None
     """
-    if type == 'regressor':
-        pickle.dump(model, open(os.path.join(get_data_path(), 'output/duration.pkl'), 'wb'))
-    elif type == 'booking_filter':
-        pickle.dump(model, open(os.path.join(get_data_path(), 'output/booking_filter.pkl'), 'wb'))
-    elif type == 'classifier':
-        pickle.dump(model, open(os.path.join(get_data_path(), 'output/direction.pkl'), 'wb'))
+    joblib.dump(model, get_model_path(type), compress=compress)
 
 
 def create_dir_if_not_exists(path: str) -> None:
@@ -33,56 +29,109 @@ def create_dir_if_not_exists(path: str) -> None:
     Path(path).mkdir(parents=True, exist_ok=True)
 
 
-def save_predictions(predicted_data: pd.DataFrame, type: str = 'regressor') -> None:
+def save_predictions(predicted_data: pd.DataFrame, type: str = 'regressor', format: str = 'csv') -> None:
     """
-    Method that saves DataFrames containing the raw data as well as predictions
+    Method that saves DataFrames containing the raw data as well as predictions. The start and end coordinates are
+    saved as the Point columns start_position and end_position like in Transformer.save.
     :param predicted_data: A DataFrame containing raw data and predictions
     :param type: A string representing if type of model is related to duration, false booking or direction prediction
+    :param format: Output format, one of csv, csv.gz, parquet and feather
     :return: None
     """
     path = os.path.join(get_data_path(), 'output')
     create_dir_if_not_exists(path)
     if type == 'regressor':
-        predicted_data.to_csv(os.path.join(path, 'duration_predictions.csv'), index=False)
+        filename = get_output_filename('duration_predictions.csv', format)
     elif type == 'classifier':
-        predicted_data.to_csv(os.path.join(path, 'direction_predictions.csv'), index=False)
+        filename = get_output_filename('direction_predictions.csv', format)
+    else:
+        return
+    with FrameWriter(os.path.join(path, filename), geometry=get_geometry_columns(filename)) as writer:
+        write_trips(writer, predicted_data)
 
 
-def save_encoder(encoder: LabelEncoder, type: str = 'label') -> None:
+def save_pipeline(pipeline, type: str = 'regressor', compress: int = 0) -> None:
     """
-    Mehthod to save the classes of an encoder object for later use
-    :param encoder: The encoder object that was fit and used to transform target features in classification
+    Method to save the fitted feature pipeline of a model for later use
+    :param pipeline: The FeaturePipeline that was fit during the preparation of the training data
+    :param type: A string representing if the pipeline belongs to the duration or direction model
+    :param compress: Compression level from 0 (no compression, allows memory-mapped loading) to 9
     :return: None
     """
     path = os.path.join(get_data_path(), 'output')
-    if type == 'label':
-        joblib.dump(encoder, os.path.join(path, 'classes.joblib'))
-    elif type == 'season':
-        joblib.dump(encoder, os.path.join(path, 'season.joblib'))
-    elif type == 'station':
-        joblib.dump(encoder, os.path.join(path, 'station.joblib'))
+    create_dir_if_not_exists(path)
+    if type == 'regressor':
+        joblib.dump(pipeline, os.path.join(path, 'duration_pipeline.joblib'), compress=compress)
+    elif type == 'classifier':
+        joblib.dump(pipeline, os.path.join(path, 'direction_pipeline.joblib'), compress=compress)
 
 
-def combine_predictions() -> None:
+def save_profile(profiler, name: str = 'run') -> str:
+    """
+    Method saving the run report of a Profiler as JSON and CSV file to {project_dir}/data/output/profiles.
+    :param profiler: The Profiler which recorded the run
+    :param name: Name of the run (e.g. the CLI command)
+    :return: Path of the reports without extension
+    """
+    path = os.path.join(get_data_path(), 'output', 'profiles')
+    create_dir_if_not_exists(path)
+    report_path = os.path.join(path, '{}-{}'.format(name, time.strftime('%Y%m%d-%H%M%S')))
+    profiler.save(report_path + '.json')
+    profiler.save(report_path + '.csv')
+    return report_path
+
+
+def combine_prediction_frames(duration_predictions: pd.DataFrame, direction_predictions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Method combining the duration and direction predictions of the same trips row by row.
+    :param duration_predictions: DataFrame of the duration predictions (raw data and 'predictions')
+    :param direction_predictions: DataFrame of the direction predictions (raw data and 'direction')
+    :return: The duration predictions with the predicted direction
+    """
+    return pd.concat([duration_predictions.reset_index(drop=True),
+                      direction_predictions['direction'].reset_index(drop=True)], axis=1)
+
+
+def save_combined_predictions(predictions: pd.DataFrame, filename: str = 'final_predictions.csv',
+                              format: str = None) -> str:
+    """
+    Method saving the combined duration and direction predictions to {project_dir}/data/output. The start and end
+    coordinates are saved as the Point columns start_position and end_position like in Transformer.save.
+    :param predictions: DataFrame of the combined predictions (columns which already hold the positions, e.g. read by
+                        combine_predictions, are saved as they are)
+    :param filename: Filename of the combined predictions
+    :param format: Output format, one of csv, csv.gz, parquet and feather (Default: The format of the extension)
+    :return: Path of the saved file
+    """
+    path = os.path.join(get_data_path(), 'output')
+    create_dir_if_not_exists(path)
+    filename = get_output_filename(filename, format)
+    with FrameWriter(os.path.join(path, filename), index=True, geometry=get_geometry_columns(filename)) as writer:
+        write_trips(writer, predictions)
+    return os.path.join(path, filename)
+
+
+def combine_predictions(format: str = 'csv') -> None:
     """
     Method combining duration and direction prediction and saving the file to disc.
+    :param format: Format of the saved predictions and the combined file, one of csv, csv.gz, parquet and feather
     :return: None
     """
+    path = os.path.join(get_data_path(), 'output')
     # Trying to load data from duration prediction
     try:
-        duration_predictions = pd.read_csv(os.path.join(get_data_path(), 'output/duration_predictions.csv'))
+        duration_predictions = read_frame(os.path.join(path, get_output_filename('duration_predictions.csv', format)))
     except Exception as e:
         print('Data from duration prediction could not be loaded.')
         raise e
 
     # Trying to load data from direction prediction
     try:
-        direction_predictions = pd.read_csv(os.path.join(get_data_path(), 'output/direction_predictions.csv'))
+        direction_predictions = read_frame(os.path.join(path, get_output_filename('direction_predictions.csv', format)))
     except Exception as e:
         print('Data from direction prediction could not be loaded.')
         raise e
 
     # Concatenating both DataFrames and save them to disk
-    final_df = pd.concat([duration_predictions, direction_predictions['direction']], axis=1)
-    final_df.to_csv(os.path.join(get_data_path(), 'output/final_predictions.csv'))
+    save_combined_predictions(combine_prediction_frames(duration_predictions, direction_predictions), format=format)
     print('Prediction data was combined and saved to disc.')
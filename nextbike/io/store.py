@@ -0,0 +1,74 @@
+import os
+import pickle
+
+import pandas as pd
+
+from nextbike.io.utils import get_data_path, write_atomically
+
+
+def get_store_dir(name: str = 'trips') -> str:
+    """
+    Method returning the directory of an append-only trip store and creating it if it does not exist yet.
+    :param name: Name of the store
+    :return: Path of the store directory
+    """
+    path = os.path.join(get_data_path(), 'output', name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def read_store_state(name: str = 'trips') -> dict:
+    """
+    Method reading the state of a trip store. Parts which were written but not committed by the state (e.g. of an
+    interrupted run) are removed.
+    :param name: Name of the store
+    :return: Dict with the number of committed parts 'n_parts', the content digests of the appended files 'sources'
+             and the carried booking state of the Preprocessor
+    """
+    store_dir = get_store_dir(name)
+    state_path = os.path.join(store_dir, 'state.pkl')
+    state = {'n_parts': 0, 'sources': []}
+    if os.path.isfile(state_path):
+        with open(state_path, 'rb') as f:
+            state = pickle.load(f)
+    for part in os.listdir(store_dir):
+        if part.startswith('part-') and int(part[len('part-'):].split('.')[0]) >= state['n_parts']:
+            os.remove(os.path.join(store_dir, part))
+    return state
+
+
+def append_store(trips: pd.DataFrame, state: dict, name: str = 'trips') -> None:
+    """
+    Method appending trips as a new Parquet part to a trip store and committing the new state afterwards.
+    :param trips: DataFrame of trips (without geometries)
+    :param state: State of the store as returned by read_store_state and updated by the caller
+    :param name: Name of the store
+    :return: None
+    :raises: ImportError
+    """
+    store_dir = get_store_dir(name)
+    if len(trips):
+        try:
+            pd.DataFrame(trips).to_parquet(os.path.join(store_dir, 'part-{:05d}.parquet'.format(state['n_parts'])),
+                                           index=False)
+        except ImportError:
+            raise ImportError('The trip store requires pyarrow. Please install it via pip3 install .[cache]')
+        state['n_parts'] += 1
+    # Write to a temporary file of this process first, so that an interrupted run never leaves a partially written state
+    with write_atomically(os.path.join(store_dir, 'state.pkl')) as temporary_path:
+        with open(temporary_path, 'wb') as f:
+            pickle.dump(state, f)
+
+
+def read_store(name: str = 'trips') -> pd.DataFrame:
+    """
+    Method reading all committed trips of a trip store in the order in which they were appended.
+    :param name: Name of the store
+    :return: DataFrame of trips
+    """
+    store_dir = get_store_dir(name)
+    n_parts = read_store_state(name)['n_parts']
+    parts = [pd.read_parquet(os.path.join(store_dir, 'part-{:05d}.parquet'.format(i))) for i in range(n_parts)]
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat(parts, ignore_index=True)
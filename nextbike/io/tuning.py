@@ -0,0 +1,86 @@
+import os
+
+import joblib
+import pandas as pd
+
+from nextbike.io.cache import evict_cache, get_cache_dir
+from nextbike.io.input import read_artifact
+from nextbike.io.utils import get_data_path, write_atomically
+
+
+def get_tuning_dir() -> str:
+    """
+    Method returning the directory of the tuning results and creating it if it does not exist yet.
+    :return: Path of the tuning directory
+    """
+    path = os.path.join(get_data_path(), 'output', 'tuning')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def read_feature_cache(key: str) -> dict or None:
+    """
+    Method reading cached prepared features. Their arrays are memory-mapped, so that parallel fits share one copy.
+    :param key: Key of the cache entry
+    :return: Dict of the cached features or None if there is no (readable) entry
+    """
+    path = os.path.join(get_cache_dir(), key + '.joblib')
+    if not os.path.isfile(path):
+        return None
+    try:
+        contents = read_artifact(path)
+    except (EOFError, OSError, ValueError):
+        # Remove corrupted entries (e.g. of an interrupted write)
+        os.remove(path)
+        return None
+    # Mark the entry as recently used for the eviction policy
+    os.utime(path)
+    return contents
+
+
+def write_feature_cache(contents: dict, key: str) -> None:
+    """
+    Method writing prepared features as uncompressed joblib artifact to the cache and evicting old entries afterwards.
+    :param contents: Dict of the prepared features
+    :param key: Key of the cache entry
+    :return: None
+    """
+    path = os.path.join(get_cache_dir(), key + '.joblib')
+    # Write to a temporary file of this process first, so that concurrent runs never read a partially written entry
+    with write_atomically(path) as temporary_path:
+        joblib.dump(contents, temporary_path)
+    evict_cache()
+
+
+def read_tuning_results(name: str) -> pd.DataFrame:
+    """
+    Method reading the results of all fits of earlier tuning runs of a model.
+    :param name: Name of the tuned model ('duration' or 'direction')
+    :return: DataFrame with one row per fit (empty if the model was not tuned yet)
+    """
+    path = os.path.join(get_tuning_dir(), name + '_results.csv')
+    if not os.path.isfile(path):
+        return pd.DataFrame()
+    return pd.read_csv(path)
+
+
+def save_tuning_results(results: pd.DataFrame, name: str) -> None:
+    """
+    Method saving the results of all fits of the tuning runs of a model.
+    :param results: DataFrame with one row per fit
+    :param name: Name of the tuned model ('duration' or 'direction')
+    :return: None
+    """
+    path = os.path.join(get_tuning_dir(), name + '_results.csv')
+    with write_atomically(path) as temporary_path:
+        results.to_csv(temporary_path, index=False)
+
+
+def save_leaderboard(leaderboard: pd.DataFrame, name: str) -> None:
+    """
+    Method saving the leaderboard of a tuning run of a model.
+    :param leaderboard: DataFrame with one row per candidate
+    :param name: Name of the tuned model ('duration' or 'direction')
+    :return: None
+    """
+    leaderboard.to_csv(os.path.join(get_tuning_dir(), name + '_leaderboard.csv'), index=False)
@@ -1,4 +1,8 @@
+import contextlib
 import os
+import shutil
+import tempfile
+from typing import Iterator
 
 
 def get_data_path():
@@ -8,3 +12,70 @@ def get_data_path():
         return os.path.join(os.getcwd(), '../data')
     else:
         raise FileNotFoundError
+
+
+def get_model_path(type: str = 'regressor', extension: str = '.joblib') -> str:
+    """
+    Method returning the path of a model artifact.
+    :param type: A string representing if type of model is related to duration, false booking or direction prediction
+    :param extension: File extension of the artifact ('.pkl' for models saved by earlier versions)
+    :return: Path of the artifact
+    """
+    if type == 'regressor':
+        name = 'duration'
+    elif type == 'booking_filter':
+        name = 'booking_filter'
+    elif type == 'classifier':
+        name = 'direction'
+    else:
+        raise ValueError('Unknown model type: {}'.format(type))
+    return os.path.join(get_data_path(), 'output', name + extension)
+
+
+def create_temporary_file(path: str) -> str:
+    """
+    Method creating an empty temporary file of this process next to a file which is written, so that concurrent
+    processes writing the same file never share a temporary file.
+    :param path: Path of the written file
+    :return: Path of the temporary file
+    """
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                     delete=False) as f:
+        return f.name
+
+
+def replace_file(temporary_path: str, path: str, mode_path: str = None) -> None:
+    """
+    Method moving a completely written temporary file to its destination in one atomic step.
+    :param temporary_path: Path of the temporary file (see create_temporary_file)
+    :param path: Path of the written file
+    :param mode_path: Path of a file whose permissions the written file gets (Default: The permissions of new files)
+    :return: None
+    """
+    # Temporary files are only readable by their owner
+    if mode_path is not None and os.path.isfile(mode_path):
+        shutil.copymode(mode_path, temporary_path)
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temporary_path, 0o666 & ~umask)
+    os.replace(temporary_path, path)
+
+
+@contextlib.contextmanager
+def write_atomically(path: str, mode_path: str = None) -> Iterator[str]:
+    """
+    Context manager yielding the path of a temporary file which is written instead of path. The temporary file replaces
+    path once the block completes and is removed if the block fails, so that readers never see a partially written file.
+    :param path: Path of the written file
+    :param mode_path: Path of a file whose permissions the written file gets (Default: The permissions of new files)
+    :return: Iterator of the path of the temporary file
+    """
+    temporary_path = create_temporary_file(path)
+    try:
+        yield temporary_path
+        replace_file(temporary_path, path, mode_path)
+    except BaseException:
+        if os.path.isfile(temporary_path):
+            os.remove(temporary_path)
+        raise
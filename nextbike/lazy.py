@@ -0,0 +1,26 @@
+from importlib import import_module
+
+
+def lazy_exports(package: str, exports: dict) -> tuple:
+    """
+    Creates the module level __getattr__ and __dir__ of a package whose public names are imported on first access.
+    Importing the package itself stays cheap, so that e.g. the CLI only pays for pandas, geopandas and scikit-learn if
+    the invoked command needs them.
+    :param package: Name of the package (__name__)
+    :param exports: Dict mapping every public name to the module defining it (or to the submodule of the same name)
+    :return: Tuple of the __getattr__ and __dir__ functions of the package
+    """
+    def __getattr__(name: str):
+        if name not in exports:
+            raise AttributeError('module {} has no attribute {}'.format(package, name))
+        module = import_module(exports[name])
+        # Exported submodules are returned themselves, all other names are looked up in their module
+        value = module if module.__name__ == '{}.{}'.format(package, name) else getattr(module, name)
+        # Cache the value in the package, so that __getattr__ is only called on first access
+        setattr(import_module(package), name, value)
+        return value
+
+    def __dir__() -> list:
+        return sorted(set(vars(import_module(package))) | set(exports))
+
+    return __getattr__, __dir__
@@ -1,10 +1,14 @@
+import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report
 
 from nextbike import io
 from nextbike.models import utils
+from nextbike.models.FeaturePipeline import load_pipeline
+from nextbike.models.FlatForest import BACKENDS, FlatForest, load_flat_forest
 from nextbike.models.Model import Model
 from nextbike.preprocessing import Preprocessor, Transformer
+from nextbike.profiling import profile_stage
 
 
 class DirectionModel(Model):
@@ -12,7 +16,15 @@ class DirectionModel(Model):
     Class for the training/prediction of direction models inheriting from the abstract class Model.
     """
 
-    def __init__(self):
+    def __init__(self, backend: str = 'sklearn') -> None:
+        """
+        Initializes the DirectionModel.
+        :param backend: Inference backend of the predictions, either 'sklearn' or 'numpy' (flattened forest, which is
+                        faster for small batches)
+        :raises: ValueError
+        """
+        if backend not in BACKENDS:
+            raise ValueError('Unknown backend {}. Choose one of {}.'.format(backend, ', '.join(BACKENDS)))
         super().__init__()
         self.raw_data = None  # Data obtained from preliminary transformation step
         self.predicted_data = None  # Raw data with added predictions
@@ -21,24 +33,26 @@ class DirectionModel(Model):
         self.features = None  # Vector containing the features
         self.target = None  # Vector containing the target
         self.predictions = None  # Vector containing the predictions
+        self.pipeline = None  # Fitted feature pipeline
         self.encoder = None  # Encoder instance for label encoding
+        self.backend = backend  # Inference backend of the predictions
 
-    def load_from_csv(self, path: str = None, training: bool = True) -> None:
+    def load_from_csv(self, path: str = None, training: bool = True, use_cache: bool = True) -> None:
         """
         Method that allows the user to load data from a .csv file from a specified path.
         After transformation steps this data is passed on to load_from_transformer to initiate preparation steps.
         :param path: A str pointing to the respective csv file
         :param training: Boolean indicating whether data should be prepared for training
+        :param use_cache: Boolean indicating whether cleaned and transformed data should be read from/written to cache
         :return: None
         """
         # Conduct pre-processing steps
         p = Preprocessor()
-        p.load_gdf(path=path)
-        p.clean_gdf()
+        p.load_clean_gdf(path=path, use_cache=use_cache)
 
         # Conduct transformation steps
         t = Transformer(p)
-        t.transform()
+        t.transform(use_cache=use_cache)
 
         # Pass transformed data to load from transformer for final preparation
         self.load_from_transformer(t, training)
@@ -56,28 +70,44 @@ class DirectionModel(Model):
             print("Transformation was not successful.")
         else:
             print('Transformation was successful. Conducting feature engineering now.')
-            contents = utils.classification_preparation(transformer, training)
+            # Predictions reuse the pipeline fit by this instance (or the persisted one), training fits a new one
+            contents = utils.classification_preparation(transformer, training, None if training else self.pipeline)
 
             self.raw_data = contents['raw_data']
             self.prepared_data = contents['prepared_data']
             self.features = contents['features']
             self.target = contents['target']
+            self.pipeline = contents['pipeline']
             self.encoder = contents['encoder']
 
-    def train(self, n_jobs: int = -1, random_state: int = 123) -> None:
+    def train(self, n_jobs: int = -1, random_state: int = 123, compress: int = 0, n_estimators: int = 100,
+              max_depth: int = None, min_samples_leaf: int = 1, max_samples: int or float = None,
+              max_features: int or float or str = 'sqrt') -> None:
         """
         Method for duration prediction model training utilizing sklearn's RandomForestClassifier.
         :param n_jobs: An int specifying the number of threads to be used for training. Default: All available threads
         :param random_state: An int to lock the randomness of the model for reproducibility. If None results can vary
+        :param compress: Compression level of the saved artifacts from 0 (no compression, allows memory-mapped
+                         loading) to 9
+        :param n_estimators: Number of trees in the forest
+        :param max_depth: Maximum depth of the trees. Default: Unbounded
+        :param min_samples_leaf: Minimum number of samples in a leaf
+        :param max_samples: Number (int) or share (float) of the rows drawn for every tree. Default: All rows
+        :param max_features: Number (int), share (float) or rule ('sqrt', 'log2') of the features considered per split
         :return:
         """
         # Initialize the model with given parameters
-        direction_model = RandomForestClassifier(n_jobs=n_jobs, random_state=random_state)
+        direction_model = RandomForestClassifier(n_jobs=n_jobs, random_state=random_state, n_estimators=n_estimators,
+                                                 max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                                                 max_samples=max_samples, max_features=max_features)
         print('RandomForestClassifier model is initialized with n_jobs: {} and random_state: {}'.format(n_jobs,
                                                                                                         random_state))
+        print('Forest parameters: n_estimators: {}, max_depth: {}, min_samples_leaf: {}, max_samples: {}, '
+              'max_features: {}'.format(n_estimators, max_depth, min_samples_leaf, max_samples, max_features))
         # Initiating the training process
         print('Conducting training on {} rows for direction classification.'.format(len(self.target)))
-        direction_model.fit(self.features, self.target.ravel())
+        with profile_stage('direction.fit', rows=len(self.target)):
+            direction_model.fit(self.features, self.target.ravel())
         print('Training was successful.')
 
         # Assigning the trained model to the respective class attribute
@@ -85,23 +115,52 @@ class DirectionModel(Model):
 
         # Save the trained model to disc
         print('Saving the duration model to disc.')
-        io.save_model(direction_model, type='classifier')
+        io.save_model(direction_model, type='classifier', compress=compress)
+
+        # Save the fitted feature pipeline (label encoder) together with the model
+        self.pipeline.save(compress)
 
         print('Training process is complete.')
 
-    def predict(self, path: str = None, save=False) -> None:
+    def train_compact(self, tolerance: float = 0.05, n_jobs: int = -1, random_state: int = 123,
+                      compress: int = 0) -> pd.DataFrame:
+        """
+        Method that searches for the smallest forest whose holdout error is at most (1 + tolerance) times the error of
+        the default forest and trains the direction model with its parameters.
+        :param tolerance: Accepted relative increase of the misclassification rate compared to the default forest
+        :param n_jobs: An int specifying the number of threads to be used for training. Default: All available threads
+        :param random_state: An int to lock the randomness of the search and the model for reproducibility
+        :param compress: Compression level of the saved artifacts
+        :return: A DataFrame reporting error, model size, train time and predict latency of every candidate
+        """
+        print('Searching for a compact direction model on {} rows.'.format(len(self.target)))
+        search = utils.search_compact_forest(RandomForestClassifier, self.features, self.target,
+                                             self.raw_data['start_time'], tolerance, n_jobs=n_jobs,
+                                             random_state=random_state)
+        print(search['report'].to_string())
+        self.train(n_jobs, random_state, compress, **search['parameters'])
+        return search['report']
+
+    def predict(self, path: str = None, save=False, format: str = 'csv') -> None:
         """
         A method for prediction.
         :param path: A str pointing to the respective csv file containing the data that should be predicted (optional).
                      Only needed if instance was not used for training.
         :param save: A boolean whether predicted data should be saved to output directory
+        :param format: Format of the saved predictions, one of csv, csv.gz, parquet and feather
         :return: A DataFrame containing the raw data as well as predictions
         """
         # Try to load duration prediction model if class instance was not used for training
         try:
             if self.model is None:
                 print('This DirectionModel instance does not have a model loaded. Loading model from "data/output".')
-                self.model = io.read_model(type='classifier')
+                if self.backend == 'numpy':
+                    self.model = load_flat_forest(type='classifier')
+                else:
+                    self.model = io.read_model(type='classifier', lazy=True)
+            elif self.backend == 'numpy' and not isinstance(self.model, FlatForest):
+                # Instances which were used for training predict with a flattened copy of their forest
+                self.model = FlatForest.from_estimator(self.model)
         except FileNotFoundError:
             raise FileNotFoundError('No direction model trained yet. Please train a model first.')
 
@@ -115,13 +174,14 @@ class DirectionModel(Model):
         else:
             print('Using data contained by the class instance.')
 
-        # Load label encoder if class instance was not used for training
+        # Use the label encoder of the persisted pipeline if class instance was not used for training
         if self.encoder is None:
-            self.encoder = io.read_encoder()
+            self.encoder = load_pipeline('classifier').label_encoder
 
         # Conduct predictions
         print('Starting prediction process.')
-        self.predictions = self.model.predict(self.features)
+        with profile_stage('direction.predict', rows=self.features.shape[0]):
+            self.predictions = self.model.predict(self.features)
         print('Prediction was successfull.')
 
         # Create a DataFrame containing predictions and the transformed data
@@ -131,7 +191,7 @@ class DirectionModel(Model):
         # Saving the predictions to disk
         if save:
             print('Saving prediction data to disk.')
-            io.save_predictions(self.predicted_data, type='classifier')
+            io.save_predictions(self.predicted_data, type='classifier', format=format)
 
         print('The prediction process is completed.')
         return self.predicted_data
@@ -1,10 +1,14 @@
+import pandas as pd
 from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
 from sklearn.metrics import mean_absolute_error
 
 from nextbike import io
 from nextbike.models import utils
+from nextbike.models.FeaturePipeline import FeaturePipeline
+from nextbike.models.FlatForest import BACKENDS, FlatForest, load_flat_forest
 from nextbike.models.Model import Model
 from nextbike.preprocessing import Preprocessor, Transformer
+from nextbike.profiling import profile_stage
 
 
 class DurationModel(Model):
@@ -12,7 +16,17 @@ class DurationModel(Model):
     Class for the training/prediction of booking duration models inheriting from the abstract class Model.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, sparse: bool = False, backend: str = 'sklearn') -> None:
+        """
+        Initializes the DurationModel.
+        :param sparse: Indicates whether the one-hot-encoded station features of the training data are kept as sparse
+                       CSR matrix. Predictions use the format of the trained model.
+        :param backend: Inference backend of the predictions, either 'sklearn' or 'numpy' (flattened forest, which is
+                        faster for small batches)
+        :raises: ValueError
+        """
+        if backend not in BACKENDS:
+            raise ValueError('Unknown backend {}. Choose one of {}.'.format(backend, ', '.join(BACKENDS)))
         super().__init__()
         self.raw_data = None  # Data obtained from preliminary transformation step
         self.predicted_data = None  # Raw data with added predictions
@@ -21,23 +35,26 @@ class DurationModel(Model):
         self.features = None  # Vector containing the features
         self.target = None  # Vector containing the target
         self.predictions = None  # Vector containing the predictions
+        self.pipeline = None  # Fitted feature pipeline
+        self.sparse = sparse  # Sparse feature matrix for training
+        self.backend = backend  # Inference backend of the predictions
 
-    def load_from_csv(self, path: str = None, training: bool = True) -> None:
+    def load_from_csv(self, path: str = None, training: bool = True, use_cache: bool = True) -> None:
         """
         Method that allows the user to load data from a .csv file from a specified path.
         After transformation steps this data is passed on to load_from_transformer to initiate preparation steps.
         :param path: A str pointing to the respective csv file
         :param training: Boolean indicating whether data should be prepared for training
+        :param use_cache: Boolean indicating whether cleaned and transformed data should be read from/written to cache
         :return: None
         """
         # Conduct pre-processing steps
         p = Preprocessor()
-        p.load_gdf(path=path)
-        p.clean_gdf()
+        p.load_clean_gdf(path=path, use_cache=use_cache)
 
         # Conduct transformation steps
         t = Transformer(p)
-        t.transform()
+        t.transform(use_cache=use_cache)
 
         # Pass transformed data to load from transformer for final preparation
         self.load_from_transformer(t, training)
@@ -55,27 +72,46 @@ class DurationModel(Model):
             print('Transformation was not successful.')
         else:
             print('Transformation was successful. Conducting feature engineering now.')
-            contents = utils.duration_preparation(transformer, training)
+            # Predictions reuse the pipeline fit by this instance (or the persisted one), training fits a new one
+            pipeline = FeaturePipeline('regressor', self.sparse) if training else self.pipeline
+            contents = utils.duration_preparation(transformer, training, pipeline)
 
             self.raw_data = contents['raw_data']
             self.prepared_data = contents['prepared_data']
             self.features = contents['features']
             self.target = contents['target']
+            self.pipeline = contents['pipeline']
 
-    def train(self, n_jobs: int = -1, random_state: int = 123) -> None:
+    def train(self, n_jobs: int = -1, random_state: int = 123, compress: int = 0, n_estimators: int = 100,
+              max_depth: int = None, min_samples_leaf: int = 1, max_samples: int or float = None,
+              max_features: int or float or str = 1.0, filter_parameters: dict = None) -> None:
         """
         Method for duration prediction model training utilizing sklearn's RandomForestRegressor
         :param n_jobs: An int specifying the number of threads to be used for training. Default: All available threads
         :param random_state: An int to lock the randomness of the model for reproducibility. If None results can vary
+        :param compress: Compression level of the saved artifacts from 0 (no compression, allows memory-mapped
+                         loading) to 9
+        :param n_estimators: Number of trees in the forest
+        :param max_depth: Maximum depth of the trees. Default: Unbounded
+        :param min_samples_leaf: Minimum number of samples in a leaf
+        :param max_samples: Number (int) or share (float) of the rows drawn for every tree. Default: All rows
+        :param max_features: Number (int), share (float) or rule ('sqrt', 'log2') of the features considered per split
+        :param filter_parameters: Dict of the forest parameters of the false booking filter (Default: The parameters of
+                                  the duration model except max_features)
         :return:
         """
         # Initialize the model with given parameters
-        duration_model = RandomForestRegressor(n_jobs=n_jobs, random_state=random_state)
+        duration_model = RandomForestRegressor(n_jobs=n_jobs, random_state=random_state, n_estimators=n_estimators,
+                                               max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                                               max_samples=max_samples, max_features=max_features)
         print('RandomForest model is initialized with n_jobs: {} and random_state: {}'.format(n_jobs, random_state))
+        print('Forest parameters: n_estimators: {}, max_depth: {}, min_samples_leaf: {}, max_samples: {}, '
+              'max_features: {}'.format(n_estimators, max_depth, min_samples_leaf, max_samples, max_features))
 
         # Initiating the training process
         print('Conducting training for duration prediction on {} rows'.format(len(self.target)))
-        duration_model.fit(self.features, self.target.ravel())
+        with profile_stage('duration.fit', rows=len(self.target)):
+            duration_model.fit(self.features, self.target.ravel())
         print('Training was successful.')
 
         # Assigning the trained model to the respective class attribute
@@ -83,52 +119,91 @@ class DurationModel(Model):
 
         # Save the trained model to disc
         print('Saving the duration model to disk.')
-        io.save_model(duration_model)
+        io.save_model(duration_model, compress=compress)
 
         # Train a classifier that allows for the use of false bookings in later prediction
         print('Initiating training process for false booking classification.')
-        self.train_filter(n_jobs, random_state)
+        if filter_parameters is None:
+            filter_parameters = {'n_estimators': n_estimators, 'max_depth': max_depth,
+                                 'min_samples_leaf': min_samples_leaf, 'max_samples': max_samples}
+        self.train_filter(n_jobs, random_state, compress, **filter_parameters)
 
         print('Training process is complete.')
 
-    def train_filter(self, n_jobs: int = -1, random_state: int = 123):
+    def train_compact(self, tolerance: float = 0.05, n_jobs: int = -1, random_state: int = 123,
+                      compress: int = 0) -> pd.DataFrame:
+        """
+        Method that searches for the smallest forest whose holdout error is at most (1 + tolerance) times the error of
+        the default forest and trains the duration model with its parameters. The search only scores the duration model,
+        so that the false booking filter is trained with its default parameters.
+        :param tolerance: Accepted relative increase of the mean absolute error compared to the default forest
+        :param n_jobs: An int specifying the number of threads to be used for training. Default: All available threads
+        :param random_state: An int to lock the randomness of the search and the model for reproducibility
+        :param compress: Compression level of the saved artifacts
+        :return: A DataFrame reporting error, model size, train time and predict latency of every candidate
+        """
+        print('Searching for a compact duration model on {} rows.'.format(len(self.target)))
+        search = utils.search_compact_forest(RandomForestRegressor, self.features, self.target,
+                                             self.raw_data['start_time'], tolerance, n_jobs=n_jobs,
+                                             random_state=random_state)
+        print(search['report'].to_string())
+        self.train(n_jobs, random_state, compress, filter_parameters={}, **search['parameters'])
+        return search['report']
+
+    def train_filter(self, n_jobs: int = -1, random_state: int = 123, compress: int = 0, n_estimators: int = 100,
+                     max_depth: int = None, min_samples_leaf: int = 1, max_samples: int or float = None):
         """
         A method that trains a RandomForestClassifier so that false bookings can be predicted without using duration
         information that is not available in real-world prediction scenarios. This model will be used in the preparation
         method to predict and merge false booking information to the data for duration prediction.
+        :param compress: Compression level of the saved feature pipeline
+        :param n_estimators: Number of trees in the forest
+        :param max_depth: Maximum depth of the trees. Default: Unbounded
+        :param min_samples_leaf: Minimum number of samples in a leaf
+        :param max_samples: Number (int) or share (float) of the rows drawn for every tree. Default: All rows
         :return: None
         """
         # Initialize the model
-        rfc = RandomForestClassifier(n_jobs=n_jobs, random_state=random_state)
+        rfc = RandomForestClassifier(n_jobs=n_jobs, random_state=random_state, n_estimators=n_estimators,
+                                     max_depth=max_depth, min_samples_leaf=min_samples_leaf, max_samples=max_samples)
         print(
             'RandomForestClassifier is initialized with n_jobs: {} and random_state: {}'.format(n_jobs, random_state))
 
         # Create the feature and target vector
-        X = self.prepared_data.drop(columns=['false_booking', 'duration'])
+        X = utils.create_feature_matrix(self.prepared_data.drop(columns=['false_booking', 'duration']))
         y = self.prepared_data['false_booking']
 
         # Initiating the training process
-        print('Conducting training for false booking classification on {} rows'.format(len(X)))
-        rfc.fit(X, y)
+        print('Conducting training for false booking classification on {} rows'.format(X.shape[0]))
+        with profile_stage('booking_filter.fit', rows=len(y)):
+            rfc.fit(X, y)
         print('Training was successful.')
 
-        # Save the trained model to disk
+        # Save the trained model to disk as part of the feature pipeline
         print('Saving the classification model to disk.')
-        io.save_model(rfc, type='booking_filter')
+        self.pipeline.booking_filter = rfc
+        self.pipeline.save(compress)
 
-    def predict(self, path: str = None, save=False) -> None:
+    def predict(self, path: str = None, save=False, format: str = 'csv') -> None:
         """
         A method for prediction.
         :param path: A str pointing to the respective csv file containing the data that should be predicted (optional).
                      Only needed if Instance was not used for training.
         :param save: A boolean whether predicted data should be saved to output directory
+        :param format: Format of the saved predictions, one of csv, csv.gz, parquet and feather
         :return: A DataFrame containing the raw data as well as predictions
         """
         # Try to load duration prediction model if class instance was not used for training
         try:
             if self.model is None:
                 print('This DurationModel instance does not have a model loaded. Loading model from "data/output".')
-                self.model = io.read_model()
+                if self.backend == 'numpy':
+                    self.model = load_flat_forest()
+                else:
+                    self.model = io.read_model(lazy=True)
+            elif self.backend == 'numpy' and not isinstance(self.model, FlatForest):
+                # Instances which were used for training predict with a flattened copy of their forest
+                self.model = FlatForest.from_estimator(self.model)
         except FileNotFoundError:
             raise FileNotFoundError('No duration model trained yet. Please train a model first.')
 
@@ -144,7 +219,8 @@ class DurationModel(Model):
 
         # Conduct predictions
         print('Starting prediction process.')
-        self.predictions = self.model.predict(self.features)
+        with profile_stage('duration.predict', rows=self.features.shape[0]):
+            self.predictions = self.model.predict(self.features)
         print('Prediction was successful.')
 
         # Create a DataFrame containing predictions and the transformed data
@@ -154,7 +230,7 @@ class DurationModel(Model):
         # Saving the predictions to disk
         if save:
             print('Saving prediction data to disk.')
-            io.save_predictions(self.predicted_data)
+            io.save_predictions(self.predicted_data, format=format)
 
         print('The prediction process is completed.')
         return self.predicted_data
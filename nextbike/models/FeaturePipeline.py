@@ -0,0 +1,83 @@
+import os
+
+from nextbike import io
+
+# Fitted pipelines keyed by their model type (shared by all model instances of the process)
+_pipelines = {}
+
+# Encoders which earlier versions saved as separate files instead of a pipeline, keyed by the model type
+LEGACY_ENCODERS = {
+    'regressor': {'station_encoder': 'station.joblib', 'season_encoder': 'season.joblib'},
+    'classifier': {'label_encoder': 'classes.joblib'}
+}
+
+
+class FeaturePipeline:
+    """
+    This class holds all fitted objects which the feature preparation of a model needs (one-hot encoders, the false
+    booking filter and the label encoder). It is persisted once together with the model and kept in memory afterwards,
+    so that repeated predictions neither read nor unpickle any encoder.
+    """
+    sparse: bool = False
+
+    def __init__(self, type: str = 'regressor', sparse: bool = False):
+        """
+        Initializes an unfitted FeaturePipeline.
+        :param type: A string representing if the pipeline belongs to the duration ('regressor') or direction
+                     ('classifier') model
+        :param sparse: Indicates whether the one-hot-encoded features are kept sparse (CSR feature matrix)
+        """
+        self.type = type
+        self.sparse = sparse
+        self.station_encoder = None  # OneHotEncoder of the start stations (duration model)
+        self.season_encoder = None  # OneHotEncoder of the seasons (duration model)
+        self.booking_filter = None  # Classifier predicting false bookings (duration model)
+        self.label_encoder = None  # LabelEncoder of the trip directions (direction model)
+
+    def save(self, compress: int = 0) -> None:
+        """
+        Saves the fitted pipeline to disk and makes it the in-memory pipeline of its model type.
+        :param compress: Compression level from 0 (no compression, allows memory-mapped loading) to 9
+        :return: None
+        """
+        io.save_pipeline(self, type=self.type, compress=compress)
+        _pipelines[self.type] = self
+
+
+def load_pipeline(type: str = 'regressor') -> FeaturePipeline:
+    """
+    Returns the fitted pipeline of the given model type. It is read from disk on first use only.
+    :param type: A string representing if the pipeline belongs to the duration ('regressor') or direction
+                 ('classifier') model
+    :return: FeaturePipeline
+    :raises: FileNotFoundError
+    """
+    if type not in _pipelines:
+        try:
+            _pipelines[type] = io.read_pipeline(type=type)
+        except FileNotFoundError:
+            # Models pickled by earlier versions come without a pipeline, it is built from their separate encoders
+            if os.path.isfile(io.get_model_path(type)):
+                raise FileNotFoundError('No fitted feature pipeline found. Please train a model first.')
+            try:
+                _pipelines[type] = load_legacy_pipeline(type)
+            except FileNotFoundError:
+                raise FileNotFoundError('No fitted feature pipeline found. Please train a model first.')
+    return _pipelines[type]
+
+
+def load_legacy_pipeline(type: str = 'regressor') -> FeaturePipeline:
+    """
+    Builds the pipeline of a model which was pickled by an earlier version. These versions saved the one-hot encoders,
+    the label encoder and the false booking filter as separate files (see LEGACY_ENCODERS and booking_filter.pkl).
+    :param type: A string representing if the pipeline belongs to the duration ('regressor') or direction
+                 ('classifier') model
+    :return: FeaturePipeline
+    :raises: FileNotFoundError
+    """
+    pipeline = FeaturePipeline(type)
+    for name, filename in LEGACY_ENCODERS[type].items():
+        setattr(pipeline, name, io.read_artifact(os.path.join(io.get_data_path(), 'output', filename), None))
+    if type == 'regressor':
+        pipeline.booking_filter = io.read_model(type='booking_filter', mmap_mode=None)
+    return pipeline
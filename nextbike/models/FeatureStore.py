@@ -0,0 +1,66 @@
+import weakref
+from typing import Any, Callable
+
+import geopandas as gpd
+import numpy as np
+
+from nextbike.preprocessing import Transformer
+
+# Feature stores keyed by the Transformer whose data they hold (released together with the Transformer)
+_stores = weakref.WeakKeyDictionary()
+
+
+class FeatureStore:
+    """
+    This class computes features which several models share (e.g. calendar features and false bookings) only once per
+    transformed data set. The transformed data is never modified, every model receives a shallow copy of it.
+    """
+
+    def __init__(self, gdf: gpd.GeoDataFrame):
+        """
+        Initializes an empty FeatureStore.
+        :param gdf: The transformed GeoDataFrame
+        """
+        self.gdf = gdf
+        self.__features = {}
+
+    def get(self, name: str, compute: Callable[[gpd.GeoDataFrame], Any]) -> Any:
+        """
+        Returns the feature with the given name and computes it on first access. Arrays are returned read-only, since
+        they are shared by all models.
+        :param name: Unique name of the feature
+        :param compute: Function computing the feature from the transformed GeoDataFrame
+        :return: The feature
+        """
+        if name not in self.__features:
+            feature = compute(self.gdf)
+            for array in feature.values() if isinstance(feature, dict) else [feature]:
+                if isinstance(array, np.ndarray):
+                    array.flags.writeable = False
+            self.__features[name] = feature
+        return self.__features[name]
+
+    def get_raw_data(self) -> gpd.GeoDataFrame:
+        """
+        Returns a shallow copy of the transformed GeoDataFrame. Columns can be added or replaced without affecting
+        other models, but existing columns must not be modified in place.
+        :return: GeoDataFrame
+        """
+        return self.gdf.copy(deep=False)
+
+
+def get_feature_store(transformer: Transformer or FeatureStore) -> FeatureStore:
+    """
+    Returns the FeatureStore of the data of a Transformer, so that all models loaded from the same Transformer share it.
+    A FeatureStore is returned as it is (e.g. for trips which were not created by a Transformer).
+    :param transformer: Valid transformer instance containing the transformed GeoDataFrame or a FeatureStore
+    :return: FeatureStore
+    """
+    if isinstance(transformer, FeatureStore):
+        return transformer
+    store = _stores.get(transformer)
+    # Transforming again replaces the data frame and thereby invalidates the store
+    if store is None or store.gdf is not transformer.gdf:
+        store = FeatureStore(transformer.gdf)
+        _stores[transformer] = store
+    return store
@@ -0,0 +1,179 @@
+import os
+
+import joblib
+import numpy as np
+from scipy import sparse
+
+from nextbike import io
+
+# Inference backends of the forests: sklearn's Cython trees or the flattened NumPy representation
+BACKENDS = ('sklearn', 'numpy')
+
+# Upper bound of the number of (sample, tree) pairs which are traversed at once
+MAX_BATCH_PAIRS = 2 ** 20
+
+
+class FlatForest:
+    """
+    This class evaluates a trained RandomForestRegressor or RandomForestClassifier on a flattened, array-backed
+    representation of all its trees. Whole batches are traversed level by level with vectorized NumPy operations and
+    the results are identical to sklearn's predictions. All arrays can be memory-mapped from an uncompressed artifact,
+    so that several processes on one host share a single copy of the forest.
+    """
+
+    def __init__(self, children: np.ndarray, feature: np.ndarray, threshold: np.ndarray, is_leaf: np.ndarray,
+                 value: np.ndarray, roots: np.ndarray, n_features: int, classes: np.ndarray = None):
+        """
+        Initializes the FlatForest from the node arrays of all trees (use from_estimator to export a trained forest).
+        :param children: Array of shape (2 * n_nodes,) with the left and right child of every node (leaves point to
+                         themselves)
+        :param feature: Feature which is compared at every node
+        :param threshold: Threshold of every node (samples with a feature value <= threshold go to the left child)
+        :param is_leaf: Boolean array which is True for every leaf
+        :param value: Prediction of every leaf (class probabilities of shape (n_nodes, n_classes) for classifiers)
+        :param roots: Root node of every tree
+        :param n_features: Number of features the forest was trained on
+        :param classes: Class labels of a classifier (None for regressors)
+        """
+        self.children = children
+        self.feature = feature
+        self.threshold = threshold
+        self.is_leaf = is_leaf
+        self.value = value
+        self.roots = roots
+        self.n_features = n_features
+        self.classes = classes
+
+    @classmethod
+    def from_estimator(cls, forest) -> 'FlatForest':
+        """
+        Exports a trained RandomForestRegressor or RandomForestClassifier with a single output.
+        :param forest: Trained sklearn forest
+        :return: FlatForest
+        :raises: ValueError
+        """
+        if forest.n_outputs_ != 1:
+            raise ValueError('Only forests with a single output can be flattened.')
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        node_counts = np.array([tree.node_count for tree in trees], dtype=np.int64)
+        roots = np.concatenate([[0], np.cumsum(node_counts)[:-1]])
+        is_classifier = hasattr(forest, 'classes_')
+        children = []
+        values = []
+        for tree, root in zip(trees, roots):
+            nodes = np.arange(tree.node_count)
+            # Leaves point to themselves, so that finished samples can stay in the batch
+            left = np.where(tree.children_left == -1, nodes, tree.children_left) + root
+            right = np.where(tree.children_right == -1, nodes, tree.children_right) + root
+            children.append(np.stack([left, right], axis=1).ravel())
+            if is_classifier:
+                # Normalize the class counts of every node like DecisionTreeClassifier.predict_proba
+                proba = tree.value[:, 0, :]
+                normalizer = proba.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                values.append(proba / normalizer)
+            else:
+                values.append(tree.value[:, 0, 0])
+        return cls(children=np.concatenate(children).astype(np.int32 if node_counts.sum() < 2 ** 30 else np.int64),
+                   feature=np.concatenate([np.maximum(tree.feature, 0) for tree in trees]).astype(np.int32),
+                   threshold=np.concatenate([tree.threshold for tree in trees]),
+                   is_leaf=np.concatenate([tree.children_left == -1 for tree in trees]),
+                   value=np.concatenate(values),
+                   roots=roots,
+                   n_features=forest.n_features_in_,
+                   classes=getattr(forest, 'classes_', None))
+
+    def apply(self, X) -> np.ndarray:
+        """
+        Returns the leaf of every tree which every sample falls into.
+        :param X: Dense array, DataFrame or sparse matrix of shape (n_samples, n_features)
+        :return: Array of node indices of shape (n_samples, n_trees)
+        :raises: ValueError
+        """
+        if X.shape[1] != self.n_features:
+            raise ValueError('X has {} features, but the forest was trained on {} features.'.format(
+                X.shape[1], self.n_features))
+        n_trees = len(self.roots)
+        batch_size = max(MAX_BATCH_PAIRS // n_trees, 1)
+        leaves = np.empty((X.shape[0], n_trees), dtype=self.children.dtype)
+        for start in range(0, X.shape[0], batch_size):
+            batch = X[start:start + batch_size]
+            # Like sklearn, compare the features as float32 values
+            batch = np.ascontiguousarray(batch.toarray() if sparse.issparse(batch) else batch, dtype=np.float32)
+            if not np.isfinite(batch).all():
+                raise ValueError('X contains NaN or infinity, which the forest cannot handle.')
+            leaves[start:start + batch_size] = self.__apply_batch(batch)
+        return leaves
+
+    def __apply_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        Traverses all trees for a batch of samples at once. Only the (sample, tree) pairs which have not reached a leaf
+        yet are advanced in every step.
+        :param X: Array of shape (n_samples, n_features) of float32 values
+        :return: Array of node indices of shape (n_samples, n_trees)
+        """
+        n_samples, n_features = X.shape
+        nodes = np.tile(self.roots.astype(self.children.dtype), n_samples)
+        offsets = np.repeat(np.arange(n_samples, dtype=np.int64) * n_features, len(self.roots))
+        values = X.ravel()
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while len(active):
+            node = nodes[active]
+            go_right = values[offsets[active] + self.feature[node]] > self.threshold[node]
+            node = self.children[2 * node + go_right]
+            nodes[active] = node
+            active = active[~self.is_leaf[node]]
+        return nodes.reshape(n_samples, len(self.roots))
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Predicts the target of the samples like the predict method of the sklearn forest.
+        :param X: Dense array, DataFrame or sparse matrix of shape (n_samples, n_features)
+        :return: Array of predictions
+        """
+        if self.classes is not None:
+            return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+        leaves = self.apply(X)
+        # Sum the trees in the order of the forest, so that the rounding is the same as in sklearn
+        predictions = np.zeros(leaves.shape[0], dtype=np.float64)
+        for tree in range(leaves.shape[1]):
+            predictions += self.value[leaves[:, tree]]
+        predictions /= leaves.shape[1]
+        return predictions
+
+    def predict_proba(self, X) -> np.ndarray:
+        """
+        Predicts the class probabilities of the samples like the predict_proba method of the sklearn forest.
+        :param X: Dense array, DataFrame or sparse matrix of shape (n_samples, n_features)
+        :return: Array of shape (n_samples, n_classes)
+        :raises: AttributeError
+        """
+        if self.classes is None:
+            raise AttributeError('Regression forests do not predict probabilities.')
+        leaves = self.apply(X)
+        probabilities = np.zeros((leaves.shape[0], len(self.classes)), dtype=np.float64)
+        for tree in range(leaves.shape[1]):
+            probabilities += self.value[leaves[:, tree]]
+        probabilities /= leaves.shape[1]
+        return probabilities
+
+
+def load_flat_forest(type: str = 'regressor', mmap_mode: str = 'r') -> FlatForest:
+    """
+    Reads the flattened forest of a trained model. It is exported from the model on first use and again whenever the
+    model was trained again.
+    :param type: A string representing if type of model is related to duration, false booking or direction prediction
+    :param mmap_mode: Memory-map mode of the node arrays (None reads them into memory)
+    :return: FlatForest
+    :raises: FileNotFoundError
+    """
+    path = io.get_model_path(type, '.flat.joblib')
+    model_path = io.get_model_path(type)
+    if not os.path.isfile(path) or (os.path.isfile(model_path) and
+                                    os.stat(path).st_mtime_ns < os.stat(model_path).st_mtime_ns):
+        forest = FlatForest.from_estimator(io.read_model(type=type, mmap_mode=None))
+        # Write to a temporary file of this process first, so that concurrent processes neither read a partially
+        # written artifact nor overwrite each other's temporary file. The artifact gets the permissions of the model.
+        with io.write_atomically(path, mode_path=model_path) as temporary_path:
+            joblib.dump(forest, temporary_path)
+    return io.read_artifact(path, mmap_mode)
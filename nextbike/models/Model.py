@@ -20,6 +20,7 @@ class Model(ABC):
         self.features = None  # Vector containing the features
         self.target = None  # Vector containing the target
         self.predictions = None  # Vector containing the predictions
+        self.pipeline = None  # Fitted feature pipeline
 
     @abstractmethod
     def load_from_csv(self, path: str = None, training: bool = True) -> None:
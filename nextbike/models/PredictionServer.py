@@ -0,0 +1,185 @@
+import contextlib
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import TextIO
+
+import numpy as np
+import pandas as pd
+
+from nextbike import io
+from nextbike.models import utils
+from nextbike.models.FeaturePipeline import load_pipeline
+from nextbike.models.FeatureStore import FeatureStore
+from nextbike.models.FlatForest import BACKENDS, load_flat_forest
+from nextbike.preprocessing.Geofence import get_mannheim_geofence
+
+# Fields every booking needs for a prediction
+BOOKING_FIELDS = ['datetime', 'p_lat', 'p_lng', 'p_place_type']
+
+
+def create_start_trips(bookings: pd.DataFrame) -> pd.DataFrame:
+    """
+    Translates raw 'start' bookings to trips in the target format of the Transformer. The end of the trips is unknown,
+    so that the end columns are empty and the duration is 0.
+    :param bookings: DataFrame of raw bookings with the columns datetime, p_lat, p_lng, p_name and p_place_type
+                     (b_number is optional)
+    :return: DataFrame of trips
+    """
+    start_time = pd.to_datetime(bookings['datetime'], errors='coerce')
+    trips = pd.DataFrame(index=pd.RangeIndex(len(bookings)))
+    trips['bike_number'] = bookings['b_number'].to_numpy() if 'b_number' in bookings else 0
+    trips['start_time'] = start_time.to_numpy()
+    trips['weekend'] = (start_time.dt.dayofweek // 5 == 1).to_numpy()
+    trips['start_lat'] = bookings['p_lat'].to_numpy(dtype=np.float64)
+    trips['start_lng'] = bookings['p_lng'].to_numpy(dtype=np.float64)
+    # Free floating bikes do not have a position name (like the cleaned data, where missing values are filled with 0)
+    trips['start_position_name'] = bookings['p_name'].fillna(0).to_numpy() if 'p_name' in bookings else 0
+    trips['duration'] = 0
+    trips['end_time'] = pd.NaT
+    trips['end_lat'] = np.nan
+    trips['end_lng'] = np.nan
+    trips['end_position_name'] = 0
+    trips['is_station'] = (bookings['p_place_type'] != 12).to_numpy()
+    return trips
+
+
+class PredictionServer:
+    """
+    This class keeps the trained models, their feature pipelines and the geofence warm in memory and predicts the
+    duration and direction of single 'start' bookings or small batches of them. It can be served via stdin/stdout
+    JSON lines or a local HTTP endpoint.
+    """
+
+    def __init__(self, backend: str = 'sklearn'):
+        """
+        Initializes the PredictionServer by loading both models, their feature pipelines and the geofence once.
+        :param backend: Inference backend of the models, either 'sklearn' or 'numpy' (flattened forests, which are
+                        faster for single bookings and small batches)
+        :raises: FileNotFoundError, ValueError
+        """
+        if backend not in BACKENDS:
+            raise ValueError('Unknown backend {}. Choose one of {}.'.format(backend, ', '.join(BACKENDS)))
+        read_model = load_flat_forest if backend == 'numpy' else io.read_model
+        try:
+            self.duration_model = read_model(type='regressor')
+            self.direction_model = read_model(type='classifier')
+        except FileNotFoundError:
+            raise FileNotFoundError('No models trained yet. Please train the models first.')
+        self.duration_pipeline = load_pipeline('regressor')
+        self.direction_pipeline = load_pipeline('classifier')
+        self.geofence = get_mannheim_geofence()
+        # Small batches are faster without starting the thread pool of every forest on each request
+        for model in [self.duration_model, self.direction_model, self.duration_pipeline.booking_filter]:
+            if hasattr(model, 'n_jobs'):
+                model.n_jobs = 1
+
+    def predict(self, bookings: list) -> list:
+        """
+        Predicts the duration and direction of 'start' bookings.
+        :param bookings: List of dicts with the raw booking fields datetime, p_lat, p_lng, p_name and p_place_type
+        :return: List of dicts with the predicted 'duration' and 'direction' (or an 'error') for every booking
+        """
+        if not bookings:
+            return []
+        # Entries which are not JSON objects are answered like bookings without any field
+        bookings = pd.DataFrame([booking if isinstance(booking, dict) else {} for booking in bookings])
+        for field in BOOKING_FIELDS:
+            if field not in bookings:
+                bookings[field] = np.nan
+        missing_fields = bookings[BOOKING_FIELDS].isna().to_numpy()
+        bookings['datetime'] = pd.to_datetime(bookings['datetime'], errors='coerce')
+        bookings['p_lat'] = pd.to_numeric(bookings['p_lat'], errors='coerce')
+        bookings['p_lng'] = pd.to_numeric(bookings['p_lng'], errors='coerce')
+
+        # Every booking gets the error of its first failed check, the remaining ones are predicted
+        missing_errors = np.array(['Missing booking fields: {}'.format(', '.join(np.array(BOOKING_FIELDS)[missing]))
+                                   for missing in missing_fields], dtype=object)
+        errors = np.select([missing_fields.any(axis=1), bookings['datetime'].isna().to_numpy(),
+                            bookings[['p_lat', 'p_lng']].isna().any(axis=1).to_numpy()],
+                           [missing_errors, 'Invalid datetime.', 'Invalid coordinates.'], None)
+        valid = pd.isna(errors)
+        inside = valid.copy()
+        inside[valid] = self.geofence.contains(bookings['p_lng'].to_numpy(dtype=np.float64)[valid],
+                                               bookings['p_lat'].to_numpy(dtype=np.float64)[valid])
+        errors[valid & ~inside] = 'Booking lies outside of Mannheim.'
+        results = [{'error': error} for error in errors]
+        if not inside.any():
+            return results
+        store = FeatureStore(create_start_trips(bookings[inside].reset_index(drop=True)))
+
+        # The preparation steps report their progress on stdout, which is reserved for the responses
+        with contextlib.redirect_stdout(sys.stderr):
+            duration_features = utils.duration_preparation(store, False, self.duration_pipeline)['features']
+            direction_features = utils.classification_preparation(store, False, self.direction_pipeline)['features']
+        durations = self.duration_model.predict(duration_features)
+        directions = self.direction_pipeline.label_encoder.inverse_transform(
+            self.direction_model.predict(direction_features))
+
+        for position, duration, direction in zip(np.flatnonzero(inside), durations, directions):
+            results[position] = {'duration': float(duration), 'direction': str(direction)}
+        return results
+
+    def handle(self, request: dict or list) -> dict or list:
+        """
+        Answers a request of a single booking (dict) or a batch of bookings (list).
+        :param request: Decoded JSON request
+        :return: Decoded JSON response (dict for a single booking, list for a batch)
+        """
+        try:
+            if isinstance(request, dict):
+                return self.predict([request])[0]
+            return self.predict(request)
+        except (KeyError, TypeError, ValueError) as e:
+            # Batches are always answered with one result per booking
+            if isinstance(request, list):
+                return [{'error': str(e)} for _ in request]
+            return {'error': str(e)}
+
+    def serve_jsonl(self, stdin: TextIO = sys.stdin, stdout: TextIO = sys.stdout) -> None:
+        """
+        Answers one JSON request per line of stdin with one JSON response per line on stdout until stdin is closed.
+        :param stdin: Input stream of requests
+        :param stdout: Output stream of responses
+        :return: None
+        """
+        for line in stdin:
+            if not line.strip():
+                continue
+            try:
+                response = self.handle(json.loads(line))
+            except json.JSONDecodeError as e:
+                response = {'error': 'Invalid JSON: {}'.format(e)}
+            stdout.write(json.dumps(response) + '\n')
+            stdout.flush()
+
+    def serve_http(self, host: str = '127.0.0.1', port: int = 8080) -> None:
+        """
+        Answers JSON requests which are posted to http://{host}:{port}/predict until the process is interrupted.
+        :param host: Host name the server binds to
+        :param port: Port the server listens on
+        :return: None
+        """
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != '/predict':
+                    return self.send_error(404)
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                except json.JSONDecodeError as e:
+                    return self.send_error(400, 'Invalid JSON: {}'.format(e))
+                body = json.dumps(server.handle(request)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        print('Serving predictions at http://{}:{}/predict'.format(host, port), file=sys.stderr)
+        with HTTPServer((host, port), RequestHandler) as http_server:
+            try:
+                http_server.serve_forever()
+            except KeyboardInterrupt:
+                pass
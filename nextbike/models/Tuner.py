@@ -0,0 +1,235 @@
+import hashlib
+import json
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.metrics import accuracy_score, mean_absolute_error
+from sklearn.model_selection import ParameterGrid, TimeSeriesSplit
+
+from nextbike import io
+from nextbike.models import utils
+from nextbike.models.FeaturePipeline import FeaturePipeline
+from nextbike.preprocessing import Preprocessor, Transformer
+
+# Forest parameters which are searched by default (27 candidates)
+DEFAULT_PARAM_GRID = {
+    'n_estimators': [25, 50, 100],
+    'max_depth': [12, 20, None],
+    'min_samples_leaf': [1, 5, 20]
+}
+
+# Names of the tuned models in the files of the tuning results
+MODEL_NAMES = {'regressor': 'duration', 'classifier': 'direction'}
+
+
+class Tuner:
+    """
+    This class tunes the forest parameters of the duration or direction model with time-aware cross-validation. The
+    candidates are compared by successive halving: all candidates are fit on the most recent rows of the training
+    windows first and only the best share of them is fit again on more rows in the next round. The fits run in
+    parallel, are cached across runs and are reported in a leaderboard of error, train time and model size.
+    """
+
+    def __init__(self, type: str = 'regressor', param_grid: dict = None, n_splits: int = 3, factor: int = 3,
+                 n_jobs: int = -1, random_state: int = 123):
+        """
+        Initializes the Tuner.
+        :param type: A string representing if the duration ('regressor') or direction ('classifier') model is tuned
+        :param param_grid: Dict of lists of forest parameters (Default: DEFAULT_PARAM_GRID)
+        :param n_splits: Number of time-ordered cross-validation folds
+        :param factor: Share (1 / factor) of the candidates which is kept in every round and growth of the rows
+        :param n_jobs: Number of parallel fits. Default: All available cores
+        :param random_state: An int to lock the randomness of the forests for reproducibility
+        :raises: ValueError
+        """
+        if type not in MODEL_NAMES:
+            raise ValueError('Unknown model type {}. Choose one of {}.'.format(type, ', '.join(MODEL_NAMES)))
+        if factor < 2:
+            raise ValueError('The factor of successive halving must be at least 2.')
+        self.type = type
+        self.param_grid = DEFAULT_PARAM_GRID if param_grid is None else param_grid
+        self.n_splits = n_splits
+        self.factor = factor
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.features = None  # Feature vector ordered by start time
+        self.target = None  # Target vector ordered by start time
+        self.data_key = None  # Hash of the features and target identifying cached fits
+        self.results = None  # Results of all fits of this and earlier runs
+        self.leaderboard = None  # Results of the last run with one row per candidate
+        self.best_parameters = None  # Forest parameters of the best candidate
+
+    def load_from_csv(self, path: str, use_cache: bool = True) -> None:
+        """
+        Method that loads the training data from a .csv file. The prepared features are cached, so that later tuning
+        runs neither clean nor prepare the data again.
+        :param path: A str pointing to the respective csv file
+        :param use_cache: Boolean indicating whether cleaned, transformed and prepared data should be read from/written
+                          to cache
+        :return: None
+        """
+        key = io.get_cache_key(path, 'features-' + self.type)
+        contents = io.read_feature_cache(key) if use_cache else None
+        if contents is not None:
+            print('Using cached features for tuning.')
+            self.__set_data(contents['features'], contents['target'], contents['data_key'])
+            return
+
+        p = Preprocessor()
+        p.load_clean_gdf(path=path, use_cache=use_cache)
+        t = Transformer(p)
+        t.transform(use_cache=use_cache)
+        self.load_from_transformer(t)
+        if use_cache:
+            io.write_feature_cache({'features': self.features, 'target': self.target, 'data_key': self.data_key}, key)
+
+    def load_from_transformer(self, transformer: Transformer) -> None:
+        """
+        Method that prepares the training data of the tuned model from a valid transformer instance.
+        :param transformer: Valid transformer instance containing the transformed GeoDataFrame
+        :return: None
+        """
+        if self.type == 'regressor':
+            contents = utils.duration_preparation(transformer, True, FeaturePipeline('regressor'))
+        else:
+            contents = utils.classification_preparation(transformer, True)
+
+        # Order the rows by start time, so that every validation fold lies after its training window
+        order = np.argsort(contents['raw_data']['start_time'].to_numpy(), kind='stable')
+        features = contents['features']
+        if sparse.issparse(features):
+            features = features[order].astype(np.float32)
+        else:
+            # The forests compare float32 values anyway, a contiguous float32 matrix is shared by all parallel fits
+            features = np.ascontiguousarray(np.asarray(features, dtype=np.float32)[order])
+        target = np.ravel(contents['target'])[order]
+
+        digest = hashlib.sha256()
+        for array in [features.data if sparse.issparse(features) else features, target]:
+            digest.update(np.ascontiguousarray(array).tobytes())
+        self.__set_data(features, target, digest.hexdigest())
+
+    def __set_data(self, features: np.ndarray or sparse.csr_matrix, target: np.ndarray, data_key: str) -> None:
+        """
+        Assigns the prepared training data.
+        :param features: Feature vector ordered by start time
+        :param target: Target vector ordered by start time
+        :param data_key: Hash of the features and target
+        :return: None
+        """
+        self.features = features
+        self.target = target
+        self.data_key = data_key
+
+    def tune(self) -> pd.DataFrame:
+        """
+        Method that compares all candidates of the parameter grid by successive halving and time-aware cross-validation.
+        The results of all fits are saved after every round, so that fits of earlier (or interrupted) runs on the same
+        data are not repeated.
+        :return: The leaderboard with one row per candidate, best candidate first
+        :raises: BaseException
+        """
+        if self.features is None:
+            raise BaseException('This instance does not contain any data. You have to load data first.')
+        name = MODEL_NAMES[self.type]
+        forest_class = RandomForestRegressor if self.type == 'regressor' else RandomForestClassifier
+        folds = list(TimeSeriesSplit(n_splits=self.n_splits).split(np.zeros(self.features.shape[0])))
+        candidates = [json.dumps(parameters, sort_keys=True) for parameters in ParameterGrid(self.param_grid)]
+        # Every round keeps 1 / factor of the candidates until a single candidate is left
+        n_rounds = 1
+        while int(np.ceil(len(candidates) / self.factor ** (n_rounds - 1))) > 1:
+            n_rounds += 1
+
+        results = io.read_tuning_results(name)
+        cached = set(results['key']) if len(results) else set()
+        run_keys = []
+        for iteration in range(n_rounds):
+            share = float(self.factor) ** (iteration - n_rounds + 1)
+            tasks = [{'key': self.__get_fit_key(candidate, share, fold), 'round': iteration, 'share': share,
+                      'fold': fold, 'parameters': candidate}
+                     for candidate in candidates for fold in range(len(folds))]
+            new_tasks = [task for task in tasks if task['key'] not in cached]
+            print('Round {} of {}: {} candidates on {:.1%} of the training rows ({} cached fits).'.format(
+                iteration + 1, n_rounds, len(candidates), share, len(tasks) - len(new_tasks)))
+
+            # Each fit uses one core on the most recent rows of its training window, the fits run in parallel and
+            # share the (memory-mapped) feature matrix
+            scores = Parallel(n_jobs=self.n_jobs)(
+                delayed(fit_and_score)(forest_class, json.loads(task['parameters']), self.features, self.target,
+                                       get_recent_rows(folds[task['fold']][0], share), folds[task['fold']][1],
+                                       self.random_state)
+                for task in new_tasks)
+            results = pd.concat([results, pd.DataFrame([{**task, **score} for task, score in zip(new_tasks, scores)])],
+                                ignore_index=True)
+            cached.update(task['key'] for task in new_tasks)
+            run_keys += [task['key'] for task in tasks]
+            io.save_tuning_results(results, name)
+
+            # Keep the best share of the candidates for the next round
+            round_results = results[results['key'].isin([task['key'] for task in tasks])]
+            ranking = round_results.groupby('parameters')['error'].mean().sort_values(kind='stable')
+            candidates = list(ranking.index[:int(np.ceil(len(candidates) / self.factor))])
+
+        self.results = results
+        # One row per candidate in the last round it reached, the best candidate of the last round first
+        leaderboard = results[results['key'].isin(run_keys)].groupby(['parameters', 'round', 'share'], as_index=False)[
+            ['error', 'train_time_s', 'size_mb']].mean()
+        leaderboard = leaderboard.sort_values(['round', 'error'], ascending=[False, True], kind='stable')
+        self.leaderboard = leaderboard.drop_duplicates('parameters').reset_index(drop=True)
+        self.best_parameters = json.loads(self.leaderboard['parameters'].iloc[0])
+        io.save_leaderboard(self.leaderboard, name)
+        print('Best parameters: {}'.format(self.best_parameters))
+        return self.leaderboard
+
+    def __get_fit_key(self, candidate: str, share: float, fold: int) -> str:
+        """
+        Computes the key of a fit from the data, the candidate, the share of the training rows and the fold.
+        :param candidate: JSON encoded forest parameters
+        :param share: Share of the training rows
+        :param fold: Index of the fold
+        :return: Hex digest identifying the fit
+        """
+        fingerprint = '|'.join([self.data_key, candidate, repr(share), str(fold), str(self.n_splits),
+                                str(self.random_state)])
+        return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+
+def get_recent_rows(train_index: np.ndarray, share: float) -> np.ndarray:
+    """
+    Returns the most recent share of the (time-ordered) training rows of a fold.
+    :param train_index: Indices of the training rows
+    :param share: Share of the rows
+    :return: Indices of the most recent rows (at least one)
+    """
+    return train_index[-max(int(len(train_index) * share), 1):]
+
+
+def fit_and_score(forest_class: type, parameters: dict, features: np.ndarray or sparse.csr_matrix,
+                  target: np.ndarray, train_index: np.ndarray, test_index: np.ndarray, random_state: int) -> dict:
+    """
+    Fits a forest on the training rows and scores it on the validation rows of a fold.
+    :param forest_class: RandomForestRegressor or RandomForestClassifier
+    :param parameters: Forest parameters
+    :param features: Feature vector
+    :param target: Target vector
+    :param train_index: Indices of the training rows
+    :param test_index: Indices of the validation rows
+    :param random_state: An int to lock the randomness of the forest
+    :return: Dict of the error (mean absolute error or misclassification rate), train time and model size
+    """
+    forest = forest_class(n_jobs=1, random_state=random_state, **parameters)
+    start = time.perf_counter()
+    forest.fit(features[train_index], target[train_index])
+    train_time = time.perf_counter() - start
+    predictions = forest.predict(features[test_index])
+    if forest_class is RandomForestClassifier:
+        error = 1 - accuracy_score(target[test_index], predictions)
+    else:
+        error = mean_absolute_error(target[test_index], predictions)
+    return {'error': error, 'train_time_s': train_time,
+            'size_mb': len(pickle.dumps(forest, protocol=pickle.HIGHEST_PROTOCOL)) / 2 ** 20}
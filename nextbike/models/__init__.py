@@ -1,5 +1,11 @@
 from nextbike.models.DirectionModel import DirectionModel
 from nextbike.models.DurationModel import DurationModel
+from nextbike.models.FeaturePipeline import FeaturePipeline, load_pipeline
+from nextbike.models.FeatureStore import FeatureStore, get_feature_store
+from nextbike.models.FlatForest import FlatForest, load_flat_forest
+from nextbike.models.PredictionServer import PredictionServer
+from nextbike.models.pipeline import PIPELINE_STAGES, run_pipeline
+from nextbike.models.Tuner import Tuner
 from nextbike.models.utils import (
     duration_preparation,
     classification_preparation,
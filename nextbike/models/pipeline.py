@@ -0,0 +1,74 @@
+from nextbike import io
+from nextbike.models.DirectionModel import DirectionModel
+from nextbike.models.DurationModel import DurationModel
+from nextbike.preprocessing import Preprocessor, Transformer
+
+# Stages of run_pipeline in the order they are executed
+PIPELINE_STAGES = ['transform', 'train', 'predict']
+
+
+def run_pipeline(path: str, stages: list = None, use_cache: bool = True, compact: bool = False, sparse: bool = False,
+                 compress: int = 0, backend: str = 'sklearn', parameters: dict = None, auto_compact: bool = False,
+                 tolerance: float = 0.05, output: str = 'mannheim_transformed.csv',
+                 predictions_output: str = 'final_predictions.csv', format: str = None) -> dict:
+    """
+    Runs any combination of the transform, train and predict stages in one process. The raw data is read, cleaned and
+    transformed once and all stages share the transformed trips and their features. Models trained by the run predict
+    from memory and the duration and direction predictions are combined in memory and saved as one file, without
+    writing and re-reading the separate prediction files.
+    :param path: Path of the raw data
+    :param stages: Stages which are executed (Default: PIPELINE_STAGES)
+    :param use_cache: Boolean indicating whether cleaned and transformed data should be read from/written to cache
+    :param compact: Boolean indicating whether the data should be held in a memory-compact representation
+    :param sparse: Boolean indicating whether the duration model should be trained on a sparse feature matrix
+    :param compress: Compression level of the saved models and feature pipelines
+    :param backend: Inference backend of the predictions, either 'sklearn' or 'numpy'
+    :param parameters: Forest parameters of the trained models (see DurationModel.train)
+    :param auto_compact: Boolean indicating whether the smallest forests within the tolerance should be searched instead
+    :param tolerance: Accepted relative increase of the holdout error of auto_compact
+    :param output: Filename of the transformed data saved by the transform stage
+    :param predictions_output: Filename of the combined predictions saved by the predict stage
+    :param format: Output format, one of csv, csv.gz, parquet and feather (Default: The format of the extensions)
+    :return: Dict of the transformer, the models of the executed stages, the combined predictions and the saved paths
+    :raises: ValueError
+    """
+    stages = PIPELINE_STAGES if stages is None else stages
+    unknown = set(stages) - set(PIPELINE_STAGES)
+    if unknown:
+        raise ValueError('Unknown stages {}. Choose from {}.'.format(', '.join(sorted(unknown)),
+                                                                     ', '.join(PIPELINE_STAGES)))
+    parameters = {} if parameters is None else parameters
+
+    # Conduct pre-processing and transformation steps once for all stages
+    preprocessor = Preprocessor(compact=compact)
+    preprocessor.load_clean_gdf(path, use_cache=use_cache)
+    transformer = Transformer(preprocessor)
+    transformer.transform(use_cache=use_cache)
+    result = {'transformer': transformer}
+
+    if 'transform' in stages:
+        transformer.validate()
+        result['transformed_path'] = transformer.save(output, format)
+
+    if 'train' in stages:
+        for model in [DurationModel(sparse=sparse, backend=backend), DirectionModel(backend=backend)]:
+            model.load_from_transformer(transformer, training=True)
+            if auto_compact:
+                model.train_compact(tolerance, compress=compress)
+            else:
+                model.train(compress=compress, **parameters)
+            model.predict()
+            model.training_score()
+            result['duration_model' if isinstance(model, DurationModel) else 'direction_model'] = model
+
+    if 'predict' in stages:
+        # Models trained by this run predict from memory, otherwise the persisted models are loaded
+        duration_model = result['duration_model'] if 'train' in stages else DurationModel(backend=backend)
+        duration_model.load_from_transformer(transformer, training=False)
+        direction_model = result['direction_model'] if 'train' in stages else DirectionModel(backend=backend)
+        direction_model.load_from_transformer(transformer, training=False)
+        result['predictions'] = io.combine_prediction_frames(duration_model.predict(), direction_model.predict())
+        result['predictions_path'] = io.save_combined_predictions(result['predictions'], predictions_output, format)
+        result['duration_model'], result['direction_model'] = duration_model, direction_model
+
+    return result
@@ -1,12 +1,21 @@
+import pickle
+import time
+
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn import preprocessing
+from sklearn.metrics import accuracy_score, mean_absolute_error
 
-from nextbike import io
+from nextbike.models.FeaturePipeline import FeaturePipeline, load_pipeline
+from nextbike.models.FeatureStore import FeatureStore, get_feature_store
 from nextbike.preprocessing import Transformer
+from nextbike.profiling import profile_stage, profiled
 
 
-def duration_preparation(transformer: Transformer, training: bool = True) -> dict:
+@profiled('duration_preparation', rows=lambda contents, *args, **kwargs: len(contents['prepared_data']))
+def duration_preparation(transformer: Transformer or FeatureStore, training: bool = True,
+                         pipeline: FeaturePipeline = None) -> dict:
     """
     Static method that that performs feature engineering steps for duration prediction and training. The following
     features are engineered:
@@ -15,71 +24,92 @@ def duration_preparation(transformer: Transformer, training: bool = True) -> dic
         - Season as one-hot-encoded binary variables
         - Starting stations as one-hot-encoded binary variables
         - False Booking as a binary variable indicating whether the booking was not valid
-    :param transformer: Valid transformer instance containing the transformed GeoDataFrame.
+    If the pipeline is sparse, the dummies are kept as sparse columns and the feature vector is a CSR matrix. Features
+    shared with the direction model are taken from the FeatureStore of the transformer, the transformed data itself is
+    not modified.
+    :param transformer: Valid transformer instance containing the transformed GeoDataFrame (or its FeatureStore)
     :param training: A boolean indicating whether preparation is conducted for training. If false booking duration and
                      false booking will not be returned
-    :return: A dict containing raw and prepared data as DataFrame as well as the feature and target vector
+    :param pipeline: The FeaturePipeline which is fit during training or used for prediction. Default: A new pipeline
+                     for training and the persisted pipeline of the duration model for prediction
+    :return: A dict containing raw and prepared data as DataFrame as well as the feature and target vector and the
+             feature pipeline
     """
-    raw_data = transformer.gdf
+    store = get_feature_store(transformer)
+    raw_data = store.get_raw_data()
+    if pipeline is None:
+        pipeline = FeaturePipeline('regressor') if training else load_pipeline('regressor')
 
     if training:
         # Identify false bookings in relation to the information provided by the VRN and create dedicated series
-        raw_data.loc[(raw_data['duration'] <= 180) & (
-                raw_data['start_position'] == raw_data['end_position']), 'false_booking'] = 1
-        raw_data.fillna(0.0, inplace=True)
+        raw_data['false_booking'] = np.where(store.get('false_bookings', find_false_bookings), 1.0, 0.0)
+        raw_data = fill_missing_values(raw_data, 0.0)
 
         # Drop features that cannot be known in prediction scenario and can therefore not be used for training
-        col_to_drop = ['bike_number', 'start_position', 'end_time', 'end_position', 'end_position_name']
-        prediction_data = raw_data.drop(columns=col_to_drop)
+        col_to_drop = ['bike_number', 'start_lat', 'start_lng', 'end_time', 'end_lat', 'end_lng', 'end_position_name']
+        prediction_data = raw_data.drop(columns=col_to_drop + ['start_time'])
 
         # Perform feature engineering using the dedicated methods
-        prediction_data = create_time_features(prediction_data, sin_cos_transform=True)
-        prepared_data = create_dummy_features(prediction_data)
+        prediction_data = pd.concat([prediction_data, get_time_features(store, sin_cos_transform=True)], axis=1)
+        prepared_data = create_dummy_features(prediction_data, pipeline=pipeline)
 
         # Create target and feature vector
-        features = prepared_data.drop(columns=['duration'])
+        features = create_feature_matrix(prepared_data.drop(columns=['duration']))
         target = prepared_data['duration'].values.reshape(-1, 1)
 
         print('Preparation was successful.')
 
         return {'raw_data': raw_data, 'prepared_data': prepared_data, 'features': features,
-                'target': target}
+                'target': target, 'pipeline': pipeline}
 
     else:
         # Drop columns that are not useful or cannot be known in a real prediction scenario
-        col_to_drop = ['bike_number', 'start_position', 'end_time',
-                       'end_position', 'end_position_name', 'duration']
-        prediction_data = raw_data.drop(columns=col_to_drop)
+        col_to_drop = ['bike_number', 'start_lat', 'start_lng', 'end_time',
+                       'end_lat', 'end_lng', 'end_position_name', 'duration']
+        prediction_data = raw_data.drop(columns=col_to_drop + ['start_time'])
 
         # Perform feature engineering using the dedicated methods
-        prediction_data = create_time_features(prediction_data, sin_cos_transform=True)
-        prepared_data = create_dummy_features(prediction_data, training)
+        prediction_data = pd.concat([prediction_data, get_time_features(store, sin_cos_transform=True)], axis=1)
+        prepared_data = create_dummy_features(prediction_data, training, pipeline)
 
         # Create feature vector and predict and concatenate false bookings using the previously trained classifier
-        features = prepared_data.copy()
-        rfc = io.read_model(type='booking_filter')
-        false_bookings = rfc.predict(features)
-        features = np.concatenate((features, np.vstack(false_bookings)), axis=1)
+        features = create_feature_matrix(prepared_data.copy())
+        with profile_stage('booking_filter', rows=features.shape[0]):
+            false_bookings = pipeline.booking_filter.predict(features)
+        if sparse.issparse(features):
+            features = sparse.hstack([features, sparse.csr_matrix(np.vstack(false_bookings))], format='csr')
+        else:
+            features = np.concatenate((features, np.vstack(false_bookings)), axis=1)
 
         print('Preparation was successful.')
 
         return {'raw_data': raw_data, 'prepared_data': prepared_data, 'features': features,
-                'target': None}
+                'target': None, 'pipeline': pipeline}
 
 
-def classification_preparation(transformer: Transformer, training: bool = True) -> dict:
+@profiled('classification_preparation',
+          rows=lambda contents, *args, **kwargs: len(contents['prepared_data']))
+def classification_preparation(transformer: Transformer or FeatureStore, training: bool = True,
+                               pipeline: FeaturePipeline = None) -> dict:
     """
     Static method that that performs feature engineering steps for direction prediction and training. The following
     features are engineered:
         - Periodic quantities (Hour, Week, Season) that are transformed using the sin-cos transformation so that time
         steps have the right distance to each other
-    :param transformer: Valid transformer instance containing the transformed GeoDataFrame.
+    Features shared with the duration model are taken from the FeatureStore of the transformer, the transformed data
+    itself is not modified.
+    :param transformer: Valid transformer instance containing the transformed GeoDataFrame (or its FeatureStore)
     :param training: A boolean indicating whether preparation is conducted for training (Default). If false booking
                      duration and false booking will not be returned
-    :return: A dict containing raw and prepared data as DataFrame as well as the feature and target vector and the
-             label encoder
+    :param pipeline: The FeaturePipeline which is fit during training or used for prediction. Default: A new pipeline
+                     for training and the persisted pipeline of the direction model for prediction
+    :return: A dict containing raw and prepared data as DataFrame as well as the feature and target vector, the
+             label encoder and the feature pipeline
     """
-    raw_data = transformer.gdf
+    store = get_feature_store(transformer)
+    raw_data = store.get_raw_data()
+    if pipeline is None:
+        pipeline = FeaturePipeline('classifier') if training else load_pipeline('classifier')
 
     # A list containing all the university related stations in Mannheim
     university_stations = ['DHBW Mannheim - Campus Coblitzallee', 'A5 - Universität West', 'L1 - Schloss',
@@ -88,18 +118,22 @@ def classification_preparation(transformer: Transformer, training: bool = True)
 
     if training:
         # Assign trip direction labels for all trips there are four classes in total:
-        # ['to_university', 'from_unversity','false', 'not_university']
-        raw_data.loc[(raw_data['start_position_name'].isin(university_stations)), 'direction'] = 'to_university'
-        raw_data.loc[(raw_data['end_position_name'].isin(university_stations)), 'direction'] = 'from_university'
-        raw_data.loc[(raw_data['duration'] <= 180) & (
-                raw_data['start_position'] == raw_data['end_position']), 'direction'] = 'false'
-        raw_data.fillna('not_university', inplace=True)
+        # ['to_university', 'from_unversity','false', 'not_university'], np.select assigns the label of the first
+        # matching condition, so 'false' takes precedence over 'from_university' and 'from_university' over
+        # 'to_university'
+        raw_data['direction'] = np.select(
+            [store.get('false_bookings', find_false_bookings),
+             raw_data['end_position_name'].isin(university_stations).to_numpy(),
+             raw_data['start_position_name'].isin(university_stations).to_numpy()],
+            ['false', 'from_university', 'to_university'], default='not_university').astype(object)
+        raw_data = fill_missing_values(raw_data, 'not_university')
 
         # Keep only usable columns for training
-        prediction_data = raw_data[['start_time', 'weekend', 'is_station', 'direction']].copy()
+        prediction_data = raw_data[['start_time', 'weekend', 'is_station', 'direction']]
 
         # Perform feature engineering using the dedicated methods
-        prediction_data = create_time_features(prediction_data, sin_cos_transform=False, season_as_ohe=False)
+        prediction_data = pd.concat(
+            [prediction_data, get_time_features(store, sin_cos_transform=False, season_as_ohe=False)], axis=1)
 
         # Create the feature vector
         features = prediction_data.drop(columns=['direction', 'start_time'])
@@ -109,19 +143,20 @@ def classification_preparation(transformer: Transformer, training: bool = True)
         le = preprocessing.LabelEncoder().fit(y)
         y = le.transform(y)
 
-        # Save encoder to disk for later usage
-        io.save_encoder(le)
+        # Keep the encoder in the pipeline for later usage
+        pipeline.label_encoder = le
 
         print('Preparation was successful.')
 
         return {'raw_data': raw_data, 'prepared_data': prediction_data, 'features': features,
-                'target': y, 'encoder': le}
+                'target': y, 'encoder': le, 'pipeline': pipeline}
     else:
         # Keep only usable columns for prediction
-        prediction_data = raw_data[['start_time', 'weekend', 'is_station']].copy()
+        prediction_data = raw_data[['start_time', 'weekend', 'is_station']]
 
         # Perform feature engineering using the dedicated methods
-        prediction_data = create_time_features(prediction_data, sin_cos_transform=False, season_as_ohe=False)
+        prediction_data = pd.concat(
+            [prediction_data, get_time_features(store, sin_cos_transform=False, season_as_ohe=False)], axis=1)
 
         # Create the feature vector
         features = prediction_data.drop(columns=['start_time'])
@@ -129,7 +164,30 @@ def classification_preparation(transformer: Transformer, training: bool = True)
         print('Preparation was successful.')
 
         return {'raw_data': raw_data, 'prepared_data': prediction_data, 'features': features,
-                'target': None, 'encoder': None}
+                'target': None, 'encoder': pipeline.label_encoder, 'pipeline': pipeline}
+
+
+# Lookup table from the month (1-12, index 0 is unused) to the index of its season in SEASON_NAMES
+MONTH_TO_SEASON = np.array([0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0], dtype=np.intp)
+SEASON_NAMES = np.array(['WINTER', 'SPRING', 'SUMMER', 'FALL'], dtype=object)
+SEASON_ORDINALS = np.array([0, 1, 2, 3], dtype=np.int64)
+
+
+@profiled('calendar_features', rows=lambda calendar, *args, **kwargs: len(calendar['HOUR']))
+def create_calendar_features(start_time: pd.Series) -> dict:
+    """
+    Computes the integer calendar features of the start times without formatting any dates as strings. The results are
+    identical to strftime: HOUR ('%-H'), WEEK_OF_YEAR ('%W', weeks start on Monday and days before the first Monday of
+    the year are in week 0), DAY_OF_WEEK ('%w', Sunday is 0) and MONTH ('%m').
+    :param start_time: Series of datetimes
+    :return: Dict mapping the feature names to int64 arrays
+    """
+    day_of_week = start_time.dt.dayofweek.to_numpy(dtype=np.int64)
+    day_of_year = start_time.dt.dayofyear.to_numpy(dtype=np.int64)
+    return {'HOUR': start_time.dt.hour.to_numpy(dtype=np.int64),
+            'WEEK_OF_YEAR': (day_of_year + 6 - day_of_week) // 7,
+            'DAY_OF_WEEK': (day_of_week + 1) % 7,
+            'MONTH': start_time.dt.month.to_numpy(dtype=np.int64)}
 
 
 def create_time_features(prediction_data: pd.DataFrame, sin_cos_transform: bool = True,
@@ -143,93 +201,257 @@ def create_time_features(prediction_data: pd.DataFrame, sin_cos_transform: bool
     :param season_as_ohe: A boolean indicating whether the feature season should be one-hot-encoded
     :return: DataFrame containing the pre-prepared data as well as the engineered features
     """
-    # Creating an individual column for hour of the day
-    prediction_data['HOUR'] = prediction_data.start_time.dt.strftime('%-H').astype('int')
+    calendar = create_calendar_features(prediction_data['start_time'])
+    time_features = create_time_feature_frame(calendar, prediction_data.index, sin_cos_transform, season_as_ohe)
+    for column in time_features.columns:
+        prediction_data[column] = time_features[column]
 
-    # Creating an individual column for week of the year
-    prediction_data['WEEK_OF_YEAR'] = prediction_data.start_time.dt.strftime('%W').astype('int')
+    if sin_cos_transform:
+        # Dropping left-over time related columns
+        prediction_data.drop(columns=['start_time'], axis=1, inplace=True)
 
-    # Creating an individual column for day of the week
-    prediction_data['DAY_OF_WEEK'] = prediction_data.start_time.dt.strftime('%w').astype('int')
+    return prediction_data
 
-    # Check whether Season is meant to be one-hot-encoded or used as ordinal variable
-    if season_as_ohe:
-        season_list = ['WINTER', 'SPRING', 'SUMMER', 'FALL']
-    else:
-        season_list = [0, 1, 2, 3]
-
-    # Looping through the data assigning the right season in relation to the month
-    seasons = []
-    for month in prediction_data.start_time.dt.strftime('%m').astype('int'):
-        if month in [1, 2, 12]:
-            seasons.append(season_list[0])
-        elif month in [3, 4, 5]:
-            seasons.append(season_list[1])
-        elif month in [6, 7, 8]:
-            seasons.append(season_list[2])
-        elif month in [9, 10, 11]:
-            seasons.append(season_list[3])
-    prediction_data['season'] = seasons
+
+def create_time_feature_frame(calendar: dict, index: pd.Index, sin_cos_transform: bool = True,
+                              season_as_ohe: bool = True) -> pd.DataFrame:
+    """
+    Creates the time features of create_time_features from precomputed calendar features as a new DataFrame.
+    :param calendar: Calendar features as returned by create_calendar_features
+    :param index: Index of the DataFrame
+    :param sin_cos_transform: A boolean indicating whether time related features should be sin-cos transformed
+    :param season_as_ohe: A boolean indicating whether the feature season should be one-hot-encoded
+    :return: DataFrame containing the engineered features
+    """
+    time_features = pd.DataFrame(index=index)
+    time_features['HOUR'] = calendar['HOUR']
+    time_features['WEEK_OF_YEAR'] = calendar['WEEK_OF_YEAR']
+    time_features['DAY_OF_WEEK'] = calendar['DAY_OF_WEEK']
+
+    # Check whether Season is meant to be one-hot-encoded or used as ordinal variable and look up the month's season
+    season_list = SEASON_NAMES if season_as_ohe else SEASON_ORDINALS
+    time_features['season'] = season_list[MONTH_TO_SEASON[calendar['MONTH']]]
 
     if sin_cos_transform:
         # Applying sine,cosine transformation on column hour to retain the cyclical nature
-        prediction_data['HOUR_SIN'] = np.sin(prediction_data.HOUR * (2. * np.pi / 24))
-        prediction_data['HOUR_COS'] = np.cos(prediction_data.HOUR * (2. * np.pi / 24))
+        time_features['HOUR_SIN'] = np.sin(time_features.HOUR * (2. * np.pi / 24))
+        time_features['HOUR_COS'] = np.cos(time_features.HOUR * (2. * np.pi / 24))
 
         # Applying sine,cosine transformation on column WEEK_OF_YEAR to retain the cyclical nature
-        prediction_data['WEEK_OF_YEAR_SIN'] = np.sin(prediction_data.WEEK_OF_YEAR * (2. * np.pi / 52))
-        prediction_data['WEEK_OF_YEAR_COS'] = np.cos(prediction_data.WEEK_OF_YEAR * (2. * np.pi / 52))
+        time_features['WEEK_OF_YEAR_SIN'] = np.sin(time_features.WEEK_OF_YEAR * (2. * np.pi / 52))
+        time_features['WEEK_OF_YEAR_COS'] = np.cos(time_features.WEEK_OF_YEAR * (2. * np.pi / 52))
 
         # Applying sine,cosine transformation on column DAY_OF_WEEK to retain the cyclical nature
-        prediction_data['DAY_OF_WEEK_SIN'] = np.sin(prediction_data.DAY_OF_WEEK * (2. * np.pi / 7))
-        prediction_data['DAY_OF_WEEK_COS'] = np.cos(prediction_data.DAY_OF_WEEK * (2. * np.pi / 7))
+        time_features['DAY_OF_WEEK_SIN'] = np.sin(time_features.DAY_OF_WEEK * (2. * np.pi / 7))
+        time_features['DAY_OF_WEEK_COS'] = np.cos(time_features.DAY_OF_WEEK * (2. * np.pi / 7))
 
         # Dropping left-over time related columns
-        prediction_data.drop(columns=['WEEK_OF_YEAR', 'DAY_OF_WEEK', 'HOUR', 'start_time'], axis=1, inplace=True)
+        time_features.drop(columns=['WEEK_OF_YEAR', 'DAY_OF_WEEK', 'HOUR'], axis=1, inplace=True)
 
-    return prediction_data
+    return time_features
 
 
-def create_dummy_features(prediction_data: pd.DataFrame, training: bool = True) -> pd.DataFrame:
+@profiled('time_features', rows=lambda result, *args, **kwargs: len(result))
+def get_time_features(store: FeatureStore, sin_cos_transform: bool = True, season_as_ohe: bool = True) -> pd.DataFrame:
+    """
+    Returns the time features of the transformed data of a FeatureStore. The calendar features are computed once for
+    all variants. The returned DataFrame is shared and must not be modified.
+    :param store: FeatureStore of the transformed data
+    :param sin_cos_transform: A boolean indicating whether time related features should be sin-cos transformed
+    :param season_as_ohe: A boolean indicating whether the feature season should be one-hot-encoded
+    :return: DataFrame containing the engineered features
+    """
+    calendar = store.get('calendar', lambda gdf: create_calendar_features(gdf['start_time']))
+    return store.get('time_features_{}_{}'.format(sin_cos_transform, season_as_ohe),
+                     lambda gdf: create_time_feature_frame(calendar, gdf.index, sin_cos_transform, season_as_ohe))
+
+
+@profiled('false_bookings', rows=lambda result, *args, **kwargs: len(result))
+def find_false_bookings(trips: pd.DataFrame) -> np.ndarray:
+    """
+    Identifies false bookings in relation to the information provided by the VRN: Trips of at most three minutes which
+    end at their start position.
+    :param trips: DataFrame of transformed trips
+    :return: Boolean array which is True for every false booking
+    """
+    return ((trips['duration'] <= 180) & (trips['start_lat'] == trips['end_lat']) &
+            (trips['start_lng'] == trips['end_lng'])).to_numpy()
+
+
+def fill_missing_values(data: pd.DataFrame, value) -> pd.DataFrame:
+    """
+    Fills missing values like DataFrame.fillna, but replaces the affected columns instead of writing into them. Shallow
+    copies of shared data can therefore be filled without modifying the shared data.
+    :param data: DataFrame with missing values
+    :param value: Value used to fill the missing values
+    :return: The DataFrame without missing values
+    """
+    for column in data.columns[data.isna().any().to_numpy()]:
+        data[column] = data[column].fillna(value)
+    return data
+
+
+@profiled('dummy_features', rows=lambda result, *args, **kwargs: len(result))
+def create_dummy_features(prediction_data: pd.DataFrame, training: bool = True,
+                          pipeline: FeaturePipeline = None) -> pd.DataFrame:
     """
     A dedicated method for the creation of one-hot-encoded binary features. If needed transforms real stations and
     season.
     :param prediction_data: A DataFrame containing the pre-prepared data
-    :return: DataFrame containing the pre-prepared data as well as the engineered features
+    :param training: A boolean indicating whether the encoders should be fit
+    :param pipeline: The FeaturePipeline holding the encoders. Default: A new pipeline for training and the persisted
+                     pipeline of the duration model for prediction
+    :return: DataFrame containing the pre-prepared data as well as the engineered features (as sparse columns if the
+             pipeline is sparse)
     """
+    if pipeline is None:
+        pipeline = FeaturePipeline('regressor') if training else load_pipeline('regressor')
 
     if training:
         # Create dummies of all real stations
-        station_ohe = preprocessing.OneHotEncoder(handle_unknown='ignore', sparse=False)
+        station_ohe = preprocessing.OneHotEncoder(handle_unknown='ignore', sparse=pipeline.sparse)
         station_dummies = station_ohe.fit_transform(
             prediction_data.loc[prediction_data['is_station'] == True, 'start_position_name'].to_numpy().reshape(-1, 1))
-        station_dummies = pd.DataFrame(station_dummies, columns=station_ohe.get_feature_names())
-        # Save station encoder to disk for later usage
-        io.save_encoder(station_ohe, type='station')
+        station_dummies = create_dummy_frame(station_dummies, station_ohe.get_feature_names())
+        # Keep station encoder in the pipeline for later usage
+        pipeline.station_encoder = station_ohe
 
         # Create dummies of the seasons
-        seasonal_ohe = preprocessing.OneHotEncoder(handle_unknown='ignore', sparse=False)
+        seasonal_ohe = preprocessing.OneHotEncoder(handle_unknown='ignore', sparse=pipeline.sparse)
         seasonal_dummies = seasonal_ohe.fit_transform(prediction_data['season'].to_numpy().reshape(-1, 1))
         seasonal_dummies = pd.DataFrame(station_dummies, columns=seasonal_ohe.get_feature_names())
-        # Save season encoder to disk for later usage
-        io.save_encoder(seasonal_ohe, type='season')
+        # Keep season encoder in the pipeline for later usage
+        pipeline.season_encoder = seasonal_ohe
     else:
-        # Read station encoder from disk
-        station_ohe = io.read_encoder(type='station')
-        station_dummies = station_ohe.transform(
-            prediction_data.loc[prediction_data['is_station'] == True, 'start_position_name'].to_numpy().reshape(-1, 1))
-        station_dummies = pd.DataFrame(station_dummies, columns=station_ohe.get_feature_names())
-
-        # Read season encoder from disk
-        seasonal_ohe = io.read_encoder(type='season')
+        # Use the fitted station encoder of the pipeline
+        station_ohe = pipeline.station_encoder
+        stations = prediction_data.loc[prediction_data['is_station'] == True, 'start_position_name'].to_numpy()
+        if len(stations):
+            station_dummies = station_ohe.transform(stations.reshape(-1, 1))
+        else:
+            # The encoder rejects empty inputs (e.g. a single booking of a free floating bike)
+            station_dummies = np.zeros((0, len(station_ohe.get_feature_names())))
+        station_dummies = create_dummy_frame(station_dummies, station_ohe.get_feature_names())
+
+        # Use the fitted season encoder of the pipeline
+        seasonal_ohe = pipeline.season_encoder
         seasonal_dummies = seasonal_ohe.transform(prediction_data['season'].to_numpy().reshape(-1, 1))
         seasonal_dummies = pd.DataFrame(station_dummies, columns=seasonal_ohe.get_feature_names())
 
+    if pipeline.sparse:
+        # Keep the (empty) season dummies sparse as well
+        seasonal_dummies = seasonal_dummies.fillna(0.0).astype(pd.SparseDtype(np.float64, 0.0))
+
     # Drop season and station names as no longer needed
     prediction_data.drop(columns=['season', 'start_position_name'], axis=1, inplace=True)
 
     # Concatenate the dummy variable vectors to the DataFrame and fill up empty cells which do not relate to a station
     prediction_data = pd.concat([prediction_data, seasonal_dummies, station_dummies], axis=1)
-    prediction_data.fillna(0.0, inplace=True)
+    # Sparse columns do not support inplace assignments
+    prediction_data = prediction_data.fillna(0.0)
 
     return prediction_data
+
+
+def create_dummy_frame(dummies: np.ndarray or sparse.spmatrix, columns: list) -> pd.DataFrame:
+    """
+    Wraps the output of a OneHotEncoder in a DataFrame. Sparse outputs become sparse columns, so that the dummies are
+    never densified.
+    :param dummies: Dense array or sparse matrix of dummies
+    :param columns: Names of the dummy columns
+    :return: DataFrame of dummies
+    """
+    if sparse.issparse(dummies):
+        return pd.DataFrame.sparse.from_spmatrix(dummies, columns=columns)
+    return pd.DataFrame(dummies, columns=columns)
+
+
+@profiled('feature_matrix', rows=lambda features, *args, **kwargs: features.shape[0])
+def create_feature_matrix(features: pd.DataFrame) -> pd.DataFrame or sparse.csr_matrix:
+    """
+    Converts a DataFrame with sparse dummy columns to a CSR matrix in which the dense columns come first (the dummies
+    are always the last columns). DataFrames without sparse columns are returned unchanged.
+    :param features: DataFrame of features
+    :return: The DataFrame or a CSR matrix
+    """
+    sparse_columns = [column for column, dtype in features.dtypes.items() if isinstance(dtype, pd.SparseDtype)]
+    if not sparse_columns:
+        return features
+    dense_features = features.drop(columns=sparse_columns).to_numpy(dtype=np.float64)
+    return sparse.hstack([sparse.csr_matrix(dense_features), features[sparse_columns].sparse.to_coo()], format='csr')
+
+
+# Candidate configurations of the compact forest search, ordered from the smallest to the largest forest
+COMPACT_FOREST_CANDIDATES = [
+    {'n_estimators': 10, 'max_depth': 10, 'min_samples_leaf': 20, 'max_samples': 0.5},
+    {'n_estimators': 25, 'max_depth': 12, 'min_samples_leaf': 10, 'max_samples': 0.5},
+    {'n_estimators': 25, 'max_depth': 16, 'min_samples_leaf': 5},
+    {'n_estimators': 50, 'max_depth': 16, 'min_samples_leaf': 5},
+    {'n_estimators': 50, 'max_depth': 20, 'min_samples_leaf': 2},
+    {'n_estimators': 100, 'max_depth': 20, 'min_samples_leaf': 2}
+]
+
+
+def search_compact_forest(forest_class: type, features: pd.DataFrame or sparse.csr_matrix, target: np.ndarray,
+                          start_time: pd.Series or np.ndarray, tolerance: float = 0.05, candidates: list = None,
+                          n_jobs: int = -1, random_state: int = 123, test_size: float = 0.2) -> dict:
+    """
+    Searches for the smallest forest whose error on a holdout set is at most (1 + tolerance) times the error of the
+    default forest. The holdout set consists of the most recent trips, so that neighbouring trips of the training set
+    do not make the error too optimistic. The error is the mean absolute error for regressors and the misclassification
+    rate for classifiers. For every candidate the error, model size, train time and single-row predict latency are
+    reported.
+    :param forest_class: RandomForestRegressor or RandomForestClassifier
+    :param features: Feature vector
+    :param target: Target vector
+    :param start_time: Start times of the trips of the feature vector
+    :param tolerance: Accepted relative increase of the holdout error compared to the default forest
+    :param candidates: List of dicts of forest parameters (Default: COMPACT_FOREST_CANDIDATES)
+    :param n_jobs: An int specifying the number of threads to be used for training
+    :param random_state: An int to lock the randomness of the forests
+    :param test_size: Share of the most recent rows used as holdout set
+    :return: A dict containing the forest parameters of the selected candidate and a DataFrame report with one row per
+             candidate (including the default forest) sorted by model size
+    """
+    order = np.argsort(np.asarray(start_time), kind='stable')
+    n_test = max(int(np.ceil(len(order) * test_size)), 1)
+    train_index, test_index = order[:-n_test], order[-n_test:]
+    if isinstance(features, pd.DataFrame):
+        X_train, X_test = features.iloc[train_index], features.iloc[test_index]
+    else:
+        X_train, X_test = features[train_index], features[test_index]
+    y_train, y_test = np.ravel(target)[train_index], np.ravel(target)[test_index]
+    is_classifier = forest_class.__name__.endswith('Classifier')
+    n_latency_rows = min(10, X_test.shape[0])
+    candidates = (COMPACT_FOREST_CANDIDATES if candidates is None else candidates) + [{}]
+    report = []
+    for parameters in candidates:
+        forest = forest_class(n_jobs=n_jobs, random_state=random_state, **parameters)
+        start = time.perf_counter()
+        forest.fit(X_train, y_train)
+        train_time = time.perf_counter() - start
+
+        # Measure the latency of single predictions without the overhead of the thread pool
+        forest.n_jobs = 1
+        start = time.perf_counter()
+        for row in range(n_latency_rows):
+            forest.predict(X_test[row:row + 1])
+        predict_latency = (time.perf_counter() - start) / n_latency_rows
+
+        predictions = forest.predict(X_test)
+        error = 1 - accuracy_score(y_test, predictions) if is_classifier else mean_absolute_error(y_test, predictions)
+        report.append({'candidate': str(parameters or 'default'),
+                       'error': error,
+                       'size_mb': len(pickle.dumps(forest, protocol=pickle.HIGHEST_PROTOCOL)) / 2 ** 20,
+                       'train_time_s': train_time,
+                       'predict_latency_ms': predict_latency * 1000})
+        print('Candidate {}: error {:.4f}, {:.2f} MB, trained in {:.1f} s'.format(
+            report[-1]['candidate'], error, report[-1]['size_mb'], train_time))
+
+    report = pd.DataFrame(report)
+    report['accepted'] = report['error'] <= report['error'].iloc[-1] * (1 + tolerance)
+    report = report.sort_values(['size_mb', 'predict_latency_ms'])
+    # The default forest is always accepted, so that a candidate is selected in any case
+    selected = report.index[report['accepted']][0]
+    report['selected'] = report.index == selected
+    return {'parameters': candidates[selected], 'report': report.reset_index(drop=True)}
@@ -0,0 +1,116 @@
+import os
+from functools import lru_cache
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import box
+from shapely.geometry.base import BaseGeometry
+from shapely.prepared import prep
+
+from nextbike.io import get_data_path
+
+try:
+    # Shapely >= 2.0 ships a vectorized point in polygon test that works directly on coordinate arrays
+    from shapely import contains_xy, prepare
+except ImportError:
+    from shapely.vectorized import contains as contains_xy
+
+    prepare = None
+
+# States of the grid cells
+OUTSIDE = 0
+INSIDE = 1
+BOUNDARY = 2
+
+
+class Geofence:
+    """
+    This class answers point in polygon queries for large coordinate arrays. A regular grid over the bounding box of the
+    boundary is classified once, so that only points in cells which intersect the boundary line need an exact test.
+    """
+
+    def __init__(self, boundary: BaseGeometry, grid_size: int = 64):
+        """
+        Initializes the Geofence and precomputes the grid index.
+        :param boundary: (Multi-)Polygon describing the area
+        :param grid_size: Number of grid cells per axis
+        """
+        self.boundary = boundary
+        self.grid_size = grid_size
+        self._min_x, self._min_y, self._max_x, self._max_y = boundary.bounds
+        self._cell_width = (self._max_x - self._min_x) / grid_size
+        self._cell_height = (self._max_y - self._min_y) / grid_size
+        prepared = prep(boundary)
+        if prepare is not None:
+            prepare(boundary)
+            self._exact_geometry = boundary
+        else:
+            self._exact_geometry = prepared
+        self._cells = self.__classify_cells(prepared)
+
+    def __classify_cells(self, prepared) -> np.ndarray:
+        """
+        Classifies every grid cell as inside, outside or intersecting the boundary line.
+        :param prepared: Prepared geometry of the boundary
+        :return: Array of shape (grid_size, grid_size) indexed by [row, column]
+        """
+        cells = np.full((self.grid_size, self.grid_size), BOUNDARY, dtype=np.uint8)
+        # Slightly enlarge the cells so that floating point errors of the cell assignment cannot produce wrong results
+        margin_x = self._cell_width * 1e-6
+        margin_y = self._cell_height * 1e-6
+        for row in range(self.grid_size):
+            for column in range(self.grid_size):
+                cell = box(self._min_x + column * self._cell_width - margin_x,
+                           self._min_y + row * self._cell_height - margin_y,
+                           self._min_x + (column + 1) * self._cell_width + margin_x,
+                           self._min_y + (row + 1) * self._cell_height + margin_y)
+                if prepared.contains_properly(cell):
+                    cells[row, column] = INSIDE
+                elif not prepared.intersects(cell):
+                    cells[row, column] = OUTSIDE
+        return cells
+
+    def contains(self, lng: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        """
+        Checks which coordinates lie within the boundary. Points on the boundary line are outside (like shapely's
+        within).
+        :param lng: Array of longitudes
+        :param lat: Array of latitudes
+        :return: Boolean array which is True for every coordinate within the boundary
+        """
+        lng = np.asarray(lng, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        result = np.zeros(len(lng), dtype=bool)
+
+        # Points outside of the bounding box (or NaN coordinates) are never within the boundary
+        candidates = np.flatnonzero((lng >= self._min_x) & (lng <= self._max_x) &
+                                    (lat >= self._min_y) & (lat <= self._max_y))
+        columns = np.minimum(((lng[candidates] - self._min_x) / self._cell_width).astype(np.intp), self.grid_size - 1)
+        rows = np.minimum(((lat[candidates] - self._min_y) / self._cell_height).astype(np.intp), self.grid_size - 1)
+        states = self._cells[rows, columns]
+
+        result[candidates[states == INSIDE]] = True
+        # Only points in cells which intersect the boundary line need the exact point in polygon test
+        ambiguous = candidates[states == BOUNDARY]
+        if len(ambiguous):
+            result[ambiguous] = contains_xy(self._exact_geometry, lng[ambiguous], lat[ambiguous])
+        return result
+
+
+@lru_cache(maxsize=None)
+def load_geofence(path: str) -> Geofence:
+    """
+    Loads a GeoJSON boundary once per process and builds the corresponding Geofence.
+    :param path: Path pointing to the GeoJSON file
+    :return: Geofence
+    """
+    boundary_gdf = gpd.read_file(path, crs='EPSG:4326')
+    return Geofence(boundary_gdf['geometry'][0])
+
+
+def get_mannheim_geofence() -> Geofence:
+    """
+    Returns the cached Geofence of the Mannheim boundary.
+    :return: Geofence
+    """
+    return load_geofence(os.path.join(get_data_path(), 'input/mannheim_boundary.geojson'))
@@ -1,33 +1,147 @@
+import atexit
 import multiprocessing as mp
-import os
+import time
+from multiprocessing import shared_memory
+from multiprocessing.pool import Pool
 
-import geopandas as gpd
 import numpy as np
-import pandas as pd
 
-from nextbike.io import get_data_path
-from nextbike.preprocessing.Preprocessor import Preprocessor
+from nextbike.preprocessing.Geofence import get_mannheim_geofence
+from nextbike.preprocessing.Preprocessor import Preprocessor, count_bookings
+from nextbike.profiling import profiled
 
+# Persistent worker pools keyed by their number of processes (shared by all ParallelPreprocessor instances)
+_pools = {}
+# Measured number of rows from which on parallel execution pays off keyed by the number of processes
+_calibrated_thresholds = {}
 
-def execute_geo_filtering(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    # Load the GeoJSON boundary of Mannheim
-    mannheim_boundary_gdf = gpd.read_file(os.path.join(get_data_path(), 'input/mannheim_boundary.geojson'),
-                                          crs='EPSG:4326')
-    # Remove all trips which are not within Mannheim (using native shapely is faster than geopandas' spatial join)
-    return gdf[gdf.within(mannheim_boundary_gdf['geometry'][0])]
+
+def init_worker() -> None:
+    """
+    Initializes a worker process by loading the geofence once, so that tasks only carry shared memory references.
+    :return: None
+    """
+    get_mannheim_geofence()
+
+
+def execute_geo_filtering(shm_name: str, n_rows: int, start: int, stop: int) -> np.ndarray:
+    """
+    Checks which coordinates of the slice [start, stop) of a shared (2, n_rows) lng/lat array lie within Mannheim.
+    :param shm_name: Name of the shared memory block holding the coordinates
+    :param n_rows: Total number of rows in the shared memory block
+    :param start: First row of the slice
+    :param stop: Row after the last row of the slice
+    :return: Boolean mask of the slice
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    coordinates = np.ndarray((2, n_rows), dtype=np.float64, buffer=shm.buf)
+    mask = get_mannheim_geofence().contains(coordinates[0, start:stop], coordinates[1, start:stop])
+    # The view has to be released before the shared memory block can be closed
+    del coordinates
+    shm.close()
+    return mask
+
+
+def get_pool(n_processes: int) -> Pool:
+    """
+    Returns a persistent worker pool with the given number of processes and starts it on first use.
+    :param n_processes: Number of worker processes
+    :return: Pool
+    """
+    if n_processes not in _pools:
+        _pools[n_processes] = mp.Pool(processes=n_processes, initializer=init_worker)
+    return _pools[n_processes]
+
+
+@atexit.register
+def close_pools() -> None:
+    """
+    Shuts down all persistent worker pools.
+    :return: None
+    """
+    for pool in _pools.values():
+        pool.terminate()
+    _pools.clear()
 
 
 class ParallelPreprocessor(Preprocessor):
+    """
+    This class handles the preprocessing of the NextBike data and executes the geo filtering on a process pool.
+    """
+
+    def __init__(self, n_processes: int = None, serial_threshold: int = None, compact: bool = False):
+        """
+        Initializes the ParallelPreprocessor.
+        :param n_processes: Number of worker processes. Default: Number of available cores
+        :param serial_threshold: Number of rows below which the geo filtering runs serially. Default: Measured on the
+                                 first call by comparing the serial cost per row with the overhead of the pool
+        :param compact: Indicates whether the data should be held in a memory-compact representation
+        """
+        super().__init__(compact)
+        self.n_processes = n_processes if n_processes else max(mp.cpu_count() or 1, 1)
+        self.serial_threshold = serial_threshold
+
+    @profiled('geo_filter', rows=count_bookings)
     def _geo_filter_mannheim_trips(self) -> None:
-        n_cpus = mp.cpu_count()
-        n_processes = n_cpus if n_cpus and n_cpus > 1 else 1
-        # Do not use parallel execution if the computer has less than 8 cores because the multiprocess overhead is too
-        # much relative to the performance improvement
-        if n_processes < 8:
+        lng = self._gdf['p_lng'].to_numpy(dtype=np.float64)
+        lat = self._gdf['p_lat'].to_numpy(dtype=np.float64)
+        if self.n_processes < 2 or len(lng) < self.__get_serial_threshold(lng, lat):
             return super()._geo_filter_mannheim_trips()
 
-        split_gdf = np.array_split(self._gdf, n_processes)
-        print('Start {} processes ...'.format(n_processes))
-        with mp.Pool(processes=n_processes) as pool:
-            self._gdf = gpd.GeoDataFrame(pd.concat(pool.map(execute_geo_filtering, split_gdf), ignore_index=True),
-                                         crs=self._gdf.crs)
+        print('Geo filtering {} rows with {} processes ...'.format(len(lng), self.n_processes))
+        self._gdf = self._gdf[self.__parallel_contains(lng, lat)]
+
+    def __parallel_contains(self, lng: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        """
+        Copies the coordinates once into shared memory and lets the workers compute the mask slice by slice.
+        :param lng: Array of longitudes
+        :param lat: Array of latitudes
+        :return: Boolean mask which is True for every coordinate within Mannheim
+        """
+        n_rows = len(lng)
+        shm = shared_memory.SharedMemory(create=True, size=max(2 * n_rows * np.dtype(np.float64).itemsize, 1))
+        try:
+            coordinates = np.ndarray((2, n_rows), dtype=np.float64, buffer=shm.buf)
+            coordinates[0] = lng
+            coordinates[1] = lat
+            bounds = np.linspace(0, n_rows, self.n_processes + 1, dtype=np.intp)
+            tasks = [(shm.name, n_rows, start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+            masks = get_pool(self.n_processes).starmap(execute_geo_filtering, tasks)
+            del coordinates
+        finally:
+            shm.close()
+            shm.unlink()
+        return np.concatenate(masks)
+
+    def __get_serial_threshold(self, lng: np.ndarray, lat: np.ndarray) -> float:
+        """
+        Returns the configured serial threshold or measures it. Parallel execution pays off if the saved serial time
+        n_rows * cost_per_row * (1 - 1 / n_processes) exceeds the overhead of one round trip through the pool.
+        :param lng: Array of longitudes
+        :param lat: Array of latitudes
+        :return: Number of rows from which on the geo filtering runs in parallel
+        """
+        if self.serial_threshold is not None:
+            return self.serial_threshold
+        if self.n_processes in _calibrated_thresholds:
+            return _calibrated_thresholds[self.n_processes]
+
+        # Measure the serial cost per row on a sample of the actual data
+        geofence = get_mannheim_geofence()
+        sample = min(len(lng), 100000)
+        start = time.perf_counter()
+        geofence.contains(lng[:sample], lat[:sample])
+        cost_per_row = (time.perf_counter() - start) / max(sample, 1)
+        saving_factor = 1 - 1 / self.n_processes
+        # Do not start any process if even a free pool could not save a millisecond
+        if len(lng) * cost_per_row * saving_factor < 1e-3:
+            return np.inf
+
+        # Measure the overhead of a round trip through the (warmed up) pool on a small slice
+        get_pool(self.n_processes)
+        self.__parallel_contains(lng[:self.n_processes], lat[:self.n_processes])
+        start = time.perf_counter()
+        self.__parallel_contains(lng[:self.n_processes], lat[:self.n_processes])
+        overhead = time.perf_counter() - start
+        _calibrated_thresholds[self.n_processes] = overhead / (cost_per_row * saving_factor)
+        return _calibrated_thresholds[self.n_processes]
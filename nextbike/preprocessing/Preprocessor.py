@@ -1,19 +1,37 @@
 import os
 import warnings
+from typing import Iterator
 
 import geopandas as gpd
 import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 
 from nextbike.io import (
+    get_cache_key,
     get_data_path,
-    read_df
+    read_cache,
+    read_raw_chunks,
+    read_raw_df,
+    write_cache
 )
 from nextbike.preprocessing.AbstractValidator import AbstractValidator
+from nextbike.profiling import profile_stage, profiled
+from nextbike.preprocessing.Geofence import get_mannheim_geofence
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 
+def count_bookings(result, preprocessor, *args, **kwargs) -> int:
+    """
+    Returns the number of bookings of a Preprocessor after a profiled stage.
+    :param result: Return value of the stage
+    :param preprocessor: The Preprocessor
+    :return: Number of bookings
+    """
+    return len(preprocessor.gdf)
+
+
 # Must not be in the Preprocessor class, because it does not need access to the instance (static method)
 def validate_input(df: pd.DataFrame) -> None:
     """
@@ -30,11 +48,112 @@ def validate_input(df: pd.DataFrame) -> None:
                 'The input data set does not match the required column format. Please make sure that it is valid.')
 
 
+def find_invalid_bookings(trips: np.ndarray, b_numbers: np.ndarray) -> np.ndarray:
+    """
+    Marks all bookings which break the alternating start/end structure of a data set sorted by b_number and datetime.
+    The rules are evaluated on the sliding window [i, i + 1] as shifted numpy arrays instead of a Python loop.
+    :param trips: Array of trip types sorted by b_number and datetime
+    :param b_numbers: Array of bike numbers aligned with trips
+    :return: Boolean array which is True for every booking that has to be deleted
+    """
+    delete_mask = np.zeros(len(trips), dtype=bool)
+    if len(trips) == 0:
+        return delete_mask
+
+    current_trips, next_trips = trips[:-1], trips[1:]
+    current_is_start = current_trips == 'start'
+    # Special case: The trips of one bike should not end with a trip of type 'start' and the booking of the next bike
+    # should not start with a trip of type 'end'
+    bike_boundary = current_is_start & (next_trips == 'end') & (b_numbers[:-1] != b_numbers[1:])
+    delete_mask[:-1] |= bike_boundary
+    delete_mask[1:] |= bike_boundary
+    # Regular case: Remove double start or end trips (the first of both for start and the last of both for end)
+    same_trip = current_trips == next_trips
+    delete_mask[:-1] |= same_trip & current_is_start
+    delete_mask[1:] |= same_trip & ~current_is_start
+    # Another special case: Omit the very last entry if it is of trip type 'start'
+    delete_mask[-1] |= trips[-1] == 'start'
+    return delete_mask
+
+
+def find_validation_errors(trips: np.ndarray, b_numbers: np.ndarray) -> dict:
+    """
+    Finds all violations of the alternating start/end structure in one vectorized pass.
+    :param trips: Array of trip types sorted by b_number and datetime
+    :param b_numbers: Array of bike numbers aligned with trips
+    :return: A dict containing the validity, the number of rows and the row indices and counts per violation kind
+    """
+    if len(trips) < 2:
+        bike_boundary = np.empty(0, dtype=np.intp)
+        consecutive_trip_type = np.empty(0, dtype=np.intp)
+    else:
+        current_trips, next_trips = trips[:-1], trips[1:]
+        # The first booking of a bike cannot be of trip type 'end'
+        bike_boundary = np.flatnonzero(
+            (current_trips == 'start') & (next_trips == 'end') & (b_numbers[:-1] != b_numbers[1:]))
+        # Two consecutive rows should not have the same trip type
+        consecutive_trip_type = np.flatnonzero(current_trips == next_trips)
+
+    return {
+        'valid': len(bike_boundary) == 0 and len(consecutive_trip_type) == 0,
+        'n_rows': len(trips),
+        'violations': {
+            'bike_boundary': {'indices': bike_boundary, 'count': len(bike_boundary)},
+            'consecutive_trip_type': {'indices': consecutive_trip_type, 'count': len(consecutive_trip_type)}
+        }
+    }
+
+
+def compact_bookings(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts the raw bookings to a memory-compact representation: categorical station names, trip and bike types,
+    downcasted integer columns and float32 coordinates.
+    :param df: Raw DataFrame
+    :return: Compact DataFrame
+    """
+    for column in ['trip', 'p_name', 'b_bike_type']:
+        if df[column].dtype.name != 'category':
+            df[column] = df[column].astype('category')
+        # Make 0 a valid category, so that missing values can be filled with 0 like in all other columns
+        if df[column].isna().any() and 0 not in df[column].cat.categories:
+            df[column] = df[column].cat.add_categories([0])
+    for column in df.select_dtypes('integer').columns:
+        df[column] = pd.to_numeric(df[column], downcast='integer')
+    for column in ['p_lat', 'p_lng']:
+        df[column] = df[column].astype(np.float32)
+    return df
+
+
+def concat_bookings(frames: list) -> gpd.GeoDataFrame:
+    """
+    Concatenates bookings. Categorical columns stay categorical, whereas pd.concat falls back to object columns if the
+    categories of the frames differ.
+    :param frames: List of GeoDataFrames of bookings
+    :return: GeoDataFrame
+    """
+    for column in frames[0].select_dtypes('category').columns:
+        if all(frame[column].dtype.name == 'category' for frame in frames):
+            categories = union_categoricals([frame[column] for frame in frames], ignore_order=True).categories
+            frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames)
+
+
 class Preprocessor(AbstractValidator):
     """
     This class handles the preprocessing of the NextBike data.
     """
     _gdf: gpd.GeoDataFrame = None
+    _validation_report: dict = None
+    _source_path: str = None
+    compact: bool = False
+
+    def __init__(self, compact: bool = False):
+        """
+        Initializes the Preprocessor.
+        :param compact: Indicates whether the data should be held in a memory-compact representation (categorical and
+                        downcasted columns, float32 coordinates and no geometry column, see get_geo_gdf)
+        """
+        self.compact = compact
 
     @property
     def gdf(self) -> gpd.GeoDataFrame:
@@ -47,6 +166,27 @@ class Preprocessor(AbstractValidator):
             raise UserWarning('Data frame is not initialized.')
         return self._gdf
 
+    @property
+    def source_path(self) -> str or None:
+        """
+        A computed property returning the path of the raw data if the GeoDataFrame was loaded via load_clean_gdf
+        :return: str or None
+        """
+        return self._source_path
+
+    def get_geo_gdf(self) -> gpd.GeoDataFrame:
+        """
+        Returns the GeoDataFrame with a Point geometry per booking. In compact mode the geometry is created on demand
+        from the coordinates and is not stored.
+        :return: GeoDataFrame
+        :raises: UserWarning
+        """
+        if 'geometry' in self.gdf.columns:
+            return self.gdf
+        return gpd.GeoDataFrame(self.gdf, crs='EPSG:4326',
+                                geometry=gpd.points_from_xy(self.gdf['p_lng'], self.gdf['p_lat']))
+
+    @profiled('load_gdf', rows=count_bookings)
     def load_gdf(self, path: str = None) -> None:
         """
         Reads the raw DataFrame, transforms it to a GeoDataFrame and initializes the __gdf property.
@@ -54,90 +194,218 @@ class Preprocessor(AbstractValidator):
         :return: None
         """
         if path:
-            df = read_df(path, index_col=0, parse_dates=['datetime'])
+            df = read_raw_df(path)
         else:
-            df = read_df(os.path.join(get_data_path(), 'input/mannheim.csv'), index_col=0, parse_dates=['datetime'])
+            df = read_raw_df(os.path.join(get_data_path(), 'input/mannheim.csv'))
         validate_input(df)
-        self._gdf = gpd.GeoDataFrame(df, crs='EPSG:4326', geometry=gpd.points_from_xy(df['p_lng'], df['p_lat']))
+        self._validation_report = None
+        self._source_path = None
+        if self.compact:
+            memory_before = df.memory_usage(deep=True).sum()
+            df = compact_bookings(df)
+            print('Compact mode reduced the memory usage from {:.1f} MB to {:.1f} MB (without geometry column).'.format(
+                memory_before / 1024 ** 2, df.memory_usage(deep=True).sum() / 1024 ** 2))
+            self._gdf = gpd.GeoDataFrame(df)
+        else:
+            self._gdf = gpd.GeoDataFrame(df, crs='EPSG:4326', geometry=gpd.points_from_xy(df['p_lng'], df['p_lat']))
 
+    @profiled('load_clean_gdf', rows=count_bookings)
+    def load_clean_gdf(self, path: str = None, validate: bool = False, use_cache: bool = True) -> None:
+        """
+        Loads and cleans the raw data. The cleaned GeoDataFrame is cached on disk per input file, so that repeated runs
+        on the same input skip parsing and cleaning entirely.
+        :param path: A path that points to the .csv file
+        :param bool validate: Indicates whether a validation post-hook should be run or not.
+        :param use_cache: Indicates whether the cache should be used
+        :return: None
+        """
+        path = path if path else os.path.join(get_data_path(), 'input/mannheim.csv')
+        key = get_cache_key(path, 'clean-compact' if self.compact else 'clean')
+        cached_gdf = read_cache(key) if use_cache else None
+        if cached_gdf is not None:
+            print('Loaded cleaned data frame from cache.')
+            self._validation_report = None
+            self._gdf = cached_gdf
+            if validate:
+                self.validate()
+        else:
+            self.load_gdf(path)
+            self.clean_gdf(validate)
+            if use_cache:
+                write_cache(self._gdf, key)
+        self._source_path = path
+
+    def stream_gdf(self, path: str = None, chunksize: int = 500000,
+                   state: dict = None) -> Iterator[gpd.GeoDataFrame]:
+        """
+        Reads and cleans the raw data chunk by chunk. Every yielded GeoDataFrame contains complete trips, i.e. each
+        'start' booking is directly followed by the matching 'end' booking of the same bike. Only the last booking time
+        and the open 'start' booking of every bike are carried across chunk boundaries, so the peak memory is bounded
+        by the chunksize. The raw data has to be ordered by datetime.
+        :param path: A path that points to the .csv file
+        :param chunksize: Number of raw rows which are read at once
+        :param state: Dict holding the carried 'last_datetimes' and 'open_bookings' (optional). It is updated before
+                      every yield, so that a later call can continue the booking histories with the next raw file.
+        :return: Iterator of GeoDataFrames
+        :raises: FileNotFoundError, ValueError
+        """
+        path = path if path else os.path.join(get_data_path(), 'input/mannheim.csv')
+        geofence = get_mannheim_geofence()
+        state = state if state is not None else {}
+        last_datetimes = state.get('last_datetimes', pd.Series(dtype='datetime64[ns]'))
+        # Last booking times of the files which were streamed by earlier calls
+        carried_datetimes = last_datetimes
+        open_bookings = state.get('open_bookings')
+        for df in read_raw_chunks(path, chunksize):
+            validate_input(df)
+            # Fill NaN values with 0 and drop double bookings (also against the last booking of the previous chunks)
+            df.fillna(0, inplace=True)
+            df.drop_duplicates(subset=['b_number', 'datetime'], inplace=True)
+            previous_datetimes = df['b_number'].map(last_datetimes)
+            if (df['datetime'] < previous_datetimes).any():
+                if (df['datetime'] < df['b_number'].map(carried_datetimes)).any():
+                    raise ValueError('The raw data overlaps the bookings of the files which were streamed before (e.g. '
+                                     'a file which was already appended). Only newer bookings can be appended.')
+                raise ValueError('The raw data is not ordered by datetime. Please use load_gdf and clean_gdf instead.')
+            df = df[df['datetime'] != previous_datetimes]
+            last_datetimes = pd.concat([last_datetimes, df.groupby('b_number')['datetime'].max()])
+            last_datetimes = last_datetimes.groupby(level=0).max()
+            state['last_datetimes'] = last_datetimes
+            # Remove all trips of type 'first' and 'last' and all trips outside of Mannheim
+            df = df[(df['trip'] != 'first') & (df['trip'] != 'last')]
+            df = df[geofence.contains(df['p_lng'].to_numpy(), df['p_lat'].to_numpy())]
+            if self.compact:
+                gdf = gpd.GeoDataFrame(compact_bookings(df))
+            else:
+                gdf = gpd.GeoDataFrame(df, crs='EPSG:4326', geometry=gpd.points_from_xy(df['p_lng'], df['p_lat']))
+
+            # Continue the booking history of every bike with its open 'start' booking from the previous chunks
+            if open_bookings is not None:
+                gdf = concat_bookings([open_bookings, gdf])
+            if len(gdf) == 0:
+                continue
+            gdf = gdf.sort_values(by=['b_number', 'datetime']).reset_index(drop=True)
+            trips = np.asarray(gdf['trip'])
+            b_numbers = np.asarray(gdf['b_number'])
+            is_start = trips == 'start'
+            same_bike = b_numbers[:-1] == b_numbers[1:]
+            # A trip consists of the last 'start' booking before the next 'end' booking of the same bike
+            trip_starts = np.flatnonzero(is_start[:-1] & (trips[1:] == 'end') & same_bike)
+            keep_mask = np.zeros(len(gdf), dtype=bool)
+            keep_mask[trip_starts] = True
+            keep_mask[trip_starts + 1] = True
+            # The booking history of a bike stays open if its last booking is of type 'start'
+            open_bookings = gdf[is_start & np.append(~same_bike, True)]
+            state['open_bookings'] = open_bookings
+            yield gdf[keep_mask].reset_index(drop=True)
+
+    @profiled('clean_gdf', rows=count_bookings)
     def clean_gdf(self, validate: bool = False) -> None:
         """
         Cleans the GeoDataFrame so that it contains valid booking but still in the original format.
         :param bool validate: Indicates whether a validation post-hook should be run or not.
         :return: None
         """
-        # Fill NaN values with 0 and drop double bookings
-        self._gdf.fillna(0, inplace=True)
+        self._validation_report = None
+        self._source_path = None
+        # Fill NaN values with 0
+        with profile_stage('fillna', rows=len(self._gdf)):
+            self._gdf.fillna(0, inplace=True)
+        # Remove double bookings, trips of type 'first' and 'last' and trips outside of Mannheim
+        self._filter_bookings()
+        # Remove trips without corresponding start or end booking
+        self.__fix_bookings()
+        if validate:
+            self.validate()
+
+    @profiled('filter_bookings', rows=count_bookings)
+    def _filter_bookings(self) -> None:
+        """
+        Removes double bookings, trips of type 'first' and 'last' and all trips outside of Mannheim.
+        :return: None
+        """
         self._gdf.drop_duplicates(subset=['b_number', 'datetime'], inplace=True)
         # Remove all trips of type 'first' and 'last'
         self._gdf = self._gdf[(self._gdf['trip'] != 'first') & (self._gdf['trip'] != 'last')]
         # Remove all trips outside of mannheim
         self._geo_filter_mannheim_trips()
-        # Remove trips without corresponding start or end booking
-        self.__fix_bookings()
-        if validate:
-            self.validate()
 
+    @profiled('geo_filter', rows=count_bookings)
     def _geo_filter_mannheim_trips(self) -> None:
         """
         Removes all trips which are geographically outside of Mannheim
         :return: None
         """
-        # Load the GeoJSON boundary of Mannheim
-        mannheim_boundary_gdf = gpd.read_file(os.path.join(get_data_path(), 'input/mannheim_boundary.geojson'),
-                                              crs='EPSG:4326')
-        # Remove all trips which are not within Mannheim (using native shapely is faster than geopandas' spatial join)
-        self._gdf = self._gdf[self._gdf.within(mannheim_boundary_gdf['geometry'][0])]
+        # The geofence is loaded once per process and works on the raw coordinates instead of shapely Points
+        geofence = get_mannheim_geofence()
+        # Remove all trips which are not within Mannheim
+        self._gdf = self._gdf[geofence.contains(self._gdf['p_lng'].to_numpy(), self._gdf['p_lat'].to_numpy())]
 
-    def validate(self) -> bool:
+    def validation_report(self) -> dict:
         """
-        Validates whether the GeoDataFrame has a semantically and syntactically correct structure.
-        :return: bool
+        Collects all structural violations of the GeoDataFrame. The report is cached until the GeoDataFrame is loaded or
+        cleaned again, so that repeated validations (e.g. by several Transformer instances) are free.
+        :return: A dict containing the validity, the number of rows and the row indices and counts per violation kind
         :raises: ValueError
         """
         if self._gdf is None:
             raise ValueError('Cannot validate data frame of None type. Please load a data frame first.')
 
-        trips = np.array(self._gdf['trip'])
-        b_numbers = np.array(self._gdf['b_number'])
-        for i in range(len(trips) - 1):
-            if trips[i] == 'start' and trips[i + 1] == 'end' and b_numbers[i] != b_numbers[i + 1]:
-                raise ValueError(
-                    'Validation error at index {}: The first booking of a bike cannot start with trip type '
-                    '\'end\'.'.format(i))
-            if trips[i] == trips[i + 1]:
-                raise ValueError('Validation error at index {}: Two consecutive rows should not have the same trip '
-                                 'type.'.format(i))
+        if self._validation_report is None:
+            self._validation_report = find_validation_errors(np.asarray(self._gdf['trip']),
+                                                             np.asarray(self._gdf['b_number']))
+        return self._validation_report
+
+    def validate(self) -> bool:
+        """
+        Validates whether the GeoDataFrame has a semantically and syntactically correct structure.
+        :return: bool
+        :raises: ValueError
+        """
+        violations = self.validation_report()['violations']
+        bike_boundary = violations['bike_boundary']['indices']
+        consecutive_trip_type = violations['consecutive_trip_type']['indices']
+        # Fail on the first violation in row order
+        if len(bike_boundary) and (not len(consecutive_trip_type) or bike_boundary[0] < consecutive_trip_type[0]):
+            raise ValueError(
+                'Validation error at index {}: The first booking of a bike cannot start with trip type '
+                '\'end\'.'.format(bike_boundary[0]))
+        if len(consecutive_trip_type):
+            raise ValueError('Validation error at index {}: Two consecutive rows should not have the same trip '
+                             'type.'.format(consecutive_trip_type[0]))
         return True
 
+    @profiled('fix_bookings', rows=count_bookings)
     def __fix_bookings(self) -> None:
         """
         Applies an algorithm which restores a semantically correct structure in the original data set.
         :return: None
         """
-        # Sort the data frame by b_number and datetime to have the bookings for each according to the timeline
+        self._sort_bookings()
+        self._remove_unmatched_bookings()
+
+    @profiled('sort_bookings', rows=count_bookings)
+    def _sort_bookings(self) -> None:
+        """
+        Sorts the GeoDataFrame by b_number and datetime to have the bookings for each bike according to the timeline.
+        :return: None
+        """
         self._gdf.sort_values(by=['b_number', 'datetime'], inplace=True)
         # Reset the index so that numpy indices and pandas indices are synchronized
         self._gdf.reset_index(drop=True, inplace=True)
-        # Use numpy to execute the code in the Cython space
-        trips = np.array(self._gdf['trip'])
-        b_numbers = np.array(self._gdf['b_number'])
-        # Use a hash set for distinct O(1) insertion operations
-        delete_indices = set()
-        # Iterate until the second last index because the sliding window is constructed by the interval [i, i + 1]
-        for i in range(len(trips) - 1):
-            # Special case: The trips of one bike should not end with a trip of type 'start' and the booking of the next
-            # bike should not start with a trip of type 'end'
-            if trips[i] == 'start' and trips[i + 1] == 'end' and b_numbers[i] != b_numbers[i + 1]:
-                delete_indices.add(i)
-                delete_indices.add(i + 1)
-            # Regular case: Remove double start or end trips (the first of both for start and the last of both for end)
-            if trips[i] == trips[i + 1]:
-                i_delete = i if trips[i] == 'start' else i + 1
-                delete_indices.add(i_delete)
-        # Another special case: Omit the very last entry if it is of trip type 'start'
-        if trips[len(trips) - 1] == 'start':
-            delete_indices.add(len(trips) - 1)
 
+    @profiled('remove_unmatched_bookings', rows=count_bookings)
+    def _remove_unmatched_bookings(self) -> None:
+        """
+        Removes all bookings of the sorted GeoDataFrame which break the alternating start/end structure.
+        :return: None
+        """
+        trips = np.asarray(self._gdf['trip'])
+        delete_mask = find_invalid_bookings(trips, np.asarray(self._gdf['b_number']))
+        # The history of the first bike should not start with a trip of type 'end' (its 'start' booking is unknown),
+        # otherwise every following 'start' booking is paired with the 'end' booking of the previous trip. Later bikes
+        # are covered by find_invalid_bookings.
+        if len(trips) > 0 and trips[0] == 'end':
+            delete_mask[0] = True
         # Call pandas' internal drop method once in the end to hand over the execution to Cython again
-        self._gdf.drop(delete_indices, inplace=True)
+        self._gdf.drop(np.flatnonzero(delete_mask), inplace=True)
@@ -1,10 +1,112 @@
 import os
+from typing import Iterator
 
 import geopandas as gpd
+import pandas as pd
 
-from nextbike.io import get_data_path, create_dir_if_not_exists
+from nextbike.io import (get_cache_key, get_data_path, get_file_digest, get_file_fingerprint, create_dir_if_not_exists,
+                         read_cache, write_cache, read_store_state, append_store, read_store, get_output_filename,
+                         FrameWriter, create_geo_trips, write_trips, get_geometry_columns)
+from nextbike.io.formats import DEFAULT_CHUNKSIZE
 from nextbike.preprocessing.AbstractValidator import AbstractValidator
 from nextbike.preprocessing.Preprocessor import Preprocessor
+from nextbike.profiling import profiled
+
+
+@profiled('create_trips', rows=lambda trips, *args, **kwargs: len(trips))
+def create_trips(bookings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Translates cleaned bookings, in which every 'start' booking is followed by its 'end' booking, to trips in the target
+    format. Start and end positions are kept as numeric coordinate columns (see create_geo_trips for Point geometries).
+    :param bookings: Cleaned GeoDataFrame of bookings
+    :return: GeoDataFrame of trips
+    """
+    # Split the original data into a start and end trips data frame
+    start_gdf = bookings[bookings['trip'] == 'start'].reset_index(drop=True)
+    end_gdf = bookings[bookings['trip'] == 'end'].reset_index(drop=True)
+    # Initialize a new GeoDataFrame and calculate the target columns with native pandas
+    trips = gpd.GeoDataFrame()
+    trips['bike_number'] = start_gdf['b_number']
+    trips['start_time'] = start_gdf['datetime']
+    trips['weekend'] = start_gdf['datetime'].dt.dayofweek // 5 == 1
+    trips['start_lat'] = start_gdf['p_lat']
+    trips['start_lng'] = start_gdf['p_lng']
+    trips['start_position_name'] = start_gdf['p_name']
+    trips['duration'] = (end_gdf['datetime'] - start_gdf['datetime']).dt.seconds
+    trips['end_time'] = end_gdf['datetime']
+    trips['end_lat'] = end_gdf['p_lat']
+    trips['end_lng'] = end_gdf['p_lng']
+    trips['end_position_name'] = end_gdf['p_name']
+    trips['is_station'] = (start_gdf['p_place_type'] != 12) & (end_gdf['p_place_type'] != 12)
+    return trips
+
+
+def stream_transform(preprocessor: Preprocessor, path: str = None,
+                     chunksize: int = 500000) -> Iterator[gpd.GeoDataFrame]:
+    """
+    Transforms a raw data set chunk by chunk to the target format with bounded memory (see Preprocessor.stream_gdf).
+    :param preprocessor: Preprocessor instance used to read and clean the raw data
+    :param path: A path that points to the .csv file
+    :param chunksize: Number of raw rows which are read at once
+    :return: Iterator of GeoDataFrames of trips
+    """
+    for bookings in preprocessor.stream_gdf(path, chunksize):
+        yield create_trips(bookings)
+
+
+def save_stream(trips: Iterator[gpd.GeoDataFrame], filename: str = 'mannheim_transformed.csv',
+                format: str = None) -> int:
+    """
+    Appends chunks of transformed trips to one file on the disk.
+    :param trips: Iterator of GeoDataFrames of trips
+    :param filename: Filename of the output (outputs are always saved to {project_dir}/data/output)
+    :param format: Output format, one of csv, csv.gz, parquet and feather (Default: The format of the extension)
+    :return: Number of saved trips
+    """
+    path = os.path.join(get_data_path(), 'output')
+    create_dir_if_not_exists(path)
+    filename = get_output_filename(filename, format)
+    with FrameWriter(os.path.join(path, filename), geometry=get_geometry_columns(filename)) as writer:
+        for chunk in trips:
+            write_trips(writer, chunk)
+    return writer.n_rows
+
+
+@profiled('transform_incremental', rows=lambda n_trips, *args, **kwargs: n_trips)
+def transform_incremental(preprocessor: Preprocessor, path: str, name: str = 'trips', chunksize: int = 500000) -> int:
+    """
+    Transforms only the bookings of a newly arrived raw file and appends the trips to the trip store at
+    {project_dir}/data/output/{name}. The open 'start' booking and the last booking time of every bike are persisted
+    with the store, so trips which span two files are completed by the next call. The runtime is proportional to the
+    size of the new file. Raw files have to be appended in chronological order, files whose content was already
+    appended (under any path) are skipped.
+    :param preprocessor: Preprocessor instance used to read and clean the raw data
+    :param path: A path that points to the new .csv file
+    :param name: Name of the trip store
+    :param chunksize: Number of raw rows which are read at once
+    :return: Number of appended trips
+    :raises: FileNotFoundError, ValueError
+    """
+    state = read_store_state(name)
+    digest = get_file_digest(path)
+    # Stores of earlier versions identify their sources by path, size and modification time
+    if digest in state['sources'] or get_file_fingerprint(path) in state['sources']:
+        print('Skipping {} because it was already appended to the trip store.'.format(path))
+        return 0
+    chunks = [create_trips(bookings) for bookings in preprocessor.stream_gdf(path, chunksize, state)]
+    trips = pd.concat(chunks, ignore_index=True) if chunks else gpd.GeoDataFrame()
+    state['sources'].append(digest)
+    append_store(trips, state, name)
+    return len(trips)
+
+
+def load_incremental_trips(name: str = 'trips') -> gpd.GeoDataFrame:
+    """
+    Loads all trips of a trip store in the order in which they were appended.
+    :param name: Name of the trip store
+    :return: GeoDataFrame of trips
+    """
+    return gpd.GeoDataFrame(read_store(name))
 
 
 class Transformer(AbstractValidator):
@@ -37,41 +139,57 @@ class Transformer(AbstractValidator):
         except ValueError:
             raise ValueError('Preprocessor validation failed. Please make sure that the Preprocessor was successful.')
 
-    def transform(self, validate: bool = False) -> None:
+    @profiled('transform', rows=lambda result, transformer, *args, **kwargs: len(transformer.gdf))
+    def transform(self, validate: bool = False, use_cache: bool = True) -> None:
         """
         Transform the preprocessed GeoDataFrame to the target format.
         :param bool validate: Indicates whether a validation post-hook should be run or not.
+        :param use_cache: Indicates whether the cache should be used (only if the Preprocessor was loaded via
+                          load_clean_gdf)
         :return: None
         """
-        # Split the original data into a start and end trips data frame
-        start_gdf = self.__preprocessor.gdf[self.__preprocessor.gdf['trip'] == 'start'].reset_index(drop=True)
-        end_gdf = self.__preprocessor.gdf[self.__preprocessor.gdf['trip'] == 'end'].reset_index(drop=True)
-        # Initialize a new GeoDataFrame and calculate the target columns with native pandas
-        self.__gdf = gpd.GeoDataFrame(crs='EPSG:4326')
-        self.__gdf['bike_number'] = start_gdf['b_number']
-        self.__gdf['start_time'] = start_gdf['datetime']
-        self.__gdf['weekend'] = start_gdf['datetime'].dt.dayofweek // 5 == 1
-        self.__gdf['start_position'] = start_gdf['geometry']
-        self.__gdf['start_position_name'] = start_gdf['p_name']
-        self.__gdf['duration'] = (end_gdf['datetime'] - start_gdf['datetime']).dt.seconds
-        self.__gdf['end_time'] = end_gdf['datetime']
-        self.__gdf['end_position'] = end_gdf['geometry']
-        self.__gdf['end_position_name'] = end_gdf['p_name']
-        self.__gdf['is_station'] = (start_gdf['p_place_type'] != 12) & (end_gdf['p_place_type'] != 12)
+        source_path = self.__preprocessor.source_path
+        if not use_cache or source_path is None:
+            self.__gdf = create_trips(self.__preprocessor.gdf)
+        else:
+            key = get_cache_key(source_path, 'transform-compact' if self.__preprocessor.compact else 'transform')
+            self.__gdf = read_cache(key)
+            if self.__gdf is None:
+                self.__gdf = create_trips(self.__preprocessor.gdf)
+                write_cache(self.__gdf, key)
+            else:
+                print('Loaded transformed data frame from cache.')
         if validate:
             self.validate()
 
-    def save(self, filename: str = 'mannheim_transformed.csv') -> None:
+    def save(self, filename: str = 'mannheim_transformed.csv', format: str = None,
+             chunksize: int = DEFAULT_CHUNKSIZE) -> str:
         """
-        Saves the transformed GeoDataFrame as csv-file to the disk.
-        :return: None
+        Saves the transformed GeoDataFrame chunk by chunk to the disk.
+        :param filename: Filename of the output (outputs are always saved to {project_dir}/data/output)
+        :param format: Output format, one of csv, csv.gz, parquet (GeoParquet) and feather (Default: The format of the
+                       extension)
+        :param chunksize: Number of trips which are converted and written at once
+        :return: Path of the saved file
         :raises: UserWarning
         """
         if self.__gdf is None:
             raise UserWarning('Attempting to save an empty data set. Did you transform it before?')
         path = os.path.join(get_data_path(), 'output')
         create_dir_if_not_exists(path)
-        self.__gdf.to_csv(os.path.join(path, filename), index=False)
+        filename = get_output_filename(filename, format)
+        with FrameWriter(os.path.join(path, filename), geometry=get_geometry_columns(filename)) as writer:
+            write_trips(writer, self.__gdf, chunksize)
+        return os.path.join(path, filename)
+
+    def get_geo_gdf(self) -> gpd.GeoDataFrame:
+        """
+        Returns the transformed GeoDataFrame with Point geometries as start_position and end_position for GIS use. The
+        geometries are created on demand and are not stored.
+        :return: GeoDataFrame
+        :raises: UserWarning
+        """
+        return create_geo_trips(self.gdf)
 
     def validate(self) -> bool:
         """
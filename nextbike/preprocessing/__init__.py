@@ -1,3 +1,9 @@
 from nextbike.preprocessing.ParallelPreprocessor import ParallelPreprocessor
 from nextbike.preprocessing.Preprocessor import Preprocessor
-from nextbike.preprocessing.Transformer import Transformer
+from nextbike.preprocessing.Transformer import (
+    Transformer,
+    stream_transform,
+    save_stream,
+    transform_incremental,
+    load_incremental_trips
+)
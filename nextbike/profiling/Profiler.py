@@ -0,0 +1,194 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterator
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # The peak memory is not available on Windows
+    resource = None
+
+
+def get_peak_rss() -> float or None:
+    """
+    Returns the peak resident set size of the current process in MB.
+    :return: Peak RSS in MB or None if it is not available on this platform
+    """
+    if resource is None:
+        return None
+    # Linux reports the peak RSS in KB, macOS in bytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+class Stage:
+    """
+    This class holds the measurements of one execution of a pipeline stage.
+    """
+
+    def __init__(self, name: str, path: str, depth: int, rows: int = None):
+        """
+        Initializes the Stage.
+        :param name: Name of the stage
+        :param path: Names of all enclosing stages and the stage itself joined by '/'
+        :param depth: Number of enclosing stages
+        :param rows: Number of rows the stage produced (can be set while the stage runs)
+        """
+        self.name = name
+        self.path = path
+        self.depth = depth
+        self.rows = rows
+        self.start_s = None  # Start relative to the start of the profiler
+        self.wall_time_s = None
+        self.cpu_time_s = None
+        self.peak_rss_mb = None  # Peak RSS of the process at the end of the stage
+        self.peak_rss_increase_mb = None  # Increase of the peak RSS during the stage
+
+
+class Profiler:
+    """
+    This class records the wall time, CPU time, peak RSS and row count of every executed pipeline stage. Stages can be
+    nested, e.g. the steps of clean_gdf are recorded within the clean_gdf stage. Only the current process is measured,
+    work of process pools is contained in the wall time of the enclosing stage.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty Profiler.
+        """
+        self.stages = []  # Finished stages in the order they were started
+        self.started = time.time()
+        self.__start = time.perf_counter()
+        self.__cpu_start = time.process_time()
+        self.__stack = []
+
+    @contextmanager
+    def stage(self, name: str, rows: int = None) -> Iterator[Stage]:
+        """
+        Measures the enclosed code as a stage. The row count can be assigned to the yielded Stage. A stage calling
+        itself again (e.g. via super()) is recorded once.
+        :param name: Name of the stage
+        :param rows: Number of rows the stage produced
+        :return: Iterator yielding the Stage
+        """
+        if self.__stack and self.__stack[-1].name == name:
+            yield self.__stack[-1]
+            return
+        stage = Stage(name, '/'.join([parent.name for parent in self.__stack] + [name]), len(self.__stack), rows)
+        self.stages.append(stage)
+        self.__stack.append(stage)
+        peak_rss = get_peak_rss()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.wall_time_s = time.perf_counter() - wall_start
+            stage.cpu_time_s = time.process_time() - cpu_start
+            stage.start_s = wall_start - self.__start
+            stage.peak_rss_mb = get_peak_rss()
+            if peak_rss is not None:
+                stage.peak_rss_increase_mb = stage.peak_rss_mb - peak_rss
+            self.__stack.pop()
+
+    def report(self) -> pd.DataFrame:
+        """
+        Returns the measurements of all finished stages.
+        :return: DataFrame with one row per stage in the order the stages were started
+        """
+        columns = ['stage', 'name', 'depth', 'rows', 'start_s', 'wall_time_s', 'cpu_time_s', 'peak_rss_mb',
+                   'peak_rss_increase_mb']
+        return pd.DataFrame([[stage.path] + [getattr(stage, column) for column in columns[1:]]
+                             for stage in self.stages if stage.wall_time_s is not None], columns=columns)
+
+    def save(self, path: str) -> None:
+        """
+        Saves the run report as CSV (one row per stage) or JSON (stages and run totals) depending on the extension.
+        :param path: Path of the report ending with .csv or .json
+        :return: None
+        :raises: ValueError
+        """
+        if path.endswith('.csv'):
+            self.report().to_csv(path, index=False)
+        elif path.endswith('.json'):
+            report = {'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                      'wall_time_s': time.perf_counter() - self.__start,
+                      'cpu_time_s': time.process_time() - self.__cpu_start,
+                      'peak_rss_mb': get_peak_rss(),
+                      'stages': json.loads(self.report().to_json(orient='records'))}
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+        else:
+            raise ValueError('Unknown report format of {}. Use a .csv or .json file.'.format(path))
+
+
+# Profiler of the current process (None if profiling is disabled)
+_profiler = None
+
+
+def enable_profiling() -> Profiler:
+    """
+    Starts recording all pipeline stages of the current process with a new Profiler.
+    :return: The Profiler
+    """
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def disable_profiling() -> Profiler or None:
+    """
+    Stops recording the pipeline stages.
+    :return: The Profiler which recorded the stages so far (None if profiling was not enabled)
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def get_profiler() -> Profiler or None:
+    """
+    Returns the active Profiler.
+    :return: The Profiler or None if profiling is disabled
+    """
+    return _profiler
+
+
+@contextmanager
+def profile_stage(name: str, rows: int = None) -> Iterator[Stage]:
+    """
+    Measures the enclosed code as a stage of the active Profiler. If profiling is disabled nothing is measured.
+    :param name: Name of the stage
+    :param rows: Number of rows the stage produced (can also be assigned to the yielded Stage)
+    :return: Iterator yielding the Stage
+    """
+    if _profiler is None:
+        yield Stage(name, name, 0, rows)
+        return
+    with _profiler.stage(name, rows) as stage:
+        yield stage
+
+
+def profiled(name: str, rows: Callable = None) -> Callable:
+    """
+    Decorator measuring every call of a function or method as a stage of the active Profiler.
+    :param name: Name of the stage
+    :param rows: Function computing the row count from the return value and the arguments of the call (optional)
+    :return: Decorator
+    """
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return function(*args, **kwargs)
+            with _profiler.stage(name) as stage:
+                result = function(*args, **kwargs)
+                if rows is not None:
+                    stage.rows = rows(result, *args, **kwargs)
+                return result
+        return wrapper
+    return decorator
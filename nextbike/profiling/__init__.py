@@ -0,0 +1,9 @@
+from nextbike.profiling.Profiler import (
+    Profiler,
+    Stage,
+    enable_profiling,
+    disable_profiling,
+    get_profiler,
+    profile_stage,
+    profiled
+)
@@ -0,0 +1,34 @@
+import os
+import shutil
+
+import pytest
+
+from nextbike.benchmark.synthetic import generate_bookings
+from nextbike.models import DirectionModel, DurationModel
+
+
+@pytest.fixture(scope='session')
+def trained_data_path(tmp_path_factory) -> str:
+    # A data folder with small duration and direction models trained on synthetic raw bookings
+    root = tmp_path_factory.mktemp('trained')
+    os.makedirs(os.path.join(root, 'data', 'input'))
+    os.makedirs(os.path.join(root, 'data', 'output'))
+    shutil.copy(os.path.join('data', 'input', 'mannheim_boundary.geojson'), os.path.join(root, 'data', 'input'))
+    path = os.path.join(root, 'data', 'input', 'raw.csv')
+    generate_bookings(2000, seed=0).to_csv(path)
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        for model in [DurationModel(), DirectionModel()]:
+            model.load_from_csv(path, use_cache=False)
+            model.train(n_jobs=1, n_estimators=5)
+    finally:
+        os.chdir(cwd)
+    return str(root)
+
+
+@pytest.fixture
+def trained_data(trained_data_path, monkeypatch) -> str:
+    # Runs the test within the folder of the trained models
+    monkeypatch.chdir(trained_data_path)
+    return trained_data_path
@@ -0,0 +1,90 @@
+import os
+import shutil
+
+import joblib
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from nextbike import io
+from nextbike.models import FlatForest, load_flat_forest
+
+
+@pytest.fixture(scope='module')
+def data() -> tuple:
+    # Mostly zero features like the one-hot-encoded stations, with values that are not exact float32 numbers
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 12)) * (rng.random((400, 12)) < 0.3)
+    y = X[:, 0] * 3 + X[:, 1] ** 2 + rng.normal(scale=0.1, size=400)
+    labels = np.array(['from_university', 'to_university', 'not_university'])[np.digitize(y, [-1, 1])]
+    return X, y, labels
+
+
+def get_inputs(forest, X: np.ndarray) -> dict:
+    # Values right above the thresholds go left or right depending on whether they are compared as float32 values
+    rng = np.random.default_rng(1)
+    trees = [estimator.tree_ for estimator in forest.estimators_]
+    nodes = [(feature, threshold) for tree in trees for feature, threshold in zip(tree.feature, tree.threshold)
+             if feature >= 0]
+    near_thresholds = X[rng.integers(0, len(X), len(nodes))].copy()
+    for row, (feature, threshold) in enumerate(nodes):
+        near_thresholds[row, feature] = threshold + abs(threshold) * 1e-9
+    return {'dense': X, 'csr': sparse.csr_matrix(X), 'single_row': X[:1], 'single_row_csr': sparse.csr_matrix(X[:1]),
+            'near_thresholds': near_thresholds}
+
+
+@pytest.mark.parametrize('parameters', [{}, {'max_depth': 5, 'min_samples_leaf': 3, 'max_samples': 0.5}])
+def test_regressor_matches_sklearn(data, parameters):
+    X, y, _ = data
+    forest = RandomForestRegressor(n_estimators=10, random_state=0, **parameters).fit(X, y)
+    flat_forest = FlatForest.from_estimator(forest)
+    for name, inputs in get_inputs(forest, X).items():
+        np.testing.assert_array_equal(flat_forest.predict(inputs), forest.predict(inputs), err_msg=name)
+    with pytest.raises(AttributeError):
+        flat_forest.predict_proba(X)
+
+
+@pytest.mark.parametrize('parameters', [{}, {'max_depth': 5, 'min_samples_leaf': 3, 'max_samples': 0.5}])
+def test_classifier_matches_sklearn(data, parameters):
+    X, _, labels = data
+    forest = RandomForestClassifier(n_estimators=10, random_state=0, **parameters).fit(X, labels)
+    flat_forest = FlatForest.from_estimator(forest)
+    for name, inputs in get_inputs(forest, X).items():
+        np.testing.assert_array_equal(flat_forest.predict_proba(inputs), forest.predict_proba(inputs), err_msg=name)
+        np.testing.assert_array_equal(flat_forest.predict(inputs), forest.predict(inputs), err_msg=name)
+
+
+def test_sparse_and_dense_models_match_sklearn(data):
+    # Forests trained on CSR matrices (sparse feature pipelines) predict dense and CSR input
+    X, y, _ = data
+    forest = RandomForestRegressor(n_estimators=10, random_state=0).fit(sparse.csr_matrix(X), y)
+    flat_forest = FlatForest.from_estimator(forest)
+    for name, inputs in get_inputs(forest, X).items():
+        np.testing.assert_array_equal(flat_forest.predict(inputs), forest.predict(inputs), err_msg=name)
+
+
+def test_load_flat_forest_exports_again_for_newer_models(trained_data, tmp_path, monkeypatch, data):
+    shutil.copytree(trained_data, str(tmp_path), dirs_exist_ok=True)
+    monkeypatch.chdir(tmp_path)
+    path = io.get_model_path('regressor', '.flat.joblib')
+    model_path = io.get_model_path('regressor')
+    model = io.read_model(mmap_mode=None)
+    features = np.random.default_rng(1).random((20, model.n_features_in_))
+    flat_forest = load_flat_forest()
+    np.testing.assert_array_equal(flat_forest.predict(features), model.predict(features))
+    # An up-to-date export is read again
+    exported = os.stat(path).st_mtime_ns
+    load_flat_forest()
+    assert os.stat(path).st_mtime_ns == exported
+
+    # A model trained after the export replaces the stale flattened forest
+    X, y, _ = data
+    retrained = RandomForestRegressor(n_estimators=3, random_state=1).fit(
+        np.resize(X, (len(X), model.n_features_in_)), y)
+    joblib.dump(retrained, model_path)
+    os.utime(model_path, ns=(exported + 10 ** 9, exported + 10 ** 9))
+    flat_forest = load_flat_forest()
+    assert len(flat_forest.roots) == 3
+    np.testing.assert_array_equal(flat_forest.predict(features), retrained.predict(features))
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.tmp')]
@@ -0,0 +1,68 @@
+import copy
+import pickle
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from nextbike.benchmark.synthetic import generate_bookings
+from nextbike.io import LazyModel, read_df, read_raw_df
+from nextbike.preprocessing import Preprocessor
+
+
+@pytest.fixture
+def raw_path(tmp_path) -> str:
+    # Synthetic raw bookings where every seventh station name is missing
+    bookings = generate_bookings(2000, seed=0)
+    bookings.loc[bookings.index[::7], 'p_name'] = np.nan
+    path = str(tmp_path / 'raw.csv')
+    bookings.to_csv(path)
+    return path
+
+
+def test_read_raw_df_keeps_missing_values(raw_path):
+    df = read_df(raw_path, index_col=0, parse_dates=['datetime'])
+    raw_df = read_raw_df(raw_path)
+    assert raw_df['p_name'].isna().sum() == df['p_name'].isna().sum() > 0
+    assert '' not in raw_df['p_name'].cat.categories
+
+
+def test_read_raw_df_matches_read_df_after_cleaning(raw_path):
+    # Missing values are filled with 0 like in Preprocessor.clean_gdf
+    df = read_df(raw_path, index_col=0, parse_dates=['datetime']).fillna(0)
+    raw_df = read_raw_df(raw_path).fillna(0)
+    for column in raw_df.select_dtypes('category').columns:
+        raw_df[column] = raw_df[column].astype(object)
+    pd.testing.assert_frame_equal(raw_df, df, check_dtype=False)
+
+
+def test_clean_gdf_fills_missing_station_names(raw_path):
+    preprocessor = Preprocessor()
+    preprocessor.load_gdf(raw_path)
+    assert preprocessor.gdf['p_name'].isna().any()
+    preprocessor.clean_gdf()
+    assert not preprocessor.gdf['p_name'].isna().any()
+    assert '' not in set(preprocessor.gdf['p_name'])
+
+
+@pytest.fixture
+def lazy_model(tmp_path) -> LazyModel:
+    rng = np.random.default_rng(0)
+    model = RandomForestRegressor(n_estimators=5, random_state=0).fit(rng.random((50, 3)), rng.random(50))
+    path = str(tmp_path / 'model.joblib')
+    joblib.dump(model, path)
+    return LazyModel(path)
+
+
+def test_lazy_model_copy_and_pickle(lazy_model):
+    X = np.random.default_rng(1).random((10, 3))
+    for model in [lazy_model, copy.copy(lazy_model), copy.deepcopy(lazy_model),
+                  pickle.loads(pickle.dumps(lazy_model))]:
+        assert isinstance(model, LazyModel)
+        np.testing.assert_array_equal(model.predict(X), lazy_model.predict(X))
+    # Proxies of a loaded model can be copied and pickled as well
+    assert isinstance(pickle.loads(pickle.dumps(lazy_model)), LazyModel)
+    with pytest.raises(AttributeError):
+        lazy_model._missing
@@ -0,0 +1,63 @@
+import multiprocessing as mp
+import os
+import stat
+
+import pandas as pd
+import pytest
+
+from nextbike.io import (FrameWriter, get_tuning_dir, read_frame, read_tuning_results, save_tuning_results,
+                         write_atomically)
+
+
+def test_write_atomically(tmp_path):
+    path = str(tmp_path / 'results.csv')
+    with write_atomically(path) as temporary_path:
+        assert temporary_path != path and os.path.dirname(temporary_path) == str(tmp_path)
+        with open(temporary_path, 'w') as f:
+            f.write('a')
+        assert not os.path.isfile(path)
+    assert open(path).read() == 'a'
+    # The file gets the permissions of new files instead of the private ones of temporary files
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o666 & ~umask
+
+    with pytest.raises(ValueError):
+        with write_atomically(path) as temporary_path:
+            with open(temporary_path, 'w') as f:
+                f.write('b')
+            raise ValueError()
+    assert open(path).read() == 'a'
+    assert os.listdir(str(tmp_path)) == ['results.csv']
+
+
+def write_results(worker: int) -> None:
+    for run in range(20):
+        save_tuning_results(pd.DataFrame({'worker': [worker] * 1000, 'run': run}), 'duration')
+
+
+def test_concurrent_tuning_results(tmp_path, monkeypatch):
+    os.makedirs(str(tmp_path / 'data'))
+    monkeypatch.chdir(tmp_path)
+    with mp.get_context('fork').Pool(4) as pool:
+        pool.map(write_results, range(4))
+    results = read_tuning_results('duration')
+    # Every run writes a complete file of a single worker
+    assert len(results) == 1000 and results['worker'].nunique() == 1 and (results['run'] == 19).all()
+    assert not [name for name in os.listdir(get_tuning_dir()) if name.endswith('.tmp')]
+
+
+@pytest.mark.parametrize('format', ['csv', 'csv.gz', 'parquet', 'feather'])
+def test_concurrent_frame_writers(tmp_path, format):
+    path = str(tmp_path / ('trips.' + format))
+    frames = [pd.DataFrame({'writer': writer, 'row': range(100)}) for writer in range(2)]
+    writers = [FrameWriter(path), FrameWriter(path)]
+    # Both writers are open at the same time and write the same file
+    for writer, frame in zip(writers, frames):
+        writer.write(frame.iloc[:50])
+    for writer, frame in zip(writers, frames):
+        writer.write(frame.iloc[50:])
+        writer.close()
+    written = read_frame(path) if format in ['parquet', 'feather'] else pd.read_csv(path)
+    pd.testing.assert_frame_equal(written, frames[1])
+    assert os.listdir(str(tmp_path)) == ['trips.' + format]
@@ -0,0 +1,33 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from nextbike import io
+from nextbike.models import DurationModel
+from nextbike.models.utils import search_compact_forest
+
+
+def test_search_compact_forest_holds_out_the_most_recent_trips():
+    # The target grows with the start time, so that a forest cannot extrapolate to the most recent trips
+    rng = np.random.default_rng(0)
+    minutes = rng.permutation(500)
+    start_time = pd.Timestamp('2019-06-01') + pd.to_timedelta(minutes, unit='min')
+    features = pd.DataFrame({'minute': minutes})
+    search = search_compact_forest(RandomForestRegressor, features, minutes.astype(float), pd.Series(start_time),
+                                   candidates=[], n_jobs=1)
+    # A shuffled holdout would interpolate between neighbouring trips with an error of about one minute
+    assert search['report']['error'].iloc[0] > 20
+
+
+def test_train_compact_trains_the_booking_filter_with_defaults(trained_data, tmp_path, monkeypatch):
+    shutil.copytree(trained_data, str(tmp_path), dirs_exist_ok=True)
+    monkeypatch.chdir(tmp_path)
+    duration_model = DurationModel()
+    duration_model.load_from_csv(os.path.join('data', 'input', 'raw.csv'), use_cache=False)
+    duration_model.train_compact(n_jobs=1)
+    assert duration_model.pipeline.booking_filter.get_params()['n_estimators'] == 100
+    assert duration_model.pipeline.booking_filter.get_params()['max_depth'] is None
+    assert io.read_pipeline('regressor').booking_filter.get_params()['n_estimators'] == 100
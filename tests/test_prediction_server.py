@@ -0,0 +1,40 @@
+import pytest
+
+from nextbike.models import PredictionServer
+
+BOOKING = {'datetime': '2019-06-03 08:15:00', 'p_lat': 49.4875, 'p_lng': 8.466, 'p_name': 'Hauptbahnhof',
+           'p_place_type': 0}
+
+
+@pytest.fixture
+def server(trained_data) -> PredictionServer:
+    return PredictionServer()
+
+
+def test_single_booking(server):
+    response = server.handle(BOOKING)
+    assert set(response) == {'duration', 'direction'}
+
+
+def test_batch_reports_errors_per_booking(server):
+    bookings = [BOOKING, dict(BOOKING, datetime='not a date'), dict(BOOKING, p_lat=None),
+                dict(BOOKING, p_lng='abc'), dict(BOOKING, p_lat=52.52, p_lng=13.405),
+                {key: value for key, value in BOOKING.items() if key != 'p_place_type'}, BOOKING]
+    response = server.handle(bookings)
+    assert isinstance(response, list) and len(response) == len(bookings)
+    assert set(response[0]) == {'duration', 'direction'} and response[-1] == response[0]
+    assert response[1] == {'error': 'Invalid datetime.'}
+    assert response[2] == {'error': 'Missing booking fields: p_lat'}
+    assert response[3] == {'error': 'Invalid coordinates.'}
+    assert response[4] == {'error': 'Booking lies outside of Mannheim.'}
+    assert response[5] == {'error': 'Missing booking fields: p_place_type'}
+
+
+def test_invalid_batches_are_answered_with_a_list(server):
+    assert server.handle([{'datetime': 'not a date'}]) == [
+        {'error': 'Missing booking fields: p_lat, p_lng, p_place_type'}]
+    assert server.handle([BOOKING, dict(BOOKING, datetime='not a date')])[1] == {'error': 'Invalid datetime.'}
+    assert server.handle([BOOKING, 'not a booking'])[1] == {
+        'error': 'Missing booking fields: datetime, p_lat, p_lng, p_place_type'}
+    assert server.handle({'datetime': 'not a date', 'p_lat': 49.4875, 'p_lng': 8.466, 'p_place_type': 0}) == {
+        'error': 'Invalid datetime.'}
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nextbike.benchmark.synthetic import generate_bookings
+from nextbike.preprocessing import ParallelPreprocessor, Preprocessor
+from nextbike.preprocessing.Preprocessor import find_invalid_bookings
+
+
+def find_invalid_bookings_loop(trips: np.ndarray, b_numbers: np.ndarray) -> set:
+    """
+    The sliding window loop which find_invalid_bookings replaced (Preprocessor.__fix_bookings of version 1.1).
+    :param trips: Array of trip types sorted by b_number and datetime
+    :param b_numbers: Array of bike numbers aligned with trips
+    :return: Set of the indices of all bookings that have to be deleted
+    """
+    delete_indices = set()
+    for i in range(len(trips) - 1):
+        if trips[i] == 'start' and trips[i + 1] == 'end' and b_numbers[i] != b_numbers[i + 1]:
+            delete_indices.add(i)
+            delete_indices.add(i + 1)
+        if trips[i] == trips[i + 1]:
+            i_delete = i if trips[i] == 'start' else i + 1
+            delete_indices.add(i_delete)
+    if trips[len(trips) - 1] == 'start':
+        delete_indices.add(len(trips) - 1)
+    return delete_indices
+
+
+def assert_equivalent(trips: list, b_numbers: list) -> None:
+    trips = np.array(trips, dtype=object)
+    b_numbers = np.array(b_numbers)
+    delete_mask = find_invalid_bookings(trips, b_numbers)
+    assert delete_mask.dtype == bool and len(delete_mask) == len(trips)
+    assert set(np.flatnonzero(delete_mask)) == find_invalid_bookings_loop(trips, b_numbers)
+
+
+def test_empty_frame():
+    # The loop fails on empty frames (it looks up the last trip), the vectorized version deletes nothing
+    with pytest.raises(IndexError):
+        find_invalid_bookings_loop(np.array([], dtype=object), np.array([], dtype=int))
+    delete_mask = find_invalid_bookings(np.array([], dtype=object), np.array([], dtype=int))
+    assert delete_mask.dtype == bool and len(delete_mask) == 0
+
+
+@pytest.mark.parametrize('trips, b_numbers', [
+    (['start'], [1]),
+    (['end'], [1]),
+    (['start', 'end', 'start', 'end'], [1, 2, 3, 4]),
+    (['end', 'start', 'end', 'start'], [1, 2, 3, 4]),
+    (['start', 'start', 'start'], [1, 2, 3]),
+    (['end', 'end', 'end'], [1, 2, 3]),
+    (['start', 'end', 'end', 'start'], [1, 1, 2, 3])
+])
+def test_single_booking_bikes(trips, b_numbers):
+    assert_equivalent(trips, b_numbers)
+
+
+@pytest.mark.parametrize('trips, b_numbers', [
+    (['start', 'start', 'end'], [1, 1, 1]),
+    (['start', 'end', 'end'], [1, 1, 1]),
+    (['start', 'start', 'start', 'end'], [1, 1, 1, 1]),
+    (['start', 'end', 'end', 'end'], [1, 1, 1, 1]),
+    (['start', 'start', 'end', 'end'], [1, 1, 1, 1]),
+    (['end', 'end', 'start', 'start'], [1, 1, 1, 1]),
+    (['start', 'start', 'end', 'end', 'start', 'start', 'end', 'end'], [1, 1, 1, 1, 2, 2, 2, 2]),
+    (['start', 'end', 'start', 'end', 'end', 'start', 'start', 'end'], [1, 1, 1, 2, 2, 2, 2, 2])
+])
+def test_consecutive_invalid_pairs(trips, b_numbers):
+    assert_equivalent(trips, b_numbers)
+
+
+@pytest.mark.parametrize('trips, b_numbers', [
+    (['start', 'end', 'start', 'end'], [1, 1, 1, 2]),
+    (['start', 'end', 'start', 'end', 'start', 'end'], [1, 1, 1, 2, 2, 2]),
+    (['start', 'end', 'start'], [1, 1, 2]),
+    (['start', 'end', 'start', 'end'], [1, 1, 2, 2])
+])
+def test_bike_boundaries(trips, b_numbers):
+    assert_equivalent(trips, b_numbers)
+
+
+def test_random_sequences():
+    # Includes trip types other than start and end (e.g. missing values filled with 0)
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        n_rows = rng.integers(1, 50)
+        trips = rng.choice(np.array(['start', 'end', 0, 'first'], dtype=object), n_rows, p=[0.45, 0.45, 0.05, 0.05])
+        b_numbers = np.sort(rng.integers(0, 5, n_rows))
+        assert_equivalent(list(trips), list(b_numbers))
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_parallel_clean_gdf(tmp_path, compact):
+    path = str(tmp_path / 'raw.csv')
+    generate_bookings(5000, seed=0).to_csv(path)
+    preprocessor = Preprocessor(compact=compact)
+    preprocessor.load_gdf(path)
+    preprocessor.clean_gdf()
+    # A threshold of 0 runs the geo filter on the process pool
+    parallel_preprocessor = ParallelPreprocessor(n_processes=3, serial_threshold=0, compact=compact)
+    parallel_preprocessor.load_gdf(path)
+    parallel_preprocessor.clean_gdf()
+    assert type(parallel_preprocessor.gdf) is type(preprocessor.gdf)
+    pd.testing.assert_frame_equal(parallel_preprocessor.gdf, preprocessor.gdf)
@@ -0,0 +1,95 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from nextbike.benchmark.synthetic import generate_bookings
+from nextbike.preprocessing import Preprocessor, Transformer
+from nextbike.preprocessing.Transformer import load_incremental_trips, stream_transform, transform_incremental
+
+
+@pytest.fixture
+def raw_path(tmp_path) -> str:
+    # The sorted synthetic bookings start with an 'end' booking of the first bike
+    path = str(tmp_path / 'raw.csv')
+    generate_bookings(5000, seed=0).to_csv(path)
+    return path
+
+
+def sort_trips(trips: pd.DataFrame) -> pd.DataFrame:
+    trips = trips.sort_values(by=['bike_number', 'start_time']).reset_index(drop=True)
+    for column in trips.select_dtypes('category').columns:
+        trips[column] = trips[column].astype(object)
+    return trips
+
+
+@pytest.mark.parametrize('chunksize', [100, 777, 5000, 1000000])
+def test_stream_transform_matches_transform(raw_path, chunksize):
+    preprocessor = Preprocessor()
+    preprocessor.load_gdf(raw_path)
+    preprocessor.clean_gdf()
+    transformer = Transformer(preprocessor)
+    transformer.transform(use_cache=False)
+    assert transformer.validate()
+    assert (transformer.gdf['end_time'] >= transformer.gdf['start_time']).all()
+    chunks = list(stream_transform(Preprocessor(), raw_path, chunksize))
+    # The chunks are read with the dtypes of load_gdf
+    for chunk in chunks:
+        assert chunk.dtypes.astype(str).to_dict() == transformer.gdf.dtypes.astype(str).to_dict()
+    streamed = pd.concat(chunks, ignore_index=True)
+    pd.testing.assert_frame_equal(sort_trips(streamed), sort_trips(transformer.gdf))
+
+
+@pytest.mark.parametrize('chunksize', [100, 5000])
+def test_stream_gdf_matches_load_gdf_dtypes(raw_path, chunksize):
+    preprocessor = Preprocessor()
+    preprocessor.load_gdf(raw_path)
+    preprocessor.clean_gdf()
+    for bookings in Preprocessor().stream_gdf(raw_path, chunksize):
+        assert bookings.dtypes.astype(str).to_dict() == preprocessor.gdf.dtypes.astype(str).to_dict()
+
+
+def test_stream_gdf_raises_for_missing_files(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        next(Preprocessor().stream_gdf(str(tmp_path / 'missing.csv')))
+
+
+@pytest.fixture
+def daily_paths(tmp_path, monkeypatch) -> list:
+    # A data folder with the synthetic bookings split into two consecutive raw files
+    os.makedirs(str(tmp_path / 'data' / 'input'))
+    shutil.copy(os.path.join('data', 'input', 'mannheim_boundary.geojson'), str(tmp_path / 'data' / 'input'))
+    monkeypatch.chdir(tmp_path)
+    bookings = generate_bookings(5000, seed=0)
+    paths = [str(tmp_path / 'data' / 'input' / name) for name in ['all.csv', 'day1.csv', 'day2.csv']]
+    for path, part in zip(paths, [bookings, bookings.iloc[:2500], bookings.iloc[2500:]]):
+        part.to_csv(path)
+    return paths
+
+
+def test_transform_incremental_matches_stream_transform(daily_paths):
+    all_path, day1_path, day2_path = daily_paths
+    assert transform_incremental(Preprocessor(), day1_path, chunksize=1000) > 0
+    assert transform_incremental(Preprocessor(), day2_path, chunksize=1000) > 0
+    streamed = pd.concat(list(stream_transform(Preprocessor(), all_path, 1000)), ignore_index=True)
+    pd.testing.assert_frame_equal(sort_trips(load_incremental_trips()), sort_trips(streamed), check_dtype=False)
+
+
+def test_transform_incremental_skips_appended_content(daily_paths):
+    _, day1_path, day2_path = daily_paths
+    n_trips = transform_incremental(Preprocessor(), day1_path) + transform_incremental(Preprocessor(), day2_path)
+    # The same content under another path or with another modification time is skipped
+    copy_path = day1_path.replace('day1', 'copy')
+    shutil.copy(day1_path, copy_path)
+    os.utime(day2_path, ns=(0, 0))
+    assert transform_incremental(Preprocessor(), copy_path) == 0
+    assert transform_incremental(Preprocessor(), day2_path) == 0
+    assert len(load_incremental_trips()) == n_trips
+
+
+def test_transform_incremental_rejects_overlapping_files(daily_paths):
+    all_path, day1_path, _ = daily_paths
+    transform_incremental(Preprocessor(), day1_path)
+    with pytest.raises(ValueError, match='overlaps'):
+        transform_incremental(Preprocessor(), all_path)